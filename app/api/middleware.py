@@ -0,0 +1,300 @@
+import asyncio
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.admission import AdmissionController
+from app.services.idempotency import BodyFingerprint, IdempotencyStore, StoredResponse
+from app.services.metrics import Metrics
+
+
+class UploadLimitMiddleware:
+    """
+    Rejects oversized request bodies on upload routes before they are read.
+
+    FastAPI parses the whole multipart form before the endpoint runs, so the
+    size cap has to be enforced at the ASGI layer:
+    1. A declared Content-Length over the limit gets 413 immediately (a
+       malformed or negative one gets 400).
+    2. Chunked bodies are counted as they arrive and cut off at the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                declared = -1
+            if declared < 0:
+                response = JSONResponse({"detail": "Invalid Content-Length header"}, status_code=400)
+                await response(scope, receive, send)
+                return
+            if declared > self.max_body_bytes:
+                response = JSONResponse(
+                    {"detail": f"Request body exceeds the {self.max_body_bytes} byte limit"},
+                    status_code=413,
+                )
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Request body exceeds the {self.max_body_bytes} byte limit",
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+
+class AdmissionMiddleware:
+    """
+    Runs AdmissionController (app/services/admission.py) in front of
+    expensive POST routes, before the body is read, so a rejected upload
+    costs one small response. Rate limits are keyed on X-User-ID, falling
+    back to the client address.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, paths: Iterable[str]):
+        self.app = app
+        self.controller = controller
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        user_id = dict(scope["headers"]).get(b"x-user-id")
+        client = scope.get("client") or ("unknown", 0)
+        key = f"user:{user_id.decode()}" if user_id else f"addr:{client[0]}"
+
+        decision = await self.controller.acquire(key)
+        if not decision.admitted:
+            response = JSONResponse(
+                {"detail": decision.detail},
+                status_code=decision.status_code,
+                headers={"Retry-After": str(decision.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+
+
+class IdempotencyMiddleware:
+    """
+    Honours an `Idempotency-Key` header on the given POST routes (exact paths):
+    the first request runs, its response is stored (IdempotencyStore) and
+    replayed to retries with `Idempotent-Replayed: true`. Retries arriving
+    at this process while the first one is still running wait for its
+    response (retries reaching another worker meanwhile run again).
+
+    The first request's body is fingerprinted as the app reads it; a retry's
+    body is read (up to max_request_bytes) and compared before replaying, and
+    a different body gets 422. A response is only stored if the app read the
+    whole request body.
+
+    A 202 is replayed for at most `accepted_ttl` seconds: it points at a job
+    whose result is only kept that long.
+
+    Sits outermost, so replays skip admission control and the app entirely.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: IdempotencyStore,
+        paths: Iterable[str],
+        max_body_bytes: int,
+        max_request_bytes: int,
+        wait_timeout: float,
+        accepted_ttl: Optional[float] = None,
+    ):
+        self.app = app
+        self.store = store
+        self.paths = set(paths)
+        self.max_body_bytes = max_body_bytes
+        self.max_request_bytes = max_request_bytes
+        self.wait_timeout = wait_timeout
+        self.accepted_ttl = accepted_ttl
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(b"idempotency-key")
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        user_id = headers.get(b"x-user-id")
+        client = scope.get("client") or ("unknown", 0)
+        caller = f"user:{user_id.decode()}" if user_id else f"addr:{client[0]}"
+        key = self.store.make_key(caller, scope["method"], scope["path"], idempotency_key.decode("latin-1"))
+
+        content_type = headers.get(b"content-type")
+        while True:
+            stored = await self.store.get(key)
+            if stored is not None:
+                await self._replay(stored, content_type, scope, receive, send)
+                return
+            pending = self.store.begin(key)
+            if pending is None:
+                break
+            try:
+                stored = await asyncio.wait_for(asyncio.shield(pending), self.wait_timeout)
+            except asyncio.TimeoutError:
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still in progress"},
+                    status_code=409,
+                    headers={"Retry-After": "1"},
+                )
+                await response(scope, receive, send)
+                return
+            if stored is not None:
+                await self._replay(stored, content_type, scope, receive, send)
+                return
+            # The first attempt failed without a storable response: run this one
+
+        fingerprint = BodyFingerprint(content_type)
+        body_complete = False
+
+        async def fingerprint_receive():
+            nonlocal body_complete
+            message = await receive()
+            if message["type"] == "http.request":
+                fingerprint.update(message.get("body", b""))
+                body_complete = not message.get("more_body", False)
+            return message
+
+        status = 500
+        response_headers = []
+        body = bytearray()
+        storable = True
+
+        async def capture_send(message):
+            nonlocal status, response_headers, storable
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body" and storable:
+                body.extend(message.get("body", b""))
+                if len(body) > self.max_body_bytes:
+                    storable = False
+                    body.clear()
+            await send(message)
+
+        result = None
+        try:
+            await self.app(scope, fingerprint_receive, capture_send)
+            if storable and body_complete and status < 500:
+                result = StoredResponse(status, response_headers, bytes(body), fingerprint.hexdigest())
+        finally:
+            await self.store.finish(key, result, self.accepted_ttl if status == 202 else None)
+
+    async def _read_fingerprint(self, content_type: Optional[bytes], receive: Receive) -> Optional[str]:
+        """Fingerprint of the whole request body, or None if it exceeds max_request_bytes."""
+        fingerprint = BodyFingerprint(content_type)
+        received = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return None  # client went away
+            chunk = message.get("body", b"")
+            received += len(chunk)
+            if received > self.max_request_bytes:
+                return None
+            fingerprint.update(chunk)
+            if not message.get("more_body", False):
+                return fingerprint.hexdigest()
+
+    async def _replay(self, stored: StoredResponse, content_type: Optional[bytes], scope: Scope, receive: Receive, send: Send):
+        fingerprint = await self._read_fingerprint(content_type, receive)
+        if stored.fingerprint and fingerprint != stored.fingerprint:
+            self.store.mismatched += 1
+            response = JSONResponse(
+                {"detail": "This Idempotency-Key was already used with a different request body"},
+                status_code=422,
+            )
+            await response(scope, receive, send)
+            return
+        self.store.replayed += 1
+        await send({
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": stored.headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": stored.body})
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and hands it to Metrics, labelled by the matched
+    route's path template (so /logs/{program_id}/history is one series, not
+    one per id). Unmatched paths share a single "unmatched" label.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+        self._templates: Dict[Any, str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def record_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats, token = self.metrics.begin_request()
+        try:
+            await self.app(scope, receive, record_status)
+        finally:
+            self.metrics.end_request(scope["method"], self._route(scope), status, stats, token)
+
+    def _route(self, scope: Scope) -> str:
+        # The router stores the matched endpoint in the scope; map it back to its template
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self._templates.get(endpoint)
+        if template is None:
+            for route in getattr(scope.get("app"), "routes", []):
+                if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+                    template = route.path
+                    break
+            template = self._templates[endpoint] = template or "unmatched"
+        return template
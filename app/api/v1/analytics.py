@@ -0,0 +1,81 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import get_async_db
+from app.models.program import CareProgram
+from app.models.user import Member
+from app.schemas.health import CohortTrendsResponse, TrendsResponse
+
+router = APIRouter()
+
+# Bound the array size a single request can ask for
+MAX_TREND_DAYS = 366
+MAX_COHORT_PROGRAMS = 500
+
+
+def _analytics():
+    """The analytics service pulls in NumPy; import it on first use rather than at startup."""
+    from app.services import analytics
+    return analytics
+
+
+# NOTE: registered before /{program_id}/trends so "cohort" is not parsed as an id
+@router.get("/cohort/trends", response_model=CohortTrendsResponse)
+async def get_cohort_trends(
+    program_ids: Optional[List[int]] = Query(None),
+    days: int = Query(90, ge=1, le=MAX_TREND_DAYS),
+    end: Optional[date] = None,
+    x_user_id: Optional[int] = Header(None, alias="X-User-ID"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Trends for many programs in one pass, plus cohort-wide means/percentiles.
+    - program_ids: explicit programs (repeat the parameter)
+    - otherwise: every program of the caller's family (X-User-ID)
+    """
+    if not program_ids:
+        if x_user_id is None:
+            raise HTTPException(status_code=400, detail="Pass program_ids or an X-User-ID header")
+        result = await db.execute(
+            select(CareProgram.id)
+            .join(Member, CareProgram.member_id == Member.id)
+            .where(Member.user_id == x_user_id)
+            .order_by(CareProgram.id)
+        )
+        program_ids = result.scalars().all()
+        if not program_ids:
+            raise HTTPException(status_code=404, detail="No programs found for this family")
+    program_ids = list(dict.fromkeys(program_ids))
+    if len(program_ids) > MAX_COHORT_PROGRAMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_COHORT_PROGRAMS} programs per request")
+
+    end = end or date.today()
+    return await db.run_sync(lambda session: _analytics().compute_trends(session, program_ids, end, days))
+
+@router.get("/{program_id}/trends", response_model=TrendsResponse)
+async def get_program_trends(
+    program_id: int,
+    days: int = Query(90, ge=1, le=MAX_TREND_DAYS),
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Daily calories, protein, strength sessions and total_score for the `days`
+    days ending at `end` (default today), with rolling 7/30-day averages and
+    p10/p50/p90 of the daily values.
+    """
+    if await db.get(CareProgram, program_id) is None:
+        raise HTTPException(status_code=404, detail="Program not found")
+
+    end = end or date.today()
+    trends = await db.run_sync(lambda session: _analytics().compute_trends(session, [program_id], end, days))
+    return {
+        "start": trends["start"],
+        "end": trends["end"],
+        "dates": trends["dates"],
+        **trends["programs"][0],
+    }
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_user
+from app.db.session import get_async_db
+from app.schemas.common import DashboardResponse
+from app.services import dashboard as dashboard_service
+from app.services.audit import audited
+
+router = APIRouter()
+
+# Always revalidate: the ETag check is cheap and scores change with every log
+DASHBOARD_CACHE = "private, no-cache"
+
+
+@router.get("", response_model=DashboardResponse, dependencies=[Depends(audited("dashboard.read"))])
+async def get_dashboard(
+    user_id: int = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Members -> ACTIVE programs -> today's adherence for the current user,
+    in one round trip (see app/services/dashboard.py).
+    - Served from a materialized snapshot while nothing has changed.
+    - Send the last ETag in If-None-Match to get 304 Not Modified.
+    """
+    data, etag = await dashboard_service.get_dashboard(db, user_id, if_none_match)
+    headers = {"ETag": etag, "Cache-Control": DASHBOARD_CACHE}
+    if data is None:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(data, headers=headers)
@@ -0,0 +1,98 @@
+import json
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.api.v1.logs import load_adherence
+from app.config import settings
+from app.db.session import AsyncSessionLocal
+from app.schemas.health import AdherenceResponse
+from app.services.cache import cache
+from app.services.events import TooManySubscribersError, adherence_topic, broker
+
+router = APIRouter()
+
+
+def _sse(event: str, data: dict, event_id=None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _adherence_event(scores: dict, event_id=None) -> str:
+    # Snapshots come from the cached DTO, pushes from the adherence engine:
+    # both go out as one AdherenceResponse shape
+    return _sse("adherence", AdherenceResponse.model_validate(scores).model_dump(mode="json"), event_id)
+
+
+async def _load(program_id: int):
+    # Short-lived session: a stream can stay open for hours
+    async with AsyncSessionLocal() as db:
+        return await load_adherence(db, program_id)
+
+
+async def _adherence_stream(program_ids: List[int]):
+    topics = {adherence_topic(program_id): program_id for program_id in program_ids}
+    try:
+        subscription = broker.subscribe(topics)
+    except TooManySubscribersError:
+        yield _sse("error", {"detail": "Too many subscribers, retry later"})
+        return
+
+    with subscription:
+        # Versions we have sent; a bump we were not told about came from another worker
+        seen = {}
+        for topic, program_id in topics.items():
+            seen[topic] = await cache.aversion(topic)
+            current = await _load(program_id)
+            if current is not None:
+                yield _adherence_event(current)
+
+        while True:
+            batch = await subscription.next_batch(
+                timeout=settings.EVENTS_HEARTBEAT_S,
+                window=settings.EVENTS_COALESCE_MS / 1000,
+            )
+            for topic, seq, message in batch:
+                seen[topic] = await cache.aversion(topic)
+                yield _adherence_event(message, seq)
+            if batch:
+                continue
+
+            for topic, program_id in topics.items():
+                version = await cache.aversion(topic)
+                if version != seen[topic]:
+                    seen[topic] = version
+                    current = await _load(program_id)
+                    if current is not None:
+                        yield _adherence_event(current)
+            yield ": keep-alive\n\n"
+
+
+@router.get("/adherence")
+async def stream_adherence(program_ids: List[int] = Query(...)):
+    """
+    Server-Sent Events stream of adherence updates, instead of polling
+    GET /logs/adherence/{program_id}.
+    - Sends today's score for each program on connect, then an `adherence`
+      event whenever a new log changes it (bursts are coalesced per program).
+      Every `adherence` event carries an AdherenceResponse.
+    - A `: keep-alive` comment every EVENTS_HEARTBEAT_S seconds.
+    """
+    program_ids = list(dict.fromkeys(program_ids))
+    if len(program_ids) > settings.EVENTS_MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.EVENTS_MAX_TOPICS} programs per stream")
+    if broker.subscribers >= broker.max_subscribers:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many open streams, retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        _adherence_stream(program_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,19 +1,33 @@
-import logging
-import shutil
-import os
-import uuid
 import asyncio
+import base64
+import logging
 from datetime import datetime
-from typing import List
+from typing import Dict, Optional, Tuple
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request, Query
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from cachetools import TTLCache # pip install cachetools
 
-from app.db.session import get_db
+from app.config import settings
+from app.db.session import get_async_db
+from app.db.writer import run_write, run_write_sync
 from app.models.health import DailyLog
 from app.models.program import CareProgram, AdherenceMetric
-from app.schemas.health import LogResponse, MealExtractionResponse, LogCreate
+from app.schemas.health import (
+    LogResponse, LogCreate, JobAcceptedResponse, JobStatusResponse,
+    LogBatchCreate, LogBatchItemResult, LogBatchResponse, LogHistoryPage, LogMetricPage, AdherenceResponse,
+)
+from app.services import adherence as adherence_engine
+from app.services import log_metrics, log_store
+from app.services.admission import build_meal_admission
+from app.services.ai_service import meal_analyzer
+from app.services.audit import AuditEntry, audited
+from app.services.cache import cache
+from app.services.events import adherence_topic, broker
+from app.services.jobs import Job, JobQueue, QueueFullError
+from app.services.storage import storage
 
 # --- SETUP ---
 router = APIRouter()
@@ -21,149 +35,358 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # CACHING STRATEGY:
-# In-memory cache that holds up to 100 adherence records for 60 seconds.
-# In production, this would be replaced by Redis.
-adherence_cache = TTLCache(maxsize=100, ttl=60)
+# Adherence DTOs live in the tiered cache (app/services/cache.py): an in-process
+# LRU in front of a tier shared by all workers, CACHE_TTL seconds each.
+# Writes bump the program's cache version, which invalidates every worker.
+
+# --- 1. MEAL PHOTO ANALYSIS (BACKGROUND JOBS) ---
+async def _run_meal_analysis(job: Job) -> dict:
+    """
+    Worker-side half of /meals/analyze (a job coroutine).
+    1. Gets the analysis from the AI service: cached by image hash, otherwise
+       inferred in a micro-batch with other concurrent uploads.
+    2. If a program_id was given, writes the NUTRITION log and recalculates adherence.
+    """
+    analysis = await meal_analyzer.analyze(job.params["digest"], job.params["file_path"])
+    result = {"analysis": analysis, "log_id": None}
+
+    program_id = job.params.get("program_id")
+    if program_id is None:
+        return result
+
+    payload = {**analysis, "image_key": job.params["image_key"], "source": "meal_photo"}
+
+    def write(db: Session):
+        if not db.query(CareProgram.id).filter(CareProgram.id == program_id).first():
+            raise ValueError(f"Program {program_id} not found")
+        new_log, changes = _write_log(db, program_id, "NUTRITION", payload)
+        return new_log.id, changes
+
+    result["log_id"], changes = await asyncio.to_thread(run_write_sync, write)
+    await _adherence_changed(changes)
+    return result
 
-# Local storage for images
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+meal_analysis_queue = JobQueue(
+    handler=_run_meal_analysis,
+    workers=settings.AI_WORKER_COUNT,
+    maxsize=settings.AI_QUEUE_MAXSIZE,
+    result_ttl=settings.JOB_RESULT_TTL,
+    result_maxsize=settings.JOB_RESULT_MAXSIZE,
+    name="meal-analysis",
+)
 
-# --- 1. MOCK AI / IMAGE UPLOAD ENDPOINT ---
-@router.post("/meals/analyze", response_model=MealExtractionResponse)
-async def analyze_meal_photo(file: UploadFile = File(...)):
+# Admission control for /meals/analyze (applied as middleware in app/main.py,
+# before the photo is uploaded). Sheds load while the job backlog is full.
+meal_admission = build_meal_admission(
+    shed_when=lambda: meal_analysis_queue.depth >= meal_analysis_queue.maxsize
+)
+
+@router.post("/meals/analyze", response_model=JobAcceptedResponse, status_code=202)
+async def analyze_meal_photo(
+    request: Request,
+    file: UploadFile = File(...),
+    program_id: Optional[int] = Form(None),
+):
     """
-    1. Receives image and saves it locally (Document Production Approach).
-    2. Returns FIXED Mock Data immediately (Mock AI).
+    1. Receives image and streams it into the content-addressed store
+       (app/services/storage.py); re-sent photos are stored only once.
+    2. Queues the AI analysis and returns 202 Accepted with a job id.
+    3. Poll GET /meals/jobs/{job_id} for the result. If program_id is sent,
+       the finished job also writes the NUTRITION log and updates adherence.
     """
-    # Generate unique filename
-    file_path = f"{UPLOAD_DIR}/{uuid.uuid4()}_{file.filename}"
+    # Stream file to disk (size/type checked, written off the event loop)
+    stored = await storage.save(file)
     
-    # Save file to disk
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    logger.info(f"Image saved to {file_path}. Returning Mock Data.")
+    try:
+        job = meal_analysis_queue.submit(
+            file_path=stored.path,
+            digest=stored.digest,
+            image_key=stored.key,
+            program_id=program_id,
+        )
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Meal analysis is busy, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+
+    logger.info(
+        f"Image stored as {stored.key} ({stored.size} bytes, duplicate={stored.deduplicated}). "
+        f"Queued analysis job {job.id}."
+    )
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "image_url": f"/uploads/{stored.key}",
+        "poll_url": request.url_for("get_meal_analysis_job", job_id=job.id).path,
+    }
+
+@router.get("/meals/stats")
+async def get_meal_analysis_stats():
+    """Admission control counters (in flight, waiting, rejections) and job backlog."""
+    return {
+        "admission": meal_admission.stats(),
+        "job_queue_depth": meal_analysis_queue.depth,
+    }
 
-    # Simulate AI Latency
-    await asyncio.sleep(1)
+@router.get("/meals/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_meal_analysis_job(job_id: str):
+    """Poll a meal analysis job. Finished jobs stay available for JOB_RESULT_TTL seconds."""
+    job = meal_analysis_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
 
-    # RETURN FIXED MOCK DATA
+    result = job.result or {}
     return {
-        "food_items": ["Grilled Chicken", "Brown Rice", "Broccoli"],
-        "calories": 450,
-        "macros": {
-            "protein_g": 35,  # High protein to trigger adherence
-            "carbs_g": 40,
-            "fats_g": 10
-        },
-        "confidence": 0.98
+        "job_id": job.id,
+        "status": job.status,
+        "result": result.get("analysis"),
+        "log_id": result.get("log_id"),
+        "error": job.error,
     }
 
 # --- 2. CREATE LOG & CALCULATE ADHERENCE ---
 @router.post("/logs", response_model=LogResponse)
-def create_log(
+async def create_log(
     log_data: LogCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    audit: AuditEntry = Depends(audited("log.create"))
 ):
     """
-    Saves the log and triggers the adherence engine.
+    Saves the log and triggers the adherence engine (app/services/adherence.py).
     """
     logger.info(f"Creating log for Program {log_data.program_id}")
+    audit.program_ids.append(log_data.program_id)
+    new_log, changes = await run_write(
+        lambda session: _write_log(
+            session, log_data.program_id, log_data.log_type, log_data.payload, log_data.timestamp
+        ),
+        db,
+    )
+    await _adherence_changed(changes)
+    return new_log
+
+@router.post("/logs/batch", response_model=LogBatchResponse)
+async def create_logs_batch(
+    batch: LogBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    audit: AuditEntry = Depends(audited("log.batch"))
+):
+    """
+    Bulk ingestion for offline clients replaying buffered logs.
+    1. Validates each item on its own (bad items are REJECTED, the rest proceed).
+    2. Inserts all valid logs in a single transaction.
+    3. Recomputes adherence and invalidates the cache once per affected (program, date).
+    """
+    results = [LogBatchItemResult(index=i, status="REJECTED") for i in range(len(batch.items))]
+
+    # A. Validate items individually
+    valid = []
+    for i, item in enumerate(batch.items):
+        try:
+            valid.append((i, LogCreate.model_validate(item)))
+        except ValidationError as exc:
+            results[i].error = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in exc.errors()
+            )
 
-    # A. Create the Log Object
-    new_log = DailyLog(
-        program_id=log_data.program_id,
-        log_type=log_data.log_type,
-        payload=log_data.payload,
+    # B. Reject items for unknown programs (one query)
+    requested = {log_data.program_id for _, log_data in valid}
+    known = set((await db.execute(select(CareProgram.id).where(CareProgram.id.in_(requested)))).scalars())
+    accepted = []
+    for i, log_data in valid:
+        if log_data.program_id not in known:
+            results[i].error = f"Program {log_data.program_id} not found"
+            continue
+        accepted.append((i, log_data))
+
+    # C. One transaction: bulk insert + one adherence recompute per program-day
+    def write(session: Session):
+        new_logs = [
+            _new_log(log_data.program_id, log_data.log_type, log_data.payload, log_data.timestamp)
+            for _, log_data in accepted
+        ]
+        session.add_all(new_logs)
+        session.flush()
+        log_metrics.index_logs(session, new_logs)
+        changes = adherence_engine.apply_logs(session, new_logs)
+        return [log.id for log in new_logs], changes
+
+    if accepted:
+        audit.program_ids.extend(log_data.program_id for _, log_data in accepted)
+        log_ids, changes = await run_write(write, db)
+        for (i, _), log_id in zip(accepted, log_ids):
+            results[i].status = "CREATED"
+            results[i].log_id = log_id
+        await _adherence_changed(changes)
+
+    logger.info(f"Batch: {len(accepted)} created, {len(results) - len(accepted)} rejected")
+    return LogBatchResponse(
+        created=len(accepted),
+        rejected=len(results) - len(accepted),
+        results=results,
+    )
+
+def _as_stored_time(timestamp: Optional[datetime]) -> Optional[datetime]:
+    """Server-local naive time, matching how logs have always been stored."""
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+def _new_log(program_id: int, log_type: str, payload: dict, timestamp: Optional[datetime] = None) -> DailyLog:
+    return DailyLog(
+        program_id=program_id,
+        log_type=log_type,
+        payload=payload,
         is_verified=True,
-        timestamp=datetime.now() # Manually set timestamp to fix validation error
+        timestamp=_as_stored_time(timestamp) or datetime.now(), # Manually set timestamp to fix validation error
     )
-    
-    # B. Save to DB
-    db.add(new_log)
-    db.commit()
-    # Note: We do NOT db.refresh() to avoid SQLite timestamp issues in this prototype
-    
-    # C. CACHE INVALIDATION
+
+async def _invalidate_adherence(program_id: int):
     # Since new data arrived, the cached adherence score is now STALE.
-    cache_key = f"adherence_{log_data.program_id}"
-    if cache_key in adherence_cache:
-        del adherence_cache[cache_key]
-        logger.info(f"INVALIDATED Cache for {cache_key}")
-    
-    # D. Trigger Logic Engine
-    calculate_adherence(db, log_data.program_id, log_data.payload)
-    
-    return new_log
+    version = await cache.ainvalidate(f"adherence:{program_id}")
+    logger.info(f"INVALIDATED adherence cache for program {program_id} (now v{version})")
 
-# --- 3. ADHERENCE LOGIC ENGINE ---
-def calculate_adherence(db: Session, program_id: int, latest_payload: dict):
+async def _adherence_changed(changes: Dict[Tuple[int, str], Optional[dict]]):
     """
-    Calculates score based on latest log and saves to DB.
+    After commit: invalidate each touched program once, then push the new
+    scores to SSE subscribers (app/services/events.py).
     """
-    # 1. Fetch Program Configuration
-    program = db.query(CareProgram).filter(CareProgram.id == program_id).first()
-    if not program or not program.config:
-        return
+    for program_id in {program_id for program_id, _ in changes}:
+        await _invalidate_adherence(program_id)
+    for (program_id, day), scores in changes.items():
+        if scores is not None:
+            broker.publish(adherence_topic(program_id), {"program_id": program_id, "date": day, **scores})
 
-    # 2. Calculate Score (Simplified Rule: 1g Protein = 3 points, max 100)
-    protein = latest_payload.get("macros", {}).get("protein_g", 0)
-    score = min(100, protein * 3) 
-    
-    # 3. Update or Create Today's Metric
-    today = datetime.now().strftime("%Y-%m-%d")
-    
-    metric = db.query(AdherenceMetric).filter(
-        AdherenceMetric.program_id == program_id, 
-        AdherenceMetric.date == today
-    ).first()
-    
-    if not metric:
-        metric = AdherenceMetric(program_id=program_id, date=today)
-    
-    metric.nutrition_score = score
-    metric.total_score = score 
-    metric.details = {"last_protein": protein, "status": "calculated_live"}
-    
-    db.add(metric)
-    db.commit()
+def _write_log(
+    db: Session, program_id: int, log_type: str, payload: dict, timestamp: Optional[datetime] = None
+) -> Tuple[DailyLog, Dict[Tuple[int, str], Optional[dict]]]:
+    """
+    Insert one log, extract its hot payload fields and fold it into that day's adherence.
+    Runs inside a write transaction (see app/db/writer.py); the caller commits
+    and then passes the returned changes to _adherence_changed.
+    """
+    new_log = _new_log(program_id, log_type, payload, timestamp)
+    db.add(new_log)
+    db.flush()
+    log_metrics.index_logs(db, [new_log])
+    return new_log, adherence_engine.apply_logs(db, [new_log])
 
-# --- 4. GET ADHERENCE (WITH CACHING) ---
-@router.get("/adherence/{program_id}")
-def get_adherence(program_id: int, db: Session = Depends(get_db)):
+# --- 3. GET ADHERENCE (WITH CACHING) ---
+@router.get(
+    "/adherence/{program_id}",
+    response_model=Optional[AdherenceResponse],
+    dependencies=[Depends(audited("adherence.read"))],
+)
+async def get_adherence(program_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Demonstrates Caching Strategy:
-    1. Check Cache
-    2. If miss, Check DB
-    3. Save to Cache
+    1. Check Cache (L1 in-process, then L2 shared)
+    2. If miss, Check DB (concurrent misses share one query)
+    3. Save to Cache as a serialized DTO
     """
-    cache_key = f"adherence_{program_id}"
-    
-    # STEP 1: Check Cache
-    if cache_key in adherence_cache:
-        logger.info(f"🟢 Serving adherence from CACHE for {program_id}")
-        return adherence_cache[cache_key]
-    
-    # STEP 2: DB Miss -> Query DB
-    logger.info(f"🔴 Serving adherence from DB for {program_id}")
+    return await load_adherence(db, program_id)
+
+async def load_adherence(db: AsyncSession, program_id: int) -> Optional[dict]:
+    """Today's adherence DTO, through the cache (also used by the SSE stream)."""
     today = datetime.now().strftime("%Y-%m-%d")
-    metric = db.query(AdherenceMetric).filter(
-        AdherenceMetric.program_id == program_id,
-        AdherenceMetric.date == today
-    ).first()
-    
-    # STEP 3: Save to Cache
-    if metric:
-        adherence_cache[cache_key] = metric
-        
-    return metric
-
-# --- 5. VIEW HISTORY ---
-@router.get("/{program_id}/history")
-def get_log_history(program_id: int, db: Session = Depends(get_db)):
-    """Fetch all logs for a program"""
-    return db.query(DailyLog)\
-        .filter(DailyLog.program_id == program_id)\
-        .order_by(DailyLog.timestamp.desc())\
-        .all()
\ No newline at end of file
+
+    async def load():
+        logger.info(f"Serving adherence from DB for {program_id}")
+        result = await db.execute(select(AdherenceMetric).where(
+            AdherenceMetric.program_id == program_id,
+            AdherenceMetric.date == today
+        ))
+        metric = result.scalars().first()
+        if not metric:
+            return None
+        return AdherenceResponse.model_validate(metric).model_dump(mode="json")
+
+    return await cache.aget_or_load(f"adherence:{program_id}", today, load)
+
+# --- 4. VIEW HISTORY ---
+def _encode_cursor(log: dict) -> str:
+    raw = f"{log['timestamp'].isoformat()}|{log['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/{program_id}/history", response_model=LogHistoryPage, dependencies=[Depends(audited("log.history"))])
+async def get_log_history(
+    program_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    log_type: Optional[str] = None,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Fetch a program's logs, newest first, one page at a time.
+    Keyset pagination on (timestamp, id) over the (program_id, timestamp) index,
+    so every page costs the same no matter how long the history is.
+    Only the monthly partitions overlapping the window are queried
+    (see app/services/log_store.py).
+    - since / until: optional time window (since inclusive, until exclusive)
+    - log_type: NUTRITION, WORKOUT, CLINICAL
+    - include_archived: also read compacted months past the retention window
+    """
+    # Fetch one extra row to know whether another page exists
+    logs = await log_store.fetch_history(
+        db, program_id, limit + 1,
+        since=_as_stored_time(since),
+        until=_as_stored_time(until),
+        log_type=log_type.upper() if log_type else None,
+        after=_decode_cursor(cursor) if cursor else None,
+        include_archived=include_archived,
+    )
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    return LogHistoryPage(
+        items=logs,
+        next_cursor=_encode_cursor(logs[-1]) if has_more else None,
+    )
+
+# --- 5. PAYLOAD FIELD QUERIES ---
+@router.get("/{program_id}/metrics", response_model=LogMetricPage, dependencies=[Depends(audited("log.metrics"))])
+async def query_log_metrics(
+    program_id: int,
+    field: str,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Range filter over one extracted payload field, newest first, served from
+    the log_metrics index (no JSON parsing). E.g. ?field=systolic&min_value=140&since=2024-05-01
+    - field: calories, protein_g, carbs_g, fats_g, systolic, diastolic, sessions
+    - min_value / max_value: inclusive bounds
+    """
+    if field not in log_metrics.ALL_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of {', '.join(log_metrics.ALL_FIELDS)}")
+
+    # Fetch one extra row to know whether another page exists
+    rows = (await db.execute(log_metrics.range_query(
+        program_id, field, min_value, max_value,
+        since=_as_stored_time(since),
+        until=_as_stored_time(until),
+        after=_decode_cursor(cursor) if cursor else None,
+        limit=limit + 1,
+    ))).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return LogMetricPage(
+        items=rows,
+        next_cursor=_encode_cursor({"timestamp": rows[-1]["timestamp"], "id": rows[-1]["log_id"]}) if has_more else None,
+    )
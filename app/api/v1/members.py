@@ -1,12 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from app.db.session import get_db, get_async_db, AsyncSessionLocal
+from app.db.writer import run_write
 from app.models.user import Member, User
 from app.schemas.common import MemberCreate, MemberResponse, UserResponse, UserUpdate, MemberUpdate
 from pydantic import BaseModel
 from app.api.deps import get_current_user
+from app.services import dashboard as dashboard_service
+from app.services import export as export_service
+from app.services.audit import AuditEntry, audited
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Users per query when streaming the admin listing
+STREAM_CHUNK_SIZE = 500
 
 # --- 1. User Registration Schema ---
 class UserCreate(BaseModel):
@@ -15,85 +29,141 @@ class UserCreate(BaseModel):
     password: str
 
 # --- 2. The Register Endpoint (Fixes your issue) ---
+# Writes go through the single writer (app/db/writer.py), like the logs
+# router. Checks that guard a write run inside it, so two requests can't
+# both pass the email check before either commits.
 @router.post("/register", tags=["Auth"])
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Registers a new Account Holder (User).
     This enables POST /api/v1/members/register
     """
-    if db.query(User).filter(User.email == user.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
+    def write(session: Session):
+        if session.query(User.id).filter(User.email == user.email).first():
+            raise HTTPException(status_code=400, detail="Email already registered")
+        new_user = User(
+            email=user.email,
+            full_name=user.full_name,
+            hashed_password=user.password  # In production, hash this!
+        )
+        session.add(new_user)
+        session.flush()
+        return {"id": new_user.id, "email": new_user.email}
 
-    new_user = User(
-        email=user.email, 
-        full_name=user.full_name, 
-        hashed_password=user.password  # In production, hash this!
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return {"id": new_user.id, "email": new_user.email}
+    return await run_write(write, db)
 
 
 @router.put("/users/me", response_model=UserResponse)
-def update_current_user(
+async def update_current_user(
     update_data: UserUpdate,
-    user_id: int = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update logged-in user details"""
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if update_data.full_name:
-        user.full_name = update_data.full_name
-    if update_data.email:
-        # Check uniqueness if changing email
-        existing = db.query(User).filter(User.email == update_data.email).first()
-        if existing and existing.id != user_id:
-            raise HTTPException(status_code=400, detail="Email already taken")
-        user.email = update_data.email
-        
-    db.commit()
-    db.refresh(user)
-    return user
+    def write(session: Session):
+        # Members are loaded here: the response nests them after the session closes
+        user = session.query(User).options(selectinload(User.members)).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if update_data.full_name:
+            user.full_name = update_data.full_name
+        if update_data.email:
+            # Check uniqueness if changing email
+            existing = session.query(User.id).filter(User.email == update_data.email).first()
+            if existing and existing.id != user_id:
+                raise HTTPException(status_code=400, detail="Email already taken")
+            user.email = update_data.email
+        return user
+
+    return await run_write(write, db)
 
 # --- 3. Member Management Endpoints ---
 
 @router.post("/", response_model=MemberResponse)
-def create_member(member: MemberCreate, user_id: int = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_member(
+    member: MemberCreate,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    audit: AuditEntry = Depends(audited("member.create"))
+):
     # Validation: Ensure User ID in body matches Auth Header
-    print(f"Debug: member.user_id = {member.user_id}, user_id = {user_id}")
+    logger.debug(f"Creating member for user {member.user_id} (caller {user_id})")
     if member.user_id != user_id:
         raise HTTPException(status_code=403, detail="Cannot create member for another user")
 
-    db_member = Member(**member.model_dump())
-    db.add(db_member)
-    db.commit()
-    db.refresh(db_member)
+    def write(session: Session):
+        db_member = Member(**member.model_dump())
+        session.add(db_member)
+        session.flush()
+        return db_member
+
+    db_member = await run_write(write, db)
+    await dashboard_service.ainvalidate(user_id)
+    audit.target_member_id = db_member.id
     return db_member
 
-@router.get("/{user_id}", response_model=list[MemberResponse])
-def list_members(user_id: int = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/{user_id}", response_model=list[MemberResponse], dependencies=[Depends(audited("member.list"))])
+async def list_members(user_id: int = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """List all family members for a specific User"""
-    return db.query(Member).filter(Member.user_id == user_id).all()
+    result = await db.execute(select(Member).where(Member.user_id == user_id))
+    return result.scalars().all()
 
 
+# --- NEW: Get All Users & Families (For Admin View) ---
+def _users_after(cursor: Optional[int], limit: int):
+    """
+    Keyset page of users with their members eager-loaded:
+    one query for the users + one IN (...) query for all their members.
+    """
+    query = select(User).options(selectinload(User.members)).order_by(User.id).limit(limit)
+    if cursor is not None:
+        query = query.where(User.id > cursor)
+    return query
 
-@router.get("/{user_id}", response_model=list[MemberResponse])
-def list_members(user_id: int, db: Session = Depends(get_db)):
-    return db.query(Member).filter(Member.user_id == user_id).all()
+async def _stream_users_ndjson(cursor: Optional[int]):
+    """
+    Emits every user after `cursor` as NDJSON, STREAM_CHUNK_SIZE users at a time.
+    Uses its own session (the request's one is closed before streaming starts)
+    and drops each chunk from the identity map, so memory stays flat.
+    """
+    async with AsyncSessionLocal() as db:
+        while True:
+            users = (await db.execute(_users_after(cursor, STREAM_CHUNK_SIZE))).scalars().all()
+            if not users:
+                return
+            yield "".join(UserResponse.model_validate(user).model_dump_json() + "\n" for user in users)
+            cursor = users[-1].id
+            db.expunge_all()
 
-# --- NEW: Get All Users & Families (For Admin View) ---
 @router.get("/users/all", response_model=list[UserResponse])
-def get_all_users_with_families(db: Session = Depends(get_db)):
+async def get_all_users_with_families(
+    request: Request,
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Fetches every user and nests their family members in the response.
+    Fetches users and nests their family members in the response.
+    - format=json (default): a list of up to `limit` users (keyset page). When
+      more follow, the X-Next-Cursor header holds the ?cursor= for the next
+      page and a Link: rel="next" header its URL.
+    - format=ndjson: streams every user after `cursor`, one JSON object per line.
     """
-    # SQLAlchemy automatically handles the join via the 'members' relationship
-    users = db.query(User).all() 
-    return users    
-
-@router.get("/{member_id}", response_model=MemberResponse)
+    if format == "ndjson":
+        return StreamingResponse(_stream_users_ndjson(cursor), media_type="application/x-ndjson")
+
+    # Fetch one extra row to know whether another page exists
+    users = (await db.execute(_users_after(cursor, limit + 1))).scalars().all()
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = str(users[-1].id)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return users
+
+@router.get("/{member_id}", response_model=MemberResponse, dependencies=[Depends(audited("member.read"))])
 def get_member(
     member_id: int,
     user_id: int = Depends(get_current_user), 
@@ -105,38 +175,66 @@ def get_member(
         raise HTTPException(status_code=404, detail="Member not found")
     return member
 
-@router.put("/{member_id}", response_model=MemberResponse)
-def update_member(
+@router.get("/{member_id}/export", dependencies=[Depends(audited("member.export"))])
+def export_member(
     member_id: int,
-    update_data: MemberUpdate,
-    user_id: int = Depends(get_current_user), 
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    include_archived: bool = True,
+    user_id: int = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Update member details"""
-    member = db.query(Member).filter(Member.id == member_id, Member.user_id == user_id).first()
+    """
+    Streams the member's programs, logs and adherence as NDJSON or CSV
+    (gzip=true compresses on the fly). Memory stays flat regardless of history length.
+    """
+    member = db.query(Member.id).filter(Member.id == member_id, Member.user_id == user_id).first()
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
-    
-    # Update fields if provided
-    if update_data.name: member.name = update_data.name
-    if update_data.age: member.age = update_data.age
-    if update_data.relation_type: member.relation_type = update_data.relation_type
-    
-    db.commit()
-    db.refresh(member)
+
+    filename = f"member-{member_id}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_service.export_member(member_id, format, compress=gzip, include_archived=include_archived),
+        media_type="application/gzip" if gzip else export_service.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.put("/{member_id}", response_model=MemberResponse, dependencies=[Depends(audited("member.update"))])
+async def update_member(
+    member_id: int,
+    update_data: MemberUpdate,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Update member details"""
+    def write(session: Session):
+        member = session.query(Member).filter(Member.id == member_id, Member.user_id == user_id).first()
+        if not member:
+            raise HTTPException(status_code=404, detail="Member not found")
+
+        # Update fields if provided
+        if update_data.name: member.name = update_data.name
+        if update_data.age: member.age = update_data.age
+        if update_data.relation_type: member.relation_type = update_data.relation_type
+        return member
+
+    member = await run_write(write, db)
+    await dashboard_service.ainvalidate(user_id)
     return member
 
-@router.delete("/{member_id}")
-def delete_member(
+@router.delete("/{member_id}", dependencies=[Depends(audited("member.delete"))])
+async def delete_member(
     member_id: int,
-    user_id: int = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a family member"""
-    member = db.query(Member).filter(Member.id == member_id, Member.user_id == user_id).first()
-    if not member:
-        raise HTTPException(status_code=404, detail="Member not found")
-    
-    db.delete(member)
-    db.commit()
+    def write(session: Session):
+        member = session.query(Member).filter(Member.id == member_id, Member.user_id == user_id).first()
+        if not member:
+            raise HTTPException(status_code=404, detail="Member not found")
+        session.delete(member)
+
+    await run_write(write, db)
+    await dashboard_service.ainvalidate(user_id)
     return None
\ No newline at end of file
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.metrics import metrics
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    """
+    Prometheus text format: per-route latency histograms, SQL count / DB time,
+    in-flight requests, cache hit/miss and background worker stats.
+    Values are per process; with several uvicorn workers, scrape each one.
+    """
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from app.api.deps import get_current_user
+from app.db.session import get_async_db
+from app.db.writer import run_write
+from app.models.program import CareProgram, ProgramConfig
+from app.models.user import Member
+from app.schemas.common import (
+    EnrollmentRequest, ProgramConfigCreate, ProgramConfigResponse, ProgramResponse, ProgramUpdate,
+)
+from app.services import adherence as adherence_engine
+from app.services import dashboard as dashboard_service
+from app.services.audit import AuditEntry, audited
+from app.services.cache import cache
+from app.services.events import adherence_topic, broker
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+PROGRAM_DAYS = 90
+
+
+async def _load_program(db: AsyncSession, program_id: int, user_id: int, refresh: bool = False) -> CareProgram:
+    """The program with its config, if it belongs to one of the caller's members."""
+    query = (
+        select(CareProgram)
+        .join(Member, CareProgram.member_id == Member.id)
+        .options(selectinload(CareProgram.config))
+        .where(CareProgram.id == program_id, Member.user_id == user_id)
+    )
+    if refresh:  # pick up a write made through the single writer
+        query = query.execution_options(populate_existing=True)
+    program = (await db.execute(query)).scalars().first()
+    if not program:
+        raise HTTPException(status_code=404, detail="Program not found")
+    return program
+
+
+# --- 1. ENROLLMENT ---
+@router.post("/{member_id}/enroll", response_model=ProgramResponse)
+async def enroll_member(
+    member_id: int,
+    enrollment: EnrollmentRequest,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    audit: AuditEntry = Depends(audited("program.enroll"))
+):
+    """Starts a 90-day care program for the member, with its goals."""
+    owned = await db.scalar(select(Member.id).where(Member.id == member_id, Member.user_id == user_id))
+    if not owned:
+        raise HTTPException(status_code=404, detail="Member not found")
+
+    def enroll(session: Session) -> CareProgram:
+        start = datetime.now()
+        program = CareProgram(
+            member_id=member_id,
+            title=enrollment.title,
+            description=enrollment.description,
+            start_date=start,
+            end_date=start + timedelta(days=PROGRAM_DAYS),
+            status="ACTIVE",
+            phase=1,
+        )
+        program.config = ProgramConfig(
+            nutrition_goals=enrollment.nutrition_goals,
+            strength_goals=enrollment.strength_goals,
+            clinical_goals=enrollment.clinical_goals,
+        )
+        session.add(program)
+        session.flush()
+        return program
+
+    program = await run_write(enroll, db)
+    await dashboard_service.ainvalidate(user_id)
+    audit.program_ids.append(program.id)
+    logger.info(f"Enrolled member {member_id} in program {program.id}")
+    return program
+
+
+# --- 2. PROGRAM ---
+@router.get("/{program_id}", response_model=ProgramResponse, dependencies=[Depends(audited("program.read"))])
+async def get_program(
+    program_id: int,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _load_program(db, program_id, user_id)
+
+
+@router.put("/{program_id}", response_model=ProgramResponse, dependencies=[Depends(audited("program.update"))])
+async def update_program(
+    program_id: int,
+    update_data: ProgramUpdate,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Update title / description / status / phase (only the fields provided)."""
+    await _load_program(db, program_id, user_id)
+    changes = update_data.model_dump(exclude_none=True)
+    if changes:
+        await run_write(
+            lambda session: session.query(CareProgram).filter(CareProgram.id == program_id).update(changes),
+            db,
+        )
+        # Status and title show on the dashboard
+        await dashboard_service.ainvalidate(user_id)
+    return await _load_program(db, program_id, user_id, refresh=True)
+
+
+# --- 3. GOALS ---
+@router.put(
+    "/{program_id}/config",
+    response_model=ProgramConfigResponse,
+    dependencies=[Depends(audited("program.config.update"))],
+)
+async def update_program_config(
+    program_id: int,
+    goals: ProgramConfigCreate,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Replace the program's goals and rescore today against them.
+    Earlier days keep their scores until rescored with
+    `python -m app.services.backfill --programs <id>`.
+    """
+    await _load_program(db, program_id, user_id)
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def apply(session: Session):
+        config = session.query(ProgramConfig).filter(ProgramConfig.program_id == program_id).first()
+        if config is None:
+            config = ProgramConfig(program_id=program_id)
+            session.add(config)
+        config.nutrition_goals = goals.nutrition_goals
+        config.strength_goals = goals.strength_goals
+        config.clinical_goals = goals.clinical_goals
+        session.flush()
+        return config, adherence_engine.rescore_day(session, program_id, today)
+
+    config, scores = await run_write(apply, db)
+    # Today's cached adherence (and every dashboard showing it) is stale now
+    await cache.ainvalidate(f"adherence:{program_id}")
+    if scores is not None:
+        broker.publish(adherence_topic(program_id), {"program_id": program_id, "date": today, **scores})
+    return config
@@ -0,0 +1,102 @@
+import os
+import re
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.services.storage import storage
+
+router = APIRouter()
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+# Content-addressed files never change, so clients/CDNs may keep them forever
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+LEGACY_CACHE = "public, max-age=3600"
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _parse_range(header: str, size: int):
+    """Returns (start, end) inclusive, None to serve the full file, or raises 416."""
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None  # Multi-range / unknown units: ignore and send the whole file
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # Suffix range: last N bytes
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@router.api_route("/{key}", methods=["GET", "HEAD"])
+def get_upload(key: str, request: Request, variant: Optional[str] = None):
+    """
+    Serves stored meal photos.
+    - ?variant=thumb|preview returns a cached, downscaled JPEG (generated once).
+    - Strong ETag (the content hash) with If-None-Match -> 304.
+    - Long-lived Cache-Control for content-addressed keys.
+    - Single byte-range requests (Range / If-Range) -> 206.
+    """
+    served = storage.resolve(key, variant)
+    if served is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    headers = {
+        "ETag": served.etag,
+        "Cache-Control": IMMUTABLE_CACHE if served.immutable else LEGACY_CACHE,
+        "Accept-Ranges": "bytes",
+    }
+
+    if _etag_matches(request.headers.get("if-none-match"), served.etag):
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(served.path)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == served.etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(length)
+            if request.method == "HEAD":
+                return Response(status_code=206, headers=headers, media_type=served.content_type)
+            return StreamingResponse(
+                _iter_file(served.path, start, length),
+                status_code=206,
+                headers=headers,
+                media_type=served.content_type,
+            )
+
+    return FileResponse(served.path, headers=headers, media_type=served.content_type)
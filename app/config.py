@@ -0,0 +1,142 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(name: str, default: str) -> list:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+class Settings:
+    """
+    Runtime configuration.
+    Every value can be overridden with an environment variable of the same name.
+    """
+
+    # --- Database ---
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./praan_health.db")
+
+    # SQLite engine profile (applied as PRAGMAs on every new connection)
+    DB_JOURNAL_MODE: str = os.getenv("DB_JOURNAL_MODE", "WAL")
+    DB_SYNCHRONOUS: str = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # NORMAL is durable enough under WAL
+    DB_BUSY_TIMEOUT_MS: int = _env_int("DB_BUSY_TIMEOUT_MS", 5000)
+    DB_CACHE_SIZE_KB: int = _env_int("DB_CACHE_SIZE_KB", 64 * 1024)
+    DB_MMAP_SIZE: int = _env_int("DB_MMAP_SIZE", 256 * 1024 * 1024)
+
+    # Connection pool (per engine, per process)
+    DB_POOL_SIZE: int = _env_int("DB_POOL_SIZE", 10)
+    DB_MAX_OVERFLOW: int = _env_int("DB_MAX_OVERFLOW", 20)
+    DB_POOL_TIMEOUT: float = _env_float("DB_POOL_TIMEOUT", 30)
+    # The async engine gets its own, smaller pool: aiosqlite runs every
+    # connection on its own thread and SQLite reads are CPU-bound, so
+    # connections beyond the core count only contend for the GIL with the
+    # event loop (p99 tripled at 50 concurrent history requests with 30 of
+    # them, see benchmarks/async_vs_threadpool.py). On Postgres/asyncpg size
+    # these like DB_POOL_SIZE / DB_MAX_OVERFLOW.
+    DB_ASYNC_POOL_SIZE: int = _env_int("DB_ASYNC_POOL_SIZE", os.cpu_count() or 1)
+    DB_ASYNC_MAX_OVERFLOW: int = _env_int("DB_ASYNC_MAX_OVERFLOW", os.cpu_count() or 1)
+
+    # Single-writer path: request writes are queued to one writer thread that
+    # group-commits them, while reads keep using the pool concurrently.
+    DB_SERIALIZED_WRITES: bool = _env_bool("DB_SERIALIZED_WRITES", True)
+    DB_WRITE_BATCH_MAX: int = _env_int("DB_WRITE_BATCH_MAX", 64)
+    DB_WRITE_BATCH_WINDOW_MS: float = _env_float("DB_WRITE_BATCH_WINDOW_MS", 2)
+
+    # Schema (app/db/bootstrap.py): workers only check the version at startup;
+    # run `python -m app.db.bootstrap` once per deploy. true = the first
+    # worker applies pending migrations itself (handy for a local dev server)
+    DB_AUTO_MIGRATE: bool = _env_bool("DB_AUTO_MIGRATE", False)
+
+    # --- Meal Analysis Jobs ---
+    # Jobs processed concurrently per process. Jobs are coroutines; inference
+    # itself runs in micro-batches (see app/services/ai_service.py), so this
+    # should be at least AI_BATCH_MAX * AI_MAX_INFLIGHT_BATCHES.
+    AI_WORKER_COUNT: int = _env_int("AI_WORKER_COUNT", 32)
+    # Pending jobs allowed before /meals/analyze starts answering 503.
+    AI_QUEUE_MAXSIZE: int = _env_int("AI_QUEUE_MAXSIZE", 100)
+    # How long finished job records stay pollable (seconds).
+    JOB_RESULT_TTL: float = _env_float("JOB_RESULT_TTL", 900)
+    JOB_RESULT_MAXSIZE: int = _env_int("JOB_RESULT_MAXSIZE", 10000)
+
+    # Admission control on POST /meals/analyze (app/services/admission.py)
+    MEAL_MAX_CONCURRENCY: int = _env_int("MEAL_MAX_CONCURRENCY", 16)  # uploads in flight
+    MEAL_MAX_WAITING: int = _env_int("MEAL_MAX_WAITING", 64)  # uploads waiting for a slot
+    MEAL_QUEUE_TIMEOUT_S: float = _env_float("MEAL_QUEUE_TIMEOUT_S", 2)
+    # Per-user token bucket; set MEAL_RATE_PER_MINUTE=0 to disable
+    MEAL_RATE_PER_MINUTE: float = _env_float("MEAL_RATE_PER_MINUTE", 12)
+    MEAL_RATE_BURST: float = _env_float("MEAL_RATE_BURST", 5)
+
+    # Inference backend and micro-batching
+    AI_BACKEND: str = os.getenv("AI_BACKEND", "mock")
+    AI_BATCH_MAX: int = _env_int("AI_BATCH_MAX", 8)
+    AI_BATCH_WAIT_MS: float = _env_float("AI_BATCH_WAIT_MS", 50)
+    AI_MAX_INFLIGHT_BATCHES: int = _env_int("AI_MAX_INFLIGHT_BATCHES", 4)
+    # In-memory results by image hash (the analysis is also stored next to the image)
+    AI_RESULT_CACHE_SIZE: int = _env_int("AI_RESULT_CACHE_SIZE", 2048)
+    AI_RESULT_CACHE_TTL: float = _env_float("AI_RESULT_CACHE_TTL", 3600)
+
+    # --- Idempotency-Key (POST /logs, /logs/batch, /meals/analyze) ---
+    IDEMPOTENCY_TTL_S: float = _env_float("IDEMPOTENCY_TTL_S", 24 * 3600)
+    IDEMPOTENCY_MAX_KEYS: int = _env_int("IDEMPOTENCY_MAX_KEYS", 10000)
+    IDEMPOTENCY_MAX_BODY: int = _env_int("IDEMPOTENCY_MAX_BODY", 256 * 1024)  # larger responses aren't stored
+    IDEMPOTENCY_WAIT_S: float = _env_float("IDEMPOTENCY_WAIT_S", 30)  # retries wait this long for the first attempt
+
+    # --- Uploads ---
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
+    MAX_UPLOAD_BYTES: int = _env_int("MAX_UPLOAD_BYTES", 10 * 1024 * 1024)
+    UPLOAD_CHUNK_SIZE: int = _env_int("UPLOAD_CHUNK_SIZE", 256 * 1024)
+    ALLOWED_UPLOAD_TYPES: list = _env_list(
+        "ALLOWED_UPLOAD_TYPES", "image/jpeg,image/png,image/webp,image/heic"
+    )
+
+    # --- Log Storage ---
+    # Warm monthly partitions kept as tables before compaction into archive files
+    LOG_RETENTION_MONTHS: int = _env_int("LOG_RETENTION_MONTHS", 6)
+    LOG_ARCHIVE_DIR: str = os.getenv("LOG_ARCHIVE_DIR", "archive")
+    # Decoded archive rows kept in memory per process (LRU by month)
+    LOG_ARCHIVE_CACHE_ROWS: int = _env_int("LOG_ARCHIVE_CACHE_ROWS", 100_000)
+    # How long read paths reuse the list of warm tables where the database
+    # has no schema change counter (SQLite has one and never waits this out)
+    LOG_PARTITION_CACHE_S: float = _env_float("LOG_PARTITION_CACHE_S", 30)
+
+    # --- Push Updates (SSE) ---
+    EVENTS_MAX_SUBSCRIBERS: int = _env_int("EVENTS_MAX_SUBSCRIBERS", 1000)
+    EVENTS_MAX_TOPICS: int = _env_int("EVENTS_MAX_TOPICS", 20)  # programs per connection
+    EVENTS_HEARTBEAT_S: float = _env_float("EVENTS_HEARTBEAT_S", 15)
+    # Updates arriving within this window are sent as one event per program
+    EVENTS_COALESCE_MS: float = _env_float("EVENTS_COALESCE_MS", 250)
+
+    # --- Audit Trail ---
+    AUDIT_BATCH_SIZE: int = _env_int("AUDIT_BATCH_SIZE", 200)  # flush when this many are buffered
+    AUDIT_FLUSH_INTERVAL_S: float = _env_float("AUDIT_FLUSH_INTERVAL_S", 1)
+    AUDIT_MAX_BUFFER: int = _env_int("AUDIT_MAX_BUFFER", 10000)
+    AUDIT_OVERFLOW: str = os.getenv("AUDIT_OVERFLOW", "drop_oldest")  # or "drop_newest"
+
+    # --- Instrumentation (/metrics) ---
+    METRICS_ENABLED: bool = _env_bool("METRICS_ENABLED", True)
+    METRICS_SLOW_REQUEST_MS: float = _env_float("METRICS_SLOW_REQUEST_MS", 0)  # log slower requests with their queries; 0 = off
+
+    # --- Cache ---
+    CACHE_TTL: float = _env_float("CACHE_TTL", 60)
+    CACHE_L1_MAXSIZE: int = _env_int("CACHE_L1_MAXSIZE", 1024)
+    # How long a worker trusts its copy of a scope's version before re-reading
+    # the shared tier (bounds how late it sees another worker's invalidation)
+    CACHE_VERSION_TTL_S: float = _env_float("CACHE_VERSION_TTL_S", 1)
+    # Dashboard snapshots are checked against their versions on every read, so
+    # the TTL only bounds how long an unchanged one is kept (they are per day)
+    CACHE_DASHBOARD_TTL: float = _env_float("CACHE_DASHBOARD_TTL", 24 * 3600)
+    # Shared tier for all workers on this host; set to "" to run L1-only
+    CACHE_SHARED_PATH: str = os.getenv("CACHE_SHARED_PATH", "./praan_cache.db")
+
+
+settings = Settings()
@@ -0,0 +1,161 @@
+"""
+Schema Bootstrap.
+
+The schema is versioned: MIGRATIONS is an ordered list of steps and the
+schema_version table records the ones applied. migrate() applies whatever is
+pending while holding a database lock (BEGIN IMMEDIATE on SQLite, an advisory
+lock on Postgres), so when several workers or a deploy job start together
+only one does the work and the rest find the schema current.
+
+Run it once per deploy, before the workers start:
+    python -m app.db.bootstrap            # apply pending migrations
+    python -m app.db.bootstrap --check    # exit 1 if migrations are pending
+
+Workers then only read the version at startup and refuse to start while it
+is behind (SchemaOutOfDateError). With DB_AUTO_MIGRATE=true (handy for a
+local dev server) the first worker to start applies pending migrations
+itself instead.
+
+Schema changes go in a new Migration at the end of the list; never edit one
+that has shipped.
+"""
+import argparse
+import json
+import logging
+import sys
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.base import Base
+import app.models  # noqa: F401  (registers every model on Base.metadata)
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock key shared by every process bootstrapping this database
+ADVISORY_LOCK_KEY = 0x5072_6161  # "Praa"
+
+_bootstrap_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _bootstrap_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class SchemaOutOfDateError(RuntimeError):
+    pass
+
+
+# --- 1. MIGRATIONS ---
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _create_tables(conn: Connection):
+    # Databases created before versioning already have these: checkfirst skips them
+    Base.metadata.create_all(bind=conn)
+
+
+def _create_missing_indexes(conn: Connection):
+    # create_all skips existing tables, including indexes declared on them later
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create tables", _create_tables),
+    Migration(2, "create indexes missing from pre-existing tables", _create_missing_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# --- 2. APPLYING ---
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.scalar(select(func.max(schema_version.c.version))) or 0
+
+
+@contextmanager
+def _locked(engine: Engine) -> Iterator[Connection]:
+    """One transaction holding the schema lock; committed on exit."""
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # Takes the write lock up front; other bootstraps wait on busy_timeout
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        elif conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        yield conn
+        conn.commit()
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations (up to `target`) and return the versions applied."""
+    applied = []
+    with _locked(engine) as conn:
+        _bootstrap_metadata.create_all(bind=conn)
+        current = current_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= current or (target is not None and migration.version > target):
+                continue
+            logger.info(f"Applying schema migration {migration.version}: {migration.description}")
+            migration.apply(conn)
+            conn.execute(insert(schema_version).values(
+                version=migration.version, description=migration.description, applied_at=datetime.now(),
+            ))
+            applied.append(migration.version)
+    return applied
+
+
+def ensure_schema(engine: Engine, auto_migrate: bool) -> List[int]:
+    """
+    Startup check. Applies pending migrations when `auto_migrate`, otherwise
+    raises SchemaOutOfDateError if the database is behind the code.
+    """
+    if auto_migrate:
+        return migrate(engine)
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST_VERSION:
+        raise SchemaOutOfDateError(
+            f"Database schema is at version {version}, the code needs {LATEST_VERSION}: "
+            f"run `python -m app.db.bootstrap`"
+        )
+    return []
+
+
+# --- 3. CLI ---
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations.")
+    parser.add_argument("--check", action="store_true", help="only report; exit 1 if migrations are pending")
+    parser.add_argument("--target", type=int, help="stop at this version")
+    args = parser.parse_args(argv)
+
+    from app.db.session import engine
+
+    logging.basicConfig(level=logging.INFO)
+    if args.check:
+        with engine.connect() as conn:
+            version = current_version(conn)
+        print(json.dumps({"version": version, "latest": LATEST_VERSION}))
+        sys.exit(0 if version >= LATEST_VERSION else 1)
+
+    applied = migrate(engine, args.target)
+    with engine.connect() as conn:
+        print(json.dumps({"applied": applied, "version": current_version(conn)}))
+
+
+if __name__ == "__main__":
+    main()
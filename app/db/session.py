@@ -1,18 +1,84 @@
 # app/db/session.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.config import settings
 
 # Still using SQLite for the prototype
-SQLALCHEMY_DATABASE_URL = "sqlite:///./praan_health.db"
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Async driver for each sync URL we support (same code runs on Postgres later)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def async_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(hide_password=False)
+
+IS_SQLITE = make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite"
+
+# --- Engine Profile ---
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Pool sizing from settings (in-memory SQLite keeps its single-connection pool)."""
+    parsed = make_url(url)
+    options = {}
+    if parsed.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    options.update(
+        # Explicit: aiosqlite would otherwise default to NullPool (a new connection per checkout)
+        poolclass=AsyncAdaptedQueuePool if is_async else QueuePool,
+        pool_size=settings.DB_ASYNC_POOL_SIZE if is_async else settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_ASYNC_MAX_OVERFLOW if is_async else settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return options
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL lets readers run while a write is in progress; busy_timeout makes a
+    writer wait for the lock instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.DB_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.DB_CACHE_SIZE_KB}")  # negative = KiB
+    cursor.execute(f"PRAGMA mmap_size={settings.DB_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+# --- Sync engine: background workers, the single writer, scripts ---
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- Async engine: hot request paths (no threadpool hop per request) ---
+async_engine = create_async_engine(
+    async_url(SQLALCHEMY_DATABASE_URL), **engine_options(SQLALCHEMY_DATABASE_URL, is_async=True)
+)
+# expire_on_commit=False: returned ORM objects stay readable after commit
+# without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,174 @@
+"""
+Single-writer path for SQLite.
+
+SQLite allows one writer at a time. Instead of letting every request race for
+the write lock (and fail with "database is locked" under bursts), writes are
+queued to one dedicated thread. The writer drains whatever is queued (up to
+DB_WRITE_BATCH_MAX, waiting at most DB_WRITE_BATCH_WINDOW_MS for more) and
+commits the whole group in one transaction: one lock acquisition and one
+journal sync for many requests. Reads keep using the connection pool.
+
+If one write in a group fails, the group is rolled back and its writes are
+replayed one transaction each, so a bad request never takes others down.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+WriteFn = Callable[[Session], Any]
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self, session_factory: sessionmaker, max_batch: int, window_s: float):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.commits = 0
+        self.writes = 0
+
+    # --- Lifecycle ---
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Finish queued writes, then stop the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+
+    # --- Public API ---
+    def submit(self, fn: WriteFn) -> Future:
+        """Queue fn(session). The future resolves after its group has committed."""
+        self.start()
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    async def run(self, fn: WriteFn) -> Any:
+        return await asyncio.wrap_future(self.submit(fn))
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {"depth": self.depth, "commits": self.commits, "writes": self.writes}
+
+    # --- Writer Thread ---
+    def _next_batch(self) -> Tuple[List[Tuple[WriteFn, Future]], bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._commit_group(batch)
+            if stopping:
+                return
+
+    def _commit_group(self, batch: List[Tuple[WriteFn, Future]]):
+        results = []
+        session = self.session_factory()
+        try:
+            for fn, _ in batch:
+                results.append(fn(session))
+            session.commit()
+        except Exception:
+            session.rollback()
+            session.close()
+            if len(batch) > 1:
+                logger.warning(f"Group of {len(batch)} writes failed; replaying individually")
+            for item in batch:
+                self._commit_one(*item)
+            return
+        finally:
+            session.close()
+
+        self.commits += 1
+        self.writes += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _commit_one(self, fn: WriteFn, future: Future):
+        session = self.session_factory()
+        try:
+            result = fn(session)
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            future.set_exception(exc)
+        else:
+            self.commits += 1
+            self.writes += 1
+            future.set_result(result)
+        finally:
+            session.close()
+
+
+# Objects returned by write functions are read after the session closes
+WriterSession = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+write_queue: Optional[WriteQueue] = (
+    WriteQueue(WriterSession, settings.DB_WRITE_BATCH_MAX, settings.DB_WRITE_BATCH_WINDOW_MS / 1000)
+    if settings.DB_SERIALIZED_WRITES else None
+)
+
+
+async def run_write(fn: WriteFn, db: AsyncSession) -> Any:
+    """
+    Run fn(session) and commit, from async code.
+    Goes through the single writer when enabled, otherwise runs on `db`.
+    """
+    if write_queue is not None:
+        return await write_queue.run(fn)
+    result = await db.run_sync(fn)
+    await db.commit()
+    return result
+
+
+def run_write_sync(fn: WriteFn) -> Any:
+    """Same as run_write, for worker threads (blocks until committed)."""
+    if write_queue is not None:
+        return write_queue.submit(fn).result()
+    db = WriterSession()
+    try:
+        result = fn(db)
+        db.commit()
+        return result
+    finally:
+        db.close()
@@ -1,21 +1,119 @@
+import time
+
+# Startup timing starts before the heavy imports below
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from app.db.session import engine
-from app.db.base import Base
-from app.api.v1 import members, programs, logs
+from app.config import settings
+from app.api.middleware import AdmissionMiddleware, IdempotencyMiddleware, MetricsMiddleware, UploadLimitMiddleware
+from app.db.session import async_engine, engine
+from app.db.bootstrap import ensure_schema
+from app.db.writer import write_queue
+from app.services.ai_service import meal_analyzer
+from app.services.audit import audit_writer
+from app.services.cache import cache
+from app.services.events import broker
+from app.services.idempotency import idempotency_store
+from app.services.metrics import instrument_engine, metrics as request_metrics
+from app.api.v1 import members, programs, logs, uploads, analytics, dashboard, events, metrics
+
+logger = logging.getLogger(__name__)
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+startup_stats = {"import_seconds": IMPORT_SECONDS}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # --- Startup ---
+    # Schema: one version check, or the (locked, run-once) migrations in dev
+    started = time.perf_counter()
+    applied = await asyncio.to_thread(ensure_schema, engine, settings.DB_AUTO_MIGRATE)
+    startup_stats["schema_seconds"] = time.perf_counter() - started
+    startup_stats["ready_seconds"] = time.perf_counter() - IMPORT_STARTED
+    logger.info(
+        f"Ready in {startup_stats['ready_seconds'] * 1000:.0f}ms "
+        f"(imports {IMPORT_SECONDS * 1000:.0f}ms, schema {startup_stats['schema_seconds'] * 1000:.0f}ms"
+        + (f", applied migrations {applied}" if applied else "") + ")"
+    )
+    yield
+    # --- Shutdown ---
+    # Stop the in-process meal analysis workers
+    await logs.meal_analysis_queue.stop()
+    await meal_analyzer.stop()
+    # Write buffered audit records (goes through the single writer, so before it stops)
+    await audit_writer.stop()
+    # Let the single writer commit whatever is still queued
+    if write_queue is not None:
+        await asyncio.to_thread(write_queue.stop)
+    # Pooled aiosqlite connections each hold a thread; close them with the loop
+    await async_engine.dispose()
+    engine.dispose()
+
+
+app = FastAPI(title="Praan Family Health OS", lifespan=lifespan)
 
-# Auto-create tables
-Base.metadata.create_all(bind=engine)
+# Middleware added later wraps the ones added before it, so requests pass
+# Metrics -> Idempotency -> Admission -> UploadLimit -> routes.
 
-app = FastAPI(title="Praan Family Health OS")
+# Reject oversized photo uploads before their body is read
+# (small allowance on top of the file limit for multipart framing/fields)
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_body_bytes=settings.MAX_UPLOAD_BYTES + 64 * 1024,
+    paths=["/api/v1/logs/meals/analyze"],
+)
+# Rate-limit / queue / shed photo uploads before anything is read
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=logs.meal_admission,
+    paths=["/api/v1/logs/meals/analyze"],
+)
+# Replay retried POSTs that carry an Idempotency-Key (ahead of admission and
+# the upload limit, so replays cost nothing)
+app.add_middleware(
+    IdempotencyMiddleware,
+    store=idempotency_store,
+    paths=["/api/v1/logs/logs", "/api/v1/logs/logs/batch", "/api/v1/logs/meals/analyze"],
+    max_body_bytes=settings.IDEMPOTENCY_MAX_BODY,
+    max_request_bytes=settings.MAX_UPLOAD_BYTES + 64 * 1024,
+    wait_timeout=settings.IDEMPOTENCY_WAIT_S,
+    # A replayed 202 must not outlive the job it points at
+    accepted_ttl=settings.JOB_RESULT_TTL,
+)
 
-# Mount 'uploads' folder so Frontend can view images (e.g. localhost:8000/uploads/xyz.jpg)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Per-route latency, SQL count / DB time and service stats at /metrics
+# (outermost, so time spent in the other middlewares is included)
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+    request_metrics.register_collector("cache", cache.stats)
+    request_metrics.register_collector("meal_admission", logs.meal_admission.stats)
+    request_metrics.register_collector("meal_jobs", logs.meal_analysis_queue.stats)
+    request_metrics.register_collector("meal_analyzer", lambda: dict(meal_analyzer.stats))
+    request_metrics.register_collector("audit", audit_writer.stats)
+    request_metrics.register_collector("events", broker.stats)
+    request_metrics.register_collector("idempotency", idempotency_store.stats)
+    request_metrics.register_collector("startup", lambda: startup_stats)
+    if write_queue is not None:
+        request_metrics.register_collector("write_queue", write_queue.stats)
 
 # Include Routers
 app.include_router(members.router, prefix="/api/v1/members", tags=["Members"])
 app.include_router(programs.router, prefix="/api/v1/programs", tags=["Programs"])
 app.include_router(logs.router, prefix="/api/v1/logs", tags=["Logs & AI"])
+app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["Analytics"])
+app.include_router(dashboard.router, prefix="/api/v1/dashboard", tags=["Dashboard"])
+app.include_router(events.router, prefix="/api/v1/events", tags=["Push Updates"])
+# Meal photos with ETag/Range/thumbnail support (e.g. localhost:8000/uploads/<sha256>.jpg?variant=thumb)
+app.include_router(uploads.router, prefix="/uploads", tags=["Uploads"])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router, tags=["Metrics"])
 
 @app.get("/")
 def root():
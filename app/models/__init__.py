@@ -1,3 +1,3 @@
 from app.models.user import User, Member
-from app.models.program import CareProgram, ProgramConfig, AdherenceMetric
-from app.models.health import DailyLog, AuditLog
\ No newline at end of file
+from app.models.program import CareProgram, ProgramConfig, AdherenceMetric, DailyRollup
+from app.models.health import DailyLog, LogMetric, AuditLog
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base import Base
@@ -8,6 +8,11 @@ class DailyLog(Base):
     Unified table for all health events.
     """
     __tablename__ = "daily_logs"
+    # History is always read per program, newest first, keyset-paginated on
+    # (timestamp, id): this index serves both the filter and the ordering.
+    __table_args__ = (
+        Index("ix_daily_logs_program_timestamp", "program_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     program_id = Column(Integer, ForeignKey("care_programs.id"))
@@ -20,6 +25,29 @@ class DailyLog(Base):
     
     program = relationship("CareProgram", back_populates="logs")
 
+class LogMetric(Base):
+    """
+    Typed copies of commonly queried payload fields (calories, systolic, ...),
+    one row per (log, field), extracted at write time by
+    app/services/log_metrics.py so range filters never parse JSON.
+    """
+    __tablename__ = "log_metrics"
+    # Range queries filter on (program, field, time window[, value]); the
+    # index covers every column they read, so they never touch the table.
+    __table_args__ = (
+        Index("ix_log_metrics_program_field_timestamp", "program_id", "field", "timestamp", "log_id", "value"),
+        Index("ix_log_metrics_log_id", "log_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    # No FK: logs move between monthly partitions (app/services/log_store.py)
+    log_id = Column(Integer, nullable=False)
+    program_id = Column(Integer, nullable=False)
+    log_type = Column(String)
+    field = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     id = Column(Integer, primary_key=True, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 import datetime
@@ -46,6 +46,10 @@ class ProgramConfig(Base):
 
 class AdherenceMetric(Base):
     __tablename__ = "adherence_metrics"
+    # One row per program per day; lets the engine upsert atomically
+    __table_args__ = (
+        Index("uq_adherence_metrics_program_date", "program_id", "date", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     program_id = Column(Integer, ForeignKey("care_programs.id"))
@@ -58,4 +62,32 @@ class AdherenceMetric(Base):
     
     details = Column(JSON)
 
-    program = relationship("CareProgram", back_populates="adherence")
\ No newline at end of file
+    program = relationship("CareProgram", back_populates="adherence")
+
+class DailyRollup(Base):
+    """
+    Running per-program, per-day totals.
+    Maintained incrementally by the adherence engine (one atomic upsert per log),
+    so scoring never has to rescan the day's DailyLogs.
+    """
+    __tablename__ = "daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("program_id", "date", name="uq_daily_rollups_program_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    program_id = Column(Integer, ForeignKey("care_programs.id"), nullable=False)
+    date = Column(String, nullable=False)  # YYYY-MM-DD, same format as AdherenceMetric.date
+
+    # Nutrition
+    calories = Column(Float, default=0.0)
+    protein_g = Column(Float, default=0.0)
+    carbs_g = Column(Float, default=0.0)
+    fats_g = Column(Float, default=0.0)
+    meals = Column(Integer, default=0)
+
+    # Strength / Clinical
+    workout_sessions = Column(Float, default=0.0)
+    clinical_checkins = Column(Integer, default=0)
+
+    log_count = Column(Integer, default=0)
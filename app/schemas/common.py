@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from app.schemas.health import AdherenceResponse
 
 class EnrollmentRequest(BaseModel):
     """
@@ -43,7 +44,6 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True        
 
-
 class ProgramConfigCreate(BaseModel):
     nutrition_goals: Dict[str, Any] # e.g. {"calories": 1500, "protein_g": 80}
     strength_goals: Dict[str, Any]  # e.g. {"sessions_per_week": 4}
@@ -63,4 +63,40 @@ class ProgramUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     status: Optional[str] = None # e.g., "PAUSED", "COMPLETED"
-    phase: Optional[int] = None    
\ No newline at end of file
+    phase: Optional[int] = None    
+
+class ProgramConfigResponse(ProgramConfigCreate):
+    program_id: int
+    class Config:
+        from_attributes = True
+
+class ProgramResponse(BaseModel):
+    id: int
+    member_id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    status: Optional[str] = None
+    phase: Optional[int] = None
+    config: Optional[ProgramConfigResponse] = None
+    class Config:
+        from_attributes = True
+
+# --- Dashboard ---
+class DashboardProgram(BaseModel):
+    id: int
+    title: Optional[str] = None
+    status: Optional[str] = None
+    phase: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    adherence: Optional[AdherenceResponse] = None  # today's metric, None until the first log
+
+class DashboardMember(MemberResponse):
+    programs: List[DashboardProgram] = []  # ACTIVE programs only
+
+class DashboardResponse(BaseModel):
+    user_id: int
+    date: str
+    members: List[DashboardMember]
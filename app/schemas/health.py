@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
@@ -10,6 +10,20 @@ class MealExtractionResponse(BaseModel):
     macros: Dict[str, int]
     confidence: float
 
+class JobAcceptedResponse(BaseModel):
+    """Returned with 202 Accepted when a meal photo is queued for analysis"""
+    job_id: str
+    status: str  # "PENDING"
+    image_url: str  # Content-addressed; add ?variant=thumb|preview for smaller copies
+    poll_url: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str  # "PENDING", "COMPLETED", "FAILED"
+    result: Optional[MealExtractionResponse] = None
+    log_id: Optional[int] = None  # Set when the job also wrote a NUTRITION log
+    error: Optional[str] = None
+
 class LogCreate(BaseModel):
     program_id: int
     log_type: str  # "NUTRITION", "WORKOUT", "CLINICAL"
@@ -18,6 +32,10 @@ class LogCreate(BaseModel):
     # This matches our JSONB column in Postgres
     payload: Dict[str, Any] 
 
+    # When the event happened. Offline clients replaying buffered logs send it;
+    # defaults to the time the server receives the log.
+    timestamp: Optional[datetime] = None
+
 class LogResponse(LogCreate):
     id: int
     timestamp: datetime
@@ -26,10 +44,76 @@ class LogResponse(LogCreate):
     class Config:
         from_attributes = True
 
+class LogHistoryPage(BaseModel):
+    """One page of history, newest first. Pass next_cursor back to get the next page."""
+    items: List[LogResponse]
+    next_cursor: Optional[str] = None  # None on the last page
+
+class LogMetricResponse(BaseModel):
+    log_id: int
+    field: str
+    value: float
+    timestamp: datetime
+
+class LogMetricPage(BaseModel):
+    """One page of extracted field values, newest first."""
+    items: List[LogMetricResponse]
+    next_cursor: Optional[str] = None  # None on the last page
+
+# --- Bulk Ingestion ---
+MAX_BATCH_SIZE = 500
+
+class LogBatchCreate(BaseModel):
+    """
+    Items are validated one by one (as LogCreate) by the endpoint,
+    so a bad item is reported in its result instead of failing the whole batch.
+    """
+    items: List[Dict[str, Any]] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class LogBatchItemResult(BaseModel):
+    index: int
+    status: str  # "CREATED", "REJECTED"
+    log_id: Optional[int] = None
+    error: Optional[str] = None
+
+class LogBatchResponse(BaseModel):
+    created: int
+    rejected: int
+    results: List[LogBatchItemResult]
+
 # --- Adherence ---
 class AdherenceResponse(BaseModel):
+    """Also the cached DTO for GET /adherence/{program_id}"""
+    program_id: int
     date: str
-    nutrition_score: float
-    strength_score: float
-    total_score: float
-    details: Dict[str, Any] # "Target vs Actual"
\ No newline at end of file
+    nutrition_score: Optional[float] = 0.0
+    strength_score: Optional[float] = 0.0
+    clinical_score: Optional[float] = 0.0
+    total_score: Optional[float] = 0.0
+    details: Optional[Dict[str, Any]] = None # "Target vs Actual"
+
+    class Config:
+        from_attributes = True
+
+# --- Trends ---
+class MeasureTrend(BaseModel):
+    daily: List[float]
+    avg_7d: List[float]   # trailing 7-day mean for each day
+    avg_30d: List[float]  # trailing 30-day mean for each day
+    percentiles: Dict[str, float]  # p10/p50/p90 of the daily values
+
+class ProgramTrends(BaseModel):
+    program_id: int
+    measures: Dict[str, MeasureTrend]  # calories, protein_g, workout_sessions, total_score
+
+class TrendsResponse(ProgramTrends):
+    start: str
+    end: str
+    dates: List[str]
+
+class CohortTrendsResponse(BaseModel):
+    start: str
+    end: str
+    dates: List[str]
+    programs: List[ProgramTrends]
+    cohort: Dict[str, MeasureTrend]  # per-day means across programs; percentiles of program means
@@ -0,0 +1,249 @@
+"""
+Adherence Engine.
+
+Every new DailyLog is reduced to a small set of measures (calories, macros,
+workout sessions, clinical check-ins) which are added to that program-day's
+DailyRollup with a single atomic upsert. The updated totals are then scored
+against the ProgramConfig goals and written to AdherenceMetric with a second
+upsert, in the same transaction.
+
+Cost per log is O(1): no rescans of the day's logs, and no read-modify-write
+(concurrent loggers for the same program-day serialize on the rollup row).
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.health import DailyLog
+from app.models.program import AdherenceMetric, DailyRollup, ProgramConfig
+
+logger = logging.getLogger(__name__)
+
+# Columns of DailyRollup that are summed from individual logs
+MEASURES = (
+    "calories", "protein_g", "carbs_g", "fats_g", "meals",
+    "workout_sessions", "clinical_checkins",
+)
+
+# Expected check-ins per day for clinical goal frequencies
+FREQUENCY_PER_DAY = {
+    "twice_daily": 2.0,
+    "daily": 1.0,
+    "weekly": 1 / 7,
+    "monthly": 1 / 30,
+}
+
+
+# --- 1. LOG -> MEASURES ---
+def _num(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def extract_measures(log_type: str, payload: Dict[str, Any]) -> Dict[str, float]:
+    """Reduce one log payload to the rollup deltas it contributes."""
+    delta = dict.fromkeys(MEASURES, 0)
+    payload = payload or {}
+    log_type = (log_type or "").upper()
+
+    if log_type == "NUTRITION":
+        macros = payload.get("macros") or {}
+        delta["calories"] = _num(payload.get("calories"))
+        for macro in ("protein_g", "carbs_g", "fats_g"):
+            delta[macro] = _num(macros.get(macro, payload.get(macro)))
+        delta["meals"] = 1
+    elif log_type == "WORKOUT":
+        delta["workout_sessions"] = _num(payload.get("sessions", 1))
+    elif log_type in ("CLINICAL", "CHECKIN"):
+        delta["clinical_checkins"] = 1
+
+    return delta
+
+
+# --- 2. TOTALS + GOALS -> SCORES ---
+def _target_ratio(actual: float, target: float) -> float:
+    """1.0 on target, linear below it, and penalised symmetrically above it."""
+    if actual <= target:
+        return actual / target
+    return max(0.0, 2 - actual / target)
+
+
+def _nutrition(totals: Dict[str, float], goals: Dict[str, Any]) -> float:
+    parts = []
+    protein_goal = _num(goals.get("protein_g"))
+    if protein_goal > 0:
+        # Protein is a floor: more is never penalised
+        parts.append(min(1.0, totals["protein_g"] / protein_goal))
+    for key in ("calories", "carbs_g", "fats_g"):
+        goal = _num(goals.get(key))
+        if goal > 0:
+            parts.append(_target_ratio(totals[key], goal))
+    if parts:
+        return sum(parts) / len(parts)
+    # No numeric targets configured: legacy rule, 1g protein = 3 points
+    return min(100.0, totals["protein_g"] * 3) / 100
+
+
+def _strength(totals: Dict[str, float], goals: Dict[str, Any]) -> Optional[float]:
+    per_week = _num(goals.get("sessions_per_week"))
+    if per_week <= 0:
+        return None
+    return min(1.0, totals["workout_sessions"] / (per_week / 7))
+
+
+def _clinical(totals: Dict[str, float], goals: Dict[str, Any]) -> Optional[float]:
+    expected = sum(
+        FREQUENCY_PER_DAY[value]
+        for value in goals.values()
+        if isinstance(value, str) and value in FREQUENCY_PER_DAY
+    )
+    if expected <= 0:
+        return None
+    return min(1.0, totals["clinical_checkins"] / expected)
+
+
+def score_day(totals: Dict[str, float], config: ProgramConfig) -> Dict[str, Any]:
+    """
+    Score one program-day. Dimensions without goals are left at 0 and excluded
+    from total_score. Scores are 0-100.
+    """
+    dimensions = {
+        "nutrition": _nutrition(totals, config.nutrition_goals or {}),
+        "strength": _strength(totals, config.strength_goals or {}),
+        "clinical": _clinical(totals, config.clinical_goals or {}),
+    }
+    scored = [value for value in dimensions.values() if value is not None]
+    total = sum(scored) / len(scored) if scored else 0.0
+
+    return {
+        "nutrition_score": round((dimensions["nutrition"] or 0.0) * 100, 1),
+        "strength_score": round((dimensions["strength"] or 0.0) * 100, 1),
+        "clinical_score": round((dimensions["clinical"] or 0.0) * 100, 1),
+        "total_score": round(total * 100, 1),
+        "details": {
+            "actual": {key: totals[key] for key in MEASURES},
+            "targets": {
+                "nutrition": config.nutrition_goals or {},
+                "strength": config.strength_goals or {},
+                "clinical": config.clinical_goals or {},
+            },
+            "scored_dimensions": [name for name, value in dimensions.items() if value is not None],
+            "status": "calculated_live",
+        },
+    }
+
+
+# --- 3. PERSISTENCE (ATOMIC UPSERTS) ---
+def _insert(db: Session):
+    """INSERT construct with ON CONFLICT support for the bound dialect."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def add_to_rollup(db: Session, program_id: int, day: str, delta: Dict[str, float], logs: int = 1) -> Dict[str, float]:
+    """Atomically add `delta` to the program-day rollup and return the new totals."""
+    table = DailyRollup.__table__
+    stmt = _insert(db)(table).values(program_id=program_id, date=day, log_count=logs, **delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["program_id", "date"],
+        set_={
+            col: table.c[col] + stmt.excluded[col]
+            for col in MEASURES + ("log_count",)
+        },
+    ).returning(*[table.c[col] for col in MEASURES])
+    return dict(db.execute(stmt).mappings().one())
+
+
+def upsert_metric(db: Session, program_id: int, day: str, scores: Dict[str, Any]):
+    """Insert or overwrite the program-day AdherenceMetric in one statement."""
+    upsert_rows(db, AdherenceMetric.__table__, [{"program_id": program_id, "date": day, **scores}])
+
+
+# Rows per multi-row upsert (keeps bound parameters well under SQLite's limit)
+UPSERT_CHUNK = 200
+
+
+def upsert_rows(db: Session, table, rows: List[Dict[str, Any]]):
+    """
+    Insert or overwrite (program_id, date) rows of `table` with multi-row
+    INSERT ... ON CONFLICT statements. Every row must have the same keys.
+    """
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        stmt = _insert(db)(table).values(rows[start:start + UPSERT_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["program_id", "date"],
+            set_={col: stmt.excluded[col] for col in rows[0] if col not in ("program_id", "date")},
+        )
+        db.execute(stmt)
+
+
+def apply_logs(db: Session, logs: Iterable[DailyLog]) -> Dict[Tuple[int, str], Optional[Dict[str, Any]]]:
+    """
+    Fold new logs into their program-day rollups and rescore each affected day.
+    Logs are summed per (program, date) first, so a batch costs one rollup
+    upsert and one metric upsert per program-day rather than per log.
+    Runs inside the caller's transaction; the caller commits.
+    Returns {(program_id, date): scores}, scores being None for programs
+    without a config yet.
+    """
+    groups: Dict[Tuple[int, str], Dict[str, float]] = {}
+    counts: Dict[Tuple[int, str], int] = defaultdict(int)
+    for log in logs:
+        key = (log.program_id, (log.timestamp or datetime.now()).strftime("%Y-%m-%d"))
+        delta = extract_measures(log.log_type, log.payload)
+        if key in groups:
+            for col in MEASURES:
+                groups[key][col] += delta[col]
+        else:
+            groups[key] = delta
+        counts[key] += 1
+
+    program_ids = {program_id for program_id, _ in groups}
+    configs = {
+        config.program_id: config
+        for config in db.query(ProgramConfig).filter(ProgramConfig.program_id.in_(program_ids))
+    }
+
+    results = {}
+    for (program_id, day), delta in groups.items():
+        totals = add_to_rollup(db, program_id, day, delta, logs=counts[(program_id, day)])
+        config = configs.get(program_id)
+        if not config:
+            results[(program_id, day)] = None
+            continue
+        scores = score_day(totals, config)
+        upsert_metric(db, program_id, day, scores)
+        logger.info(f"Adherence for program {program_id} on {day}: {scores['total_score']}")
+        results[(program_id, day)] = scores
+    return results
+
+
+def apply_log(db: Session, log: DailyLog) -> Optional[Dict[str, Any]]:
+    """
+    Fold one new log into its program-day rollup and rescore that day.
+    Returns the new scores, or None if the program has no config yet.
+    """
+    return next(iter(apply_logs(db, [log]).values()))
+
+
+def rescore_day(db: Session, program_id: int, day: str) -> Optional[Dict[str, Any]]:
+    """
+    Rescore one program-day from its existing rollup (e.g. after the goals
+    changed). Returns the new scores, or None without a rollup or config.
+    Older days are rescored in bulk by app/services/backfill.py.
+    """
+    rollup = db.query(DailyRollup).filter(DailyRollup.program_id == program_id, DailyRollup.date == day).first()
+    config = db.query(ProgramConfig).filter(ProgramConfig.program_id == program_id).first()
+    if rollup is None or config is None:
+        return None
+    scores = score_day({col: getattr(rollup, col) or 0.0 for col in MEASURES}, config)
+    upsert_metric(db, program_id, day, scores)
+    return scores
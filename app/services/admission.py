@@ -0,0 +1,161 @@
+"""
+Admission Control.
+
+Decides, before a request body is read, whether an expensive request may run
+now, may wait briefly, or must be turned away:
+
+1. Per-user rate limit: a token bucket per X-User-ID (client address when the
+   header is missing). An empty bucket -> 429 with Retry-After set to when
+   the next token arrives. A request turned away by 2. or 3. gets its token
+   back: overload is not the caller's fault, and retrying it must not use
+   up their budget.
+2. Load shedding: an optional `shed_when()` check (e.g. the analysis job
+   backlog is full) -> 503 immediately.
+3. Concurrency limit: at most `max_concurrency` requests in flight. Up to
+   `max_waiting` more may wait for a slot, each for at most `queue_timeout`
+   seconds; beyond that -> 503 with Retry-After.
+
+Rejections are cheap (no body read, no file written), so overload sheds work
+instead of piling up connections. Counters are available via stats().
+All state lives on the event loop; no locks are needed.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from app.config import settings
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate  # tokens per second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume one token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Give back a token taken for a request that was not admitted."""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+@dataclass
+class Decision:
+    admitted: bool
+    status_code: int = 200
+    retry_after: int = 0
+    detail: str = ""
+
+
+class AdmissionController:
+    # Idle buckets are full again, so forgetting the oldest loses nothing
+    MAX_BUCKETS = 10000
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_waiting: int,
+        queue_timeout: float,
+        rate_per_minute: float,
+        burst: float,
+        shed_when: Optional[Callable[[], bool]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.shed_when = shed_when
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self._counters: Dict[str, int] = defaultdict(int)
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _reject(self, reason: str, status_code: int, retry_after: float, detail: str) -> Decision:
+        self._counters[f"rejected_{reason}"] += 1
+        return Decision(False, status_code, max(1, math.ceil(retry_after)), detail)
+
+    def _busy(self, bucket: Optional[TokenBucket], reason: str) -> Decision:
+        """503 for an overloaded server; the caller's rate-limit token is returned."""
+        if bucket is not None:
+            bucket.refund()
+        return self._reject(reason, 503, self.queue_timeout, "Meal analysis is busy, please retry shortly")
+
+    async def acquire(self, client_key: str) -> Decision:
+        """Admit (holding a slot until release()) or reject one request."""
+        bucket = None
+        if self.rate > 0:
+            bucket = self._bucket(client_key)
+            wait = bucket.take()
+            if wait:
+                return self._reject("rate_limited", 429, wait, "Too many meal uploads, slow down")
+
+        if self.shed_when is not None and self.shed_when():
+            return self._busy(bucket, "shed")
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore.locked():
+            if self.waiting >= self.max_waiting:
+                return self._busy(bucket, "queue_full")
+            self.waiting += 1
+            self._counters["queued"] += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                return self._busy(bucket, "timeout")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self._counters["admitted"] += 1
+        return Decision(True)
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_waiting": self.max_waiting,
+            **self._counters,
+        }
+
+
+def build_meal_admission(shed_when: Optional[Callable[[], bool]] = None) -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=settings.MEAL_MAX_CONCURRENCY,
+        max_waiting=settings.MEAL_MAX_WAITING,
+        queue_timeout=settings.MEAL_QUEUE_TIMEOUT_S,
+        rate_per_minute=settings.MEAL_RATE_PER_MINUTE,
+        burst=settings.MEAL_RATE_BURST,
+        shed_when=shed_when,
+    )
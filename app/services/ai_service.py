@@ -1,27 +1,213 @@
-import time
+"""
+Meal Photo Inference.
+
+- Backends (InferenceBackend) analyze a *batch* of images per call: vision
+  APIs and local models are far more efficient per image that way. Pick one
+  with AI_BACKEND; MockBackend stands in for Gemini / OpenAI.
+- MealAnalyzer sits in front of the backend:
+  1. Result cache keyed by the image's content hash (in-memory LRU/TTL,
+     then the analysis stored next to the image), so repeat photos skip
+     inference entirely. Concurrent requests for the same photo share one call.
+  2. Micro-batching: concurrent requests are collected for up to
+     AI_BATCH_WAIT_MS (or until AI_BATCH_MAX are waiting), sent to the
+     backend as one batch on a small thread pool, and the results are
+     handed back to each caller.
+"""
+import asyncio
+import logging
 import random
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-class MockAIService:
+from cachetools import TTLCache
+
+from app.config import settings
+from app.services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+# --- 1. BACKENDS ---
+class InferenceBackend(ABC):
+    @abstractmethod
+    def analyze_batch(self, image_paths: List[str]) -> List[dict]:
+        """Blocking. One result per image, in order."""
+
+
+class MockBackend(InferenceBackend):
     """
     Simulates a call to Google Gemini / OpenAI.
-    Includes artificial latency to demonstrate 'Async' handling in the API.
+    One round trip per batch plus a small per-image cost.
     """
-    
-    @staticmethod
-    async def analyze_meal_image(image_path: str):
-        # Simulate network latency (1.5 seconds)
-        # This justifies why our API endpoint must be `async def`
-        time.sleep(1.5) 
-        
+
+    def __init__(self, latency: float = 1.5, per_image: float = 0.05):
+        self.latency = latency
+        self.per_image = per_image
+
+    def analyze_batch(self, image_paths: List[str]) -> List[dict]:
+        # This is a blocking call (like a vendor SDK), so it must never run on the event loop.
+        time.sleep(self.latency + self.per_image * len(image_paths))
+
         # Mock Logic: Randomly determine if it's healthy or not
         # In a real interview, you could mention "Here we would send the image bytes to Vertex AI"
-        return {
-            "food_items": ["Grilled Chicken", "Brown Rice", "Broccoli"],
-            "calories": random.randint(350, 600),
-            "macros": {
-                "protein_g": random.randint(20, 40),
-                "carbs_g": random.randint(30, 60),
-                "fats_g": random.randint(5, 15)
-            },
-            "confidence": 0.94
-        }
\ No newline at end of file
+        return [
+            {
+                "food_items": ["Grilled Chicken", "Brown Rice", "Broccoli"],
+                "calories": random.randint(350, 600),
+                "macros": {
+                    "protein_g": random.randint(20, 40),
+                    "carbs_g": random.randint(30, 60),
+                    "fats_g": random.randint(5, 15)
+                },
+                "confidence": 0.94
+            }
+            for _ in image_paths
+        ]
+
+
+BACKENDS = {
+    "mock": MockBackend,
+}
+
+
+class MockAIService:
+    """Single-image entry point, kept for scripts and existing callers."""
+
+    @staticmethod
+    def analyze_meal_image(image_path: str):
+        return MockBackend().analyze_batch([image_path])[0]
+
+
+# --- 2. CACHED, MICRO-BATCHED ANALYZER ---
+class MealAnalyzer:
+    def __init__(
+        self,
+        backend: InferenceBackend,
+        max_batch: int,
+        max_wait: float,
+        max_inflight_batches: int,
+        cache_size: int,
+        cache_ttl: float,
+    ):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_inflight_batches = max_inflight_batches
+        self._results: TTLCache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.stats = {"cache_hits": 0, "stored_hits": 0, "coalesced": 0, "inferred": 0, "batches": 0}
+
+    # --- Lifecycle ---
+    def start(self):
+        """Start the batching loop on the running loop (no-op if already running)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_inflight_batches)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_inflight_batches, thread_name_prefix="inference")
+        self._task = loop.create_task(self._batch_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # --- Public API ---
+    async def analyze(self, digest: str, image_path: str) -> dict:
+        """Analysis for one image, identified by its sha256 digest."""
+        cached = self._results.get(digest)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        pending = self._inflight.get(digest)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            analysis = await asyncio.to_thread(storage.load_analysis, digest)
+            if analysis is not None:
+                self.stats["stored_hits"] += 1
+            else:
+                self.start()
+                batch_future = self._loop.create_future()
+                await self._queue.put((image_path, batch_future))
+                analysis = await batch_future
+                await asyncio.to_thread(storage.save_analysis, digest, analysis)
+            self._results[digest] = analysis
+            future.set_result(analysis)
+            return analysis
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[digest]
+
+    # --- Batching ---
+    async def _next_batch(self) -> List[Tuple[str, "asyncio.Future"]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batch_loop(self):
+        while True:
+            batch = await self._next_batch()
+            # Keep collecting the next batch while this one is inferring
+            await self._slots.acquire()
+            self._loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: List[Tuple[str, "asyncio.Future"]]):
+        try:
+            paths = [path for path, _ in batch]
+            results = await self._loop.run_in_executor(self._executor, self.backend.analyze_batch, paths)
+            if len(results) != len(batch):
+                raise RuntimeError(f"Backend returned {len(results)} results for {len(batch)} images")
+            self.stats["batches"] += 1
+            self.stats["inferred"] += len(batch)
+            logger.info(f"Analyzed a batch of {len(batch)} meal photos")
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as exc:
+            logger.exception(f"Inference batch of {len(batch)} failed")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        finally:
+            self._slots.release()
+
+
+meal_analyzer = MealAnalyzer(
+    backend=BACKENDS[settings.AI_BACKEND](),
+    max_batch=settings.AI_BATCH_MAX,
+    max_wait=settings.AI_BATCH_WAIT_MS / 1000,
+    max_inflight_batches=settings.AI_MAX_INFLIGHT_BATCHES,
+    cache_size=settings.AI_RESULT_CACHE_SIZE,
+    cache_ttl=settings.AI_RESULT_CACHE_TTL,
+)
@@ -0,0 +1,134 @@
+"""
+Trend Analytics.
+
+Rolling averages and percentiles over a program's daily history, computed
+with NumPy instead of per-row Python loops.
+
+Inputs are the per-day tables the adherence engine already maintains:
+DailyRollup (log payloads summed per program-day) and AdherenceMetric
+(total_score). Both are loaded for every requested program in one query
+each and scattered into a dense (programs x days x measures) array, with 0
+for days without logs. Rolling windows are differences of a cumulative sum
+along the day axis, so a cohort of programs costs the same handful of array
+operations as a single one.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.program import AdherenceMetric, DailyRollup
+
+# Rollup columns first, then AdherenceMetric.total_score
+ROLLUP_MEASURES = ("calories", "protein_g", "workout_sessions")
+TREND_MEASURES = ROLLUP_MEASURES + ("total_score",)
+WINDOWS = (7, 30)
+PERCENTILES = (10, 50, 90)
+
+
+# --- 1. LOADING ---
+def load_daily_matrix(db: Session, program_ids: Sequence[int], start: date, end: date) -> np.ndarray:
+    """
+    Dense float array of shape (len(program_ids), days, len(TREND_MEASURES))
+    covering start..end inclusive. Missing program-days are 0.
+    """
+    days = (end - start).days + 1
+    matrix = np.zeros((len(program_ids), days, len(TREND_MEASURES)))
+    row_of = {program_id: i for i, program_id in enumerate(program_ids)}
+    first, last = start.isoformat(), end.isoformat()
+
+    rollups = db.execute(
+        select(DailyRollup.program_id, DailyRollup.date, *[getattr(DailyRollup, m) for m in ROLLUP_MEASURES])
+        .where(DailyRollup.program_id.in_(program_ids), DailyRollup.date.between(first, last))
+    ).all()
+    if rollups:
+        program_col, date_col, *values = zip(*rollups)
+        rows = np.fromiter((row_of[p] for p in program_col), dtype=np.intp, count=len(rollups))
+        cols = _day_index(date_col, start)
+        matrix[rows, cols, : len(ROLLUP_MEASURES)] = np.array(values, dtype=float).T
+
+    metrics = db.execute(
+        select(AdherenceMetric.program_id, AdherenceMetric.date, AdherenceMetric.total_score)
+        .where(AdherenceMetric.program_id.in_(program_ids), AdherenceMetric.date.between(first, last))
+    ).all()
+    if metrics:
+        program_col, date_col, scores = zip(*metrics)
+        rows = np.fromiter((row_of[p] for p in program_col), dtype=np.intp, count=len(metrics))
+        matrix[rows, _day_index(date_col, start), -1] = np.array(scores, dtype=float)
+
+    return np.nan_to_num(matrix)  # NULL columns come through as NaN
+
+
+def _day_index(dates: Sequence[str], start: date) -> np.ndarray:
+    """'YYYY-MM-DD' strings -> day offsets from start."""
+    return (np.array(dates, dtype="datetime64[D]") - np.datetime64(start, "D")).astype(np.intp)
+
+
+# --- 2. VECTORIZED MATH ---
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing mean over `window` days along axis 1. The output drops the first
+    window - 1 days (they only serve as lead-in for the first full window).
+    """
+    cumsum = np.cumsum(values, axis=1)
+    cumsum = np.concatenate([np.zeros_like(cumsum[:, :1]), cumsum], axis=1)
+    return (cumsum[:, window:] - cumsum[:, :-window]) / window
+
+
+def _series(array: np.ndarray) -> List[float]:
+    return np.round(array, 2).tolist()
+
+
+# --- 3. TRENDS ---
+def compute_trends(db: Session, program_ids: Sequence[int], end: date, days: int) -> Dict[str, Any]:
+    """
+    Daily values, rolling 7/30-day means and percentiles of the daily values
+    for each program over the `days` days ending at `end`, plus the cohort
+    mean of each series.
+    """
+    lead_in = max(WINDOWS) - 1
+    start = end - timedelta(days=days - 1)
+    matrix = load_daily_matrix(db, program_ids, start - timedelta(days=lead_in), end)
+
+    window = matrix[:, lead_in:, :]
+    rolling = {size: rolling_mean(matrix, size)[:, lead_in - size + 1:, :] for size in WINDOWS}
+    percentiles = np.percentile(window, PERCENTILES, axis=1)  # (len(PERCENTILES), programs, measures)
+
+    def measures(index) -> Dict[str, Any]:
+        return {
+            name: {
+                "daily": _series(window[index][..., m]),
+                **{f"avg_{size}d": _series(rolling[size][index][..., m]) for size in WINDOWS},
+                "percentiles": {
+                    f"p{p}": round(float(percentiles[i, index, m]), 2) for i, p in enumerate(PERCENTILES)
+                },
+            }
+            for m, name in enumerate(TREND_MEASURES)
+        }
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "dates": [(start + timedelta(days=i)).isoformat() for i in range(days)],
+        "programs": [
+            {"program_id": program_id, "measures": measures(i)}
+            for i, program_id in enumerate(program_ids)
+        ],
+        "cohort": _cohort(window, rolling),
+    }
+
+
+def _cohort(window: np.ndarray, rolling: Dict[int, np.ndarray]) -> Dict[str, Any]:
+    """Per-day means across programs, and percentiles of each program's period mean."""
+    period_means = window.mean(axis=1)  # (programs, measures)
+    spread = np.percentile(period_means, PERCENTILES, axis=0)  # (len(PERCENTILES), measures)
+    return {
+        name: {
+            "daily": _series(window[..., m].mean(axis=0)),
+            **{f"avg_{size}d": _series(rolling[size][..., m].mean(axis=0)) for size in WINDOWS},
+            "percentiles": {f"p{p}": round(float(spread[i][m]), 2) for i, p in enumerate(PERCENTILES)},
+        }
+        for m, name in enumerate(TREND_MEASURES)
+    }
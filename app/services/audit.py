@@ -0,0 +1,199 @@
+"""
+Audit Trail.
+
+Endpoints declare an `audited(action)` dependency; it captures who (X-User-ID)
+did what to which member / program and hands the record to AuditWriter when
+the endpoint returns. The request path only appends to an in-memory buffer.
+
+A background task flushes the buffer when it reaches AUDIT_BATCH_SIZE
+records or every AUDIT_FLUSH_INTERVAL_S seconds, as multi-row INSERTs in
+one transaction through the single writer (app/db/writer.py). Program ids
+are resolved to their member in one query per flush, not per request.
+
+The buffer is bounded (AUDIT_MAX_BUFFER). When it is full, records are
+dropped according to AUDIT_OVERFLOW ("drop_oldest" or "drop_newest") and
+counted, so a stalled database cannot grow memory or slow requests down.
+Shutdown flushes whatever is left.
+"""
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import Header, Request
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.writer import run_write_sync
+from app.models.health import AuditLog
+from app.models.program import CareProgram
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement
+INSERT_CHUNK = 200
+
+
+@dataclass
+class AuditEntry:
+    action: str
+    resource: str
+    actor_id: Optional[int] = None
+    target_member_id: Optional[int] = None
+    # Programs touched; resolved to their member at flush (one row each)
+    program_ids: List[int] = field(default_factory=list)
+    timestamp: datetime = field(default_factory=datetime.now)
+
+
+class AuditWriter:
+    def __init__(self, max_buffer: int, batch_size: int, flush_interval: float, overflow: str = "drop_oldest"):
+        if overflow not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown audit overflow policy: {overflow}")
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self._buffer: Deque[AuditEntry] = deque()
+        self._lock = threading.Lock()  # sync endpoints record from the threadpool
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    # --- Lifecycle ---
+    def start(self):
+        """Start the flush task on the running loop (no-op if already running)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # --- Request Path ---
+    def record(self, entry: AuditEntry):
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                if self.overflow == "drop_newest":
+                    return
+                self._buffer.popleft()
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.batch_size
+        if full and self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    # --- Flushing ---
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Audit flush failed; records in that batch were lost")
+
+    async def flush(self):
+        with self._lock:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        if not batch:
+            return
+        await asyncio.to_thread(run_write_sync, lambda db: _insert_entries(db, batch))
+        self.written += len(batch)
+        self.flushes += 1
+        if self.dropped:
+            logger.warning(f"Audit buffer overflowed: {self.dropped} records dropped so far")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": self.depth,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+        }
+
+
+def _insert_entries(db: Session, entries: List[AuditEntry]) -> int:
+    program_ids = {program_id for entry in entries for program_id in entry.program_ids}
+    member_of = dict(db.execute(
+        select(CareProgram.id, CareProgram.member_id).where(CareProgram.id.in_(program_ids))
+    ).all()) if program_ids else {}
+
+    rows = []
+    for entry in entries:
+        base = {
+            "actor_id": entry.actor_id,
+            "action": entry.action,
+            "resource": entry.resource,
+            "timestamp": entry.timestamp,
+        }
+        if entry.program_ids:
+            rows.extend(
+                {**base, "target_member_id": member_of.get(program_id, entry.target_member_id)}
+                for program_id in dict.fromkeys(entry.program_ids)
+            )
+        else:
+            rows.append({**base, "target_member_id": entry.target_member_id})
+
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.execute(insert(AuditLog).values(rows[start:start + INSERT_CHUNK]))
+    return len(rows)
+
+
+audit_writer = AuditWriter(
+    max_buffer=settings.AUDIT_MAX_BUFFER,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_S,
+    overflow=settings.AUDIT_OVERFLOW,
+)
+
+
+def audited(action: str):
+    """
+    Dependency factory. Member / program ids in the path are captured
+    automatically; endpoints that learn their target from the body (or
+    create it) can fill in the yielded AuditEntry before returning.
+
+        audit: AuditEntry = Depends(audited("log.create"))
+        audit.program_ids.append(log_data.program_id)
+    """
+    async def dependency(request: Request, x_user_id: Optional[int] = Header(None, alias="X-User-ID")):
+        params = request.path_params
+        entry = AuditEntry(action=action, resource=request.url.path, actor_id=x_user_id)
+        # Path params are not validated yet; malformed ids are left out
+        if str(params.get("member_id", "")).isdigit():
+            entry.target_member_id = int(params["member_id"])
+        if str(params.get("program_id", "")).isdigit():
+            entry.program_ids.append(int(params["program_id"]))
+        audit_writer.start()
+        try:
+            yield entry
+        finally:
+            audit_writer.record(entry)
+
+    return dependency
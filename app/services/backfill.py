@@ -0,0 +1,278 @@
+"""
+Adherence Backfill / Rescoring.
+
+Recomputes DailyRollup and AdherenceMetric for a set of programs over a date
+range, straight from the logs (hot table, monthly partitions and archives).
+Use it after changing the scoring rules in app/services/adherence.py or after
+a family edits its ProgramConfig goals.
+
+    python -m app.services.backfill --since 2024-01-01 --until 2024-03-31
+    python -m app.services.backfill --programs 3,7 --dry-run
+
+Programs are split into shards and rescored in a process pool. Each worker
+streams a program's logs in chunks, folds them into per-day totals, scores
+every day and writes the results back with multi-row upserts, one
+transaction per program. Days in the range left without any log lose their
+rollup and metric rows. --dry-run writes nothing and prints the per-day
+score changes instead.
+
+Each program's transaction takes the database write lock before reading its
+logs (BEGIN IMMEDIATE on SQLite, a table lock on Postgres). A log written
+by the app meanwhile either commits first and is counted, or waits and is
+added on top of the recomputed rollup, never overwritten.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select
+
+from app.db.session import SessionLocal, engine
+from app.models.program import AdherenceMetric, CareProgram, DailyRollup, ProgramConfig
+from app.services import log_store
+from app.services.adherence import MEASURES, extract_measures, score_day, upsert_rows
+
+logger = logging.getLogger(__name__)
+
+SCORE_COLUMNS = ("nutrition_score", "strength_score", "clinical_score", "total_score")
+
+
+@dataclass
+class ProgramResult:
+    program_id: int
+    logs: int = 0
+    days: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    new: int = 0
+    removed: int = 0  # days left without logs
+    skipped: Optional[str] = None  # reason the program was not rescored
+    diff: List[Dict[str, Any]] = field(default_factory=list)  # dry-run only
+
+
+# --- 1. WORKER SIDE ---
+def _init_worker():
+    # Connections inherited from the parent process must not be reused here
+    engine.dispose(close=False)
+
+
+def _day_totals(db, program_id: int, since: datetime, until: datetime, chunk_size: int):
+    totals: Dict[str, Dict[str, float]] = {}
+    counts: Dict[str, int] = defaultdict(int)
+    logs = 0
+    for chunk in log_store.iter_logs(db.connection(), program_id, since, until, chunk_size):
+        for log in chunk:
+            day = log["timestamp"].strftime("%Y-%m-%d")
+            delta = extract_measures(log["log_type"], log["payload"])
+            if day in totals:
+                for col in MEASURES:
+                    totals[day][col] += delta[col]
+            else:
+                totals[day] = delta
+            counts[day] += 1
+        logs += len(chunk)
+    return totals, counts, logs
+
+
+def _lock_for_rescore(db):
+    """Hold the write lock for the rest of the transaction (see module docstring)."""
+    conn = db.connection()
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(
+            f"LOCK TABLE {DailyRollup.__tablename__}, {AdherenceMetric.__tablename__} IN SHARE ROW EXCLUSIVE MODE"
+        )
+
+
+def rescore_program(program_id: int, since: date, until: date, chunk_size: int, dry_run: bool) -> ProgramResult:
+    """Recompute one program's rollups and metrics for since..until (inclusive)."""
+    result = ProgramResult(program_id)
+    db = SessionLocal()
+    try:
+        if not dry_run:
+            _lock_for_rescore(db)
+        config = db.query(ProgramConfig).filter(ProgramConfig.program_id == program_id).first()
+        if not config:
+            result.skipped = "no config"
+            return result
+
+        start = datetime.combine(since, datetime.min.time())
+        end = datetime.combine(until + timedelta(days=1), datetime.min.time())
+        totals, counts, result.logs = _day_totals(db, program_id, start, end, chunk_size)
+        result.days = len(totals)
+
+        scores = {day: score_day(day_totals, config) for day, day_totals in totals.items()}
+        first_day, last_day = since.isoformat(), until.isoformat()
+        existing = {
+            row.date: row for row in db.execute(
+                select(AdherenceMetric.date, *[getattr(AdherenceMetric, col) for col in SCORE_COLUMNS])
+                .where(AdherenceMetric.program_id == program_id, AdherenceMetric.date.between(first_day, last_day))
+            )
+        }
+        rollup_days = db.execute(
+            select(DailyRollup.date)
+            .where(DailyRollup.program_id == program_id, DailyRollup.date.between(first_day, last_day))
+        ).scalars()
+        # Days whose logs have all gone since they were scored
+        stale = sorted((set(existing) | set(rollup_days)) - set(scores))
+        result.removed = len(stale)
+
+        for day in sorted(scores) + stale:
+            old = existing.get(day)
+            new = scores.get(day)
+            if new is None:
+                pass
+            elif old is None:
+                result.new += 1
+            elif all(getattr(old, col) == new[col] for col in SCORE_COLUMNS):
+                result.unchanged += 1
+                continue
+            else:
+                result.changed += 1
+            if dry_run:
+                result.diff.append({
+                    "date": day,
+                    "old": {col: getattr(old, col) for col in SCORE_COLUMNS} if old else None,
+                    "new": {col: new[col] for col in SCORE_COLUMNS} if new else None,
+                })
+
+        if dry_run:
+            return result
+
+        if stale:
+            for model in (DailyRollup, AdherenceMetric):
+                db.execute(delete(model).where(model.program_id == program_id, model.date.in_(stale)))
+        if scores:
+            upsert_rows(db, DailyRollup.__table__, [
+                {"program_id": program_id, "date": day, **day_totals, "log_count": counts[day]}
+                for day, day_totals in totals.items()
+            ])
+            upsert_rows(db, AdherenceMetric.__table__, [
+                {"program_id": program_id, "date": day, **day_scores}
+                for day, day_scores in scores.items()
+            ])
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def rescore_shard(program_ids: List[int], since: date, until: date, chunk_size: int, dry_run: bool) -> List[ProgramResult]:
+    return [rescore_program(program_id, since, until, chunk_size, dry_run) for program_id in program_ids]
+
+
+# --- 2. COORDINATOR ---
+def _select_programs(program_ids: Optional[List[int]]) -> List[int]:
+    db = SessionLocal()
+    try:
+        query = select(CareProgram.id).order_by(CareProgram.id)
+        if program_ids:
+            query = query.where(CareProgram.id.in_(program_ids))
+        return list(db.execute(query).scalars())
+    finally:
+        db.close()
+
+
+def run_backfill(
+    program_ids: Optional[List[int]],
+    since: date,
+    until: date,
+    workers: int = 4,
+    shard_size: int = 25,
+    chunk_size: int = 1000,
+    dry_run: bool = False,
+    on_result=None,
+) -> Dict[str, Any]:
+    """
+    Rescore the given programs (all when None) and return a summary.
+    `on_result(ProgramResult)` is called as each program finishes.
+    """
+    programs = _select_programs(program_ids)
+    shards = [programs[i:i + shard_size] for i in range(0, len(programs), shard_size)]
+    summary = defaultdict(int)
+    started = time.perf_counter()
+
+    def collect(results: List[ProgramResult]):
+        for result in results:
+            summary["programs"] += 1
+            summary["skipped"] += result.skipped is not None
+            for key in ("logs", "days", "changed", "unchanged", "new", "removed"):
+                summary[key] += getattr(result, key)
+            if on_result:
+                on_result(result)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"[{summary['programs']}/{len(programs)} programs] {summary['logs']} logs, "
+            f"{summary['days']} days in {elapsed:.1f}s "
+            f"({summary['logs'] / elapsed if elapsed else 0:.0f} logs/s, "
+            f"{summary['programs'] / elapsed if elapsed else 0:.1f} programs/s)"
+        )
+
+    if workers <= 1 or len(shards) <= 1:
+        for shard in shards:
+            collect(rescore_shard(shard, since, until, chunk_size, dry_run))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(rescore_shard, shard, since, until, chunk_size, dry_run) for shard in shards]
+            for future in as_completed(futures):
+                collect(future.result())
+
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return dict(summary)
+
+
+def _invalidate(program_ids: List[int]):
+    # Imported here: worker processes never need the cache
+    from app.services.cache import cache
+    for program_id in program_ids:
+        cache.invalidate(f"adherence:{program_id}")
+
+
+# --- 3. CLI ---
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Recompute adherence from logs for a set of programs.")
+    parser.add_argument("--programs", help="comma-separated program ids (default: all)")
+    parser.add_argument("--since", type=date.fromisoformat, help="first day, YYYY-MM-DD (default: 90 days ago)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last day, YYYY-MM-DD (default: today)")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--shard-size", type=int, default=25, help="programs per worker task")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="logs fetched per round trip")
+    parser.add_argument("--dry-run", action="store_true", help="print score changes without writing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    until = args.until or date.today()
+    since = args.since or until - timedelta(days=89)
+    program_ids = [int(p) for p in args.programs.split(",")] if args.programs else None
+
+    rescored = []
+
+    def report(result: ProgramResult):
+        if args.dry_run and (result.diff or result.skipped):
+            print(json.dumps(asdict(result)))
+        elif result.skipped is None and (result.days or result.removed):
+            rescored.append(result.program_id)
+
+    summary = run_backfill(
+        program_ids, since, until,
+        workers=args.workers, shard_size=args.shard_size, chunk_size=args.chunk_size,
+        dry_run=args.dry_run, on_result=report,
+    )
+    if rescored:
+        _invalidate(rescored)
+    print(json.dumps({"dry_run": args.dry_run, **summary}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
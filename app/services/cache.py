@@ -0,0 +1,436 @@
+"""
+Caching layer.
+
+Two tiers behind one interface:
+- L1: in-process LRU (fast, private to one worker)
+- L2: shared backend every worker process can see (a SQLite file here;
+  the same interface fits Redis in production)
+
+Values are JSON-serialized DTOs, never live ORM objects.
+
+Invalidation is versioned: each scope (e.g. "adherence:42") has a version
+counter in the shared tier, and cache keys embed it. Bumping the counter
+makes every worker's L1/L2 entries for that scope unreachable at once;
+they then age out through their TTL.
+
+Each worker keeps its own copy of the counters in a plain dict (never
+evicted, so a counter cannot restart and revive old entries) and re-reads
+one from the shared tier at most every CACHE_VERSION_TTL_S. An L1 hit
+therefore costs no shared-tier round trip; a worker sees its own
+invalidations at once and other workers' within that interval. Without a
+shared tier the dict is the only copy of the counters.
+
+The shared tier is a blocking SQLite file, so async callers use the a*
+methods (aget, aversion(s), ainvalidate, aget_or_load), which run its reads
+and writes in a thread instead of on the event loop.
+
+get_or_load / aget_or_load coalesce concurrent misses for the same key
+(single-flight), so a burst of requests after an invalidation triggers one
+DB query. They read the version once, before loading, and store the result
+under that version: a load that overlaps an invalidation is never cached
+as current.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# --- 1. BACKENDS ---
+class CacheBackend(ABC):
+    """Byte-oriented key/value store with TTLs and atomic counters."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None): ...
+
+    @abstractmethod
+    def delete(self, key: str): ...
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        """Atomically increment a (non-expiring) counter and return the new value."""
+
+    @abstractmethod
+    def get_counter(self, key: str) -> int: ...
+
+
+class LRUBackend(CacheBackend):
+    """In-process LRU with per-entry expiry. Thread-safe."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._data.get(key, (b"0", None))[0]) + 1
+            self._data[key] = (str(value).encode(), None)
+            return value
+
+    def get_counter(self, key: str) -> int:
+        entry = self.get(key)
+        return int(entry) if entry is not None else 0
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Shared tier backed by a local SQLite file, usable by every uvicorn worker
+    on the host. One connection per thread, WAL so readers don't block.
+    The file is opened on first use, not at import.
+    """
+
+    PURGE_EVERY = 500  # sets between sweeps of expired rows
+
+    def __init__(self, path: str, ttl: Optional[float] = 60):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._sets = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+        self._sets += 1
+        if self._sets % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        row = self._conn().execute(
+            "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, 1, NULL) "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1 "
+            "RETURNING value",
+            (key,),
+        ).fetchone()
+        return int(row[0])
+
+    def get_counter(self, key: str) -> int:
+        row = self._conn().execute(
+            "SELECT CAST(value AS INTEGER) FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else 0
+
+
+# --- 2. SINGLE-FLIGHT ---
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs at most one loader per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]):
+        """Returns (result, shared) where shared is True if another caller did the work."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+# --- 3. TIERED CACHE ---
+class TieredCache:
+    def __init__(self, l1: CacheBackend, l2: Optional[CacheBackend] = None, ttl: float = 60, version_ttl: float = 1):
+        self.l1 = l1
+        self.l2 = l2
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        # scope -> (version, when it was read from L2)
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        self._versions_lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._pending: Dict[str, "asyncio.Future"] = {}
+        self._stats = defaultdict(int)
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    # --- Versions ---
+    def _known_version(self, scope: str) -> Optional[int]:
+        """The local copy of the counter, or None when it must be re-read from L2."""
+        known = self._versions.get(scope)
+        if self.l2 is None:
+            return known[0] if known else 0
+        if known is not None and time.monotonic() - known[1] < self.version_ttl:
+            return known[0]
+        return None
+
+    def _remember(self, scope: str, version: int) -> int:
+        with self._versions_lock:
+            known = self._versions.get(scope)
+            # Counters only grow: a read racing an invalidate must not roll it back
+            if known is not None and known[0] > version:
+                version = known[0]
+            self._versions[scope] = (version, time.monotonic())
+        return version
+
+    def version(self, scope: str) -> int:
+        known = self._known_version(scope)
+        if known is not None:
+            return known
+        self._count("version_reads")
+        return self._remember(scope, self.l2.get_counter(f"version:{scope}"))
+
+    def versions(self, scopes: Iterable[str]) -> Dict[str, int]:
+        return {scope: self.version(scope) for scope in scopes}
+
+    async def aversions(self, scopes: Iterable[str]) -> Dict[str, int]:
+        scopes = list(scopes)
+        known = {scope: self._known_version(scope) for scope in scopes}
+        if None in known.values():
+            # One thread hop refreshes every stale counter
+            return await asyncio.to_thread(self.versions, scopes)
+        return known
+
+    async def aversion(self, scope: str) -> int:
+        return (await self.aversions([scope]))[scope]
+
+    def invalidate(self, scope: str) -> int:
+        """Bump the scope's version: every worker misses on its next read."""
+        self._count("invalidations")
+        if self.l2 is None:
+            with self._versions_lock:
+                version = self._versions.get(scope, (0, 0.0))[0] + 1
+                self._versions[scope] = (version, time.monotonic())
+            return version
+        return self._remember(scope, self.l2.incr(f"version:{scope}"))
+
+    async def ainvalidate(self, scope: str) -> int:
+        if self.l2 is None:
+            return self.invalidate(scope)
+        return await asyncio.to_thread(self.invalidate, scope)
+
+    # --- Entries ---
+    @staticmethod
+    def _key(scope: str, key: str, version: int) -> str:
+        return f"{scope}:v{version}:{key}"
+
+    def _from_l1(self, full_key: str) -> Optional[Any]:
+        raw = self.l1.get(full_key)
+        if raw is None:
+            return None
+        self._count("l1_hits")
+        return json.loads(raw)
+
+    def _from_l2(self, full_key: str, raw: Optional[bytes]) -> Optional[Any]:
+        if raw is None:
+            self._count("misses")
+            return None
+        self._count("l2_hits")
+        self.l1.set(full_key, raw, self.ttl)
+        return json.loads(raw)
+
+    def _get_key(self, full_key: str) -> Optional[Any]:
+        value = self._from_l1(full_key)
+        if value is not None:
+            return value
+        return self._from_l2(full_key, self.l2.get(full_key) if self.l2 is not None else None)
+
+    async def _aget_key(self, full_key: str) -> Optional[Any]:
+        value = self._from_l1(full_key)
+        if value is not None:
+            return value
+        raw = await asyncio.to_thread(self.l2.get, full_key) if self.l2 is not None else None
+        return self._from_l2(full_key, raw)
+
+    def _set_key(self, full_key: str, value: Any, ttl: Optional[float]):
+        raw = json.dumps(value, default=str).encode()
+        self.l1.set(full_key, raw, ttl or self.ttl)
+        if self.l2 is not None:
+            self.l2.set(full_key, raw, ttl or self.ttl)
+
+    async def _aset_key(self, full_key: str, value: Any, ttl: Optional[float]):
+        raw = json.dumps(value, default=str).encode()
+        self.l1.set(full_key, raw, ttl or self.ttl)
+        if self.l2 is not None:
+            await asyncio.to_thread(self.l2.set, full_key, raw, ttl or self.ttl)
+
+    def get(self, scope: str, key: str) -> Optional[Any]:
+        return self._get_key(self._key(scope, key, self.version(scope)))
+
+    async def aget(self, scope: str, key: str) -> Optional[Any]:
+        return await self._aget_key(self._key(scope, key, await self.aversion(scope)))
+
+    def set(self, scope: str, key: str, value: Any, ttl: Optional[float] = None, version: Optional[int] = None):
+        """
+        `ttl` overrides the cache default for this entry. Pass the `version`
+        read before loading `value` so that an invalidation landing while it
+        was loaded leaves it unreachable instead of current.
+        """
+        if version is None:
+            version = self.version(scope)
+        self._set_key(self._key(scope, key, version), value, ttl)
+
+    async def aset(self, scope: str, key: str, value: Any, ttl: Optional[float] = None, version: Optional[int] = None):
+        if version is None:
+            version = await self.aversion(scope)
+        await self._aset_key(self._key(scope, key, version), value, ttl)
+
+    def get_or_load(self, scope: str, key: str, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """
+        Cache-aside read. `loader` must return a JSON-serializable DTO
+        (or None, which is not cached). Concurrent misses share one load.
+        The result is stored under the version read before loading.
+        """
+        full_key = self._key(scope, key, self.version(scope))
+        value = self._get_key(full_key)
+        if value is not None:
+            return value
+
+        def load():
+            # Another caller may have filled it while we waited to lead
+            cached = self._get_key(full_key)
+            if cached is not None:
+                return cached
+            self._count("loads")
+            loaded = loader()
+            if loaded is not None:
+                self._set_key(full_key, loaded, None)
+            return loaded
+
+        value, shared = self._flight.do(full_key, load)
+        if shared:
+            self._count("coalesced")
+        return value
+
+    async def aget_or_load(
+        self, scope: str, key: str, loader: Callable[[], Awaitable[Optional[Any]]]
+    ) -> Optional[Any]:
+        """
+        Async twin of get_or_load for `async def` endpoints: concurrent misses
+        on the event loop await the first caller's load instead of querying.
+        """
+        full_key = self._key(scope, key, await self.aversion(scope))
+        value = await self._aget_key(full_key)
+        if value is not None:
+            return value
+
+        pending = self._pending.get(full_key)
+        if pending is not None:
+            self._count("coalesced")
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[full_key] = future
+        try:
+            self._count("loads")
+            loaded = await loader()
+            if loaded is not None:
+                await self._aset_key(full_key, loaded, None)
+            future.set_result(loaded)
+            return loaded
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._pending[full_key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {**self._stats, "version_scopes": len(self._versions)}
+
+
+def build_cache() -> TieredCache:
+    l1 = LRUBackend(maxsize=settings.CACHE_L1_MAXSIZE, ttl=settings.CACHE_TTL)
+    l2 = None
+    if settings.CACHE_SHARED_PATH:
+        l2 = SQLiteBackend(settings.CACHE_SHARED_PATH, ttl=settings.CACHE_TTL)
+    return TieredCache(l1, l2, ttl=settings.CACHE_TTL, version_ttl=settings.CACHE_VERSION_TTL_S)
+
+
+cache = build_cache()
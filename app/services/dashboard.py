@@ -0,0 +1,145 @@
+"""
+Family Dashboard Snapshots.
+
+GET /dashboard returns members -> ACTIVE programs -> today's adherence for one
+user. The assembled DTO is stored in the tiered cache (app/services/cache.py)
+as a materialized snapshot, together with the cache versions it was built
+from:
+- "dashboard:{user_id}": bumped when the family itself changes (members,
+  enrollments, program settings)
+- "adherence:{program_id}": already bumped by every log write and config
+  change for that program
+
+A snapshot is current while all of those versions are unchanged, which is
+checked against the cache's version counters only. Every version is read
+before the queries it covers, so a write landing mid-build leaves the
+snapshot stale (rebuilt next time) rather than current.
+
+The ETag is a hash of the snapshot's content, computed once when it is
+built, so a client holding the current one gets a 304 without the database
+being touched, and a 304 always means the data is unchanged (version
+counters restart when the shared cache file is lost and are per worker
+without one, so they cannot identify the data on their own).
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.program import AdherenceMetric, CareProgram
+from app.models.user import Member
+from app.schemas.common import DashboardMember, DashboardProgram
+from app.schemas.health import AdherenceResponse
+from app.services.cache import cache
+
+
+def scope(user_id: int) -> str:
+    return f"dashboard:{user_id}"
+
+
+def invalidate(user_id: int) -> int:
+    """Call after a write that changes the family's members or programs."""
+    return cache.invalidate(scope(user_id))
+
+
+async def ainvalidate(user_id: int) -> int:
+    """invalidate() for `async def` endpoints."""
+    return await cache.ainvalidate(scope(user_id))
+
+
+async def _program_versions(program_ids) -> Dict[str, int]:
+    # JSON object keys are strings, so use them here too
+    versions = await cache.aversions(f"adherence:{program_id}" for program_id in program_ids)
+    return {topic.split(":", 1)[1]: version for topic, version in versions.items()}
+
+
+def content_etag(data: Dict[str, Any]) -> str:
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return f'"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+async def current_snapshot(user_id: int, today: str) -> Optional[Dict[str, Any]]:
+    """The cached snapshot if nothing it depends on has changed since it was built."""
+    snapshot = await cache.aget(scope(user_id), today)
+    if snapshot is None:
+        return None
+    if await _program_versions(snapshot["versions"]) != snapshot["versions"]:
+        return None
+    return snapshot
+
+
+async def build_snapshot(db: AsyncSession, user_id: int, today: str) -> Dict[str, Any]:
+    """Three queries regardless of family size: members, active programs, today's metrics."""
+    family_version = await cache.aversion(scope(user_id))
+    members = (await db.execute(
+        select(Member).where(Member.user_id == user_id).order_by(Member.id)
+    )).scalars().all()
+
+    programs = (await db.execute(
+        select(CareProgram)
+        .where(CareProgram.member_id.in_([member.id for member in members]), CareProgram.status == "ACTIVE")
+        .order_by(CareProgram.id)
+    )).scalars().all() if members else []
+
+    # Read before the metrics query, like family_version before the members query
+    versions = await _program_versions(program.id for program in programs)
+
+    metrics = {
+        metric.program_id: metric for metric in (await db.execute(
+            select(AdherenceMetric).where(
+                AdherenceMetric.program_id.in_([program.id for program in programs]),
+                AdherenceMetric.date == today,
+            )
+        )).scalars()
+    } if programs else {}
+
+    by_member: Dict[int, list] = {}
+    for program in programs:
+        metric = metrics.get(program.id)
+        by_member.setdefault(program.member_id, []).append(DashboardProgram(
+            id=program.id,
+            title=program.title,
+            status=program.status,
+            phase=program.phase,
+            start_date=program.start_date,
+            end_date=program.end_date,
+            adherence=AdherenceResponse.model_validate(metric) if metric else None,
+        ))
+
+    data = {
+        "user_id": user_id,
+        "date": today,
+        "members": [
+            DashboardMember(
+                **{field: getattr(member, field) for field in DashboardMember.model_fields if field != "programs"},
+                programs=by_member.get(member.id, []),
+            ).model_dump(mode="json")
+            for member in members
+        ],
+    }
+    snapshot = {"date": today, "versions": versions, "etag": content_etag(data), "data": data}
+    # Versions decide freshness, so an unchanged snapshot outlives CACHE_TTL.
+    # Stored under the family version the members were read at.
+    await cache.aset(
+        scope(user_id), today, snapshot, ttl=settings.CACHE_DASHBOARD_TTL, version=family_version,
+    )
+    return snapshot
+
+
+async def get_dashboard(db: AsyncSession, user_id: int, if_none_match: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Returns (data, etag); data is None when `if_none_match` already holds
+    the current ETag (answer 304). Only builds from the DB on a stale snapshot.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    snapshot = await current_snapshot(user_id, today)
+    if snapshot is None:
+        snapshot = await build_snapshot(db, user_id, today)
+    tag = snapshot.get("etag") or content_etag(snapshot["data"])
+    if if_none_match and tag in [candidate.strip() for candidate in if_none_match.split(",")]:
+        return None, tag
+    return snapshot["data"], tag
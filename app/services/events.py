@@ -0,0 +1,142 @@
+"""
+In-process pub/sub for adherence updates.
+
+Writers publish the new scores of a program-day after their transaction
+commits; every open push connection (SSE, app/api/v1/events.py) subscribed
+to that program receives them.
+
+- Coalescing: a subscription keeps only the latest message per topic, so a
+  burst of logs for one program reaches a client as a single update.
+- Bounded buffers: that pending map never holds more than one entry per
+  subscribed topic, and topics per subscription are capped, so a slow
+  client costs a fixed amount of memory no matter how far behind it is.
+- Thread-safe publish: the meal-analysis workers and the single writer run
+  on threads; their publishes are handed to the event loop with
+  call_soon_threadsafe. Fan-out itself only ever runs on the loop.
+
+The broker is per process. With several uvicorn workers, a subscriber also
+notices writes handled elsewhere through the shared cache version (see the
+heartbeat in app/api/v1/events.py).
+"""
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscribersError(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, broker: "Broker", topics: Iterable[str]):
+        self.broker = broker
+        self.topics = list(dict.fromkeys(topics))
+        self._pending: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self.coalesced = 0
+
+    def _offer(self, topic: str, seq: int, message: Any):
+        if topic in self._pending:
+            self.coalesced += 1
+        self._pending[topic] = (seq, message)
+        self._ready.set()
+
+    async def next_batch(self, timeout: Optional[float] = None, window: float = 0) -> List[Tuple[str, int, Any]]:
+        """
+        Wait up to `timeout` for messages, then linger `window` seconds so
+        rapid follow-ups collapse into the same batch. [] on timeout.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        if window:
+            await asyncio.sleep(window)
+        batch = [(topic, seq, message) for topic, (seq, message) in self._pending.items()]
+        self._pending.clear()
+        self._ready.clear()
+        return batch
+
+    def close(self):
+        self.broker._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Broker:
+    def __init__(self, max_subscribers: int, max_topics: int):
+        self.max_subscribers = max_subscribers
+        self.max_topics = max_topics
+        self._subs: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq = itertools.count(1)
+        self.published = 0
+
+    # --- Subscribers (event loop only) ---
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, topics)
+        if len(subscription.topics) > self.max_topics:
+            raise ValueError(f"At most {self.max_topics} topics per subscription")
+        if self._count >= self.max_subscribers:
+            raise TooManySubscribersError()
+        self._loop = asyncio.get_running_loop()
+        for topic in subscription.topics:
+            self._subs[topic].add(subscription)
+        self._count += 1
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        removed = False
+        for topic in subscription.topics:
+            subscribers = self._subs.get(topic)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                removed = True
+                if not subscribers:
+                    del self._subs[topic]
+        if removed:
+            self._count -= 1
+
+    @property
+    def subscribers(self) -> int:
+        return self._count
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscribers": self._count, "topics": len(self._subs), "published": self.published}
+
+    # --- Publishers (any thread) ---
+    def publish(self, topic: str, message: Any):
+        if not self._subs.get(topic) or self._loop is None:
+            return  # Nobody listening: publishing is free
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._fanout(topic, message)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fanout, topic, message)
+
+    def _fanout(self, topic: str, message: Any):
+        seq = next(self._seq)
+        self.published += 1
+        for subscription in list(self._subs.get(topic, ())):
+            subscription._offer(topic, seq, message)
+
+
+def adherence_topic(program_id: int) -> str:
+    return f"adherence:{program_id}"
+
+
+broker = Broker(settings.EVENTS_MAX_SUBSCRIBERS, settings.EVENTS_MAX_TOPICS)
@@ -0,0 +1,117 @@
+"""
+Member Health Export.
+
+Streams everything stored for one member: their CarePrograms, every DailyLog
+of those programs (all tiers, see app/services/log_store.py) and their
+AdherenceMetrics, as NDJSON or CSV, optionally gzip'd on the fly.
+
+Rows come off server-side cursors CHUNK_SIZE at a time and each chunk is
+encoded and handed to the response before the next one is fetched, so memory
+stays flat however long the history is. The generators are synchronous and
+open their own connection: StreamingResponse iterates them on the threadpool,
+after the request's session has already been closed.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from app.db.session import engine
+from app.models.program import AdherenceMetric, CareProgram
+from app.services import log_store
+
+# Rows per cursor fetch (and per encoded chunk)
+CHUNK_SIZE = 1000
+
+PROGRAM_TABLE = CareProgram.__table__
+ADHERENCE_TABLE = AdherenceMetric.__table__
+
+# CSV: one `record` column, then the union of the three tables' columns
+CSV_COLUMNS = ["record"] + list(dict.fromkeys(
+    [column.name for column in PROGRAM_TABLE.columns]
+    + log_store.COLUMNS
+    + [column.name for column in ADHERENCE_TABLE.columns]
+))
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+# --- 1. ROWS ---
+def _stream(conn: Connection, query) -> Iterator[List[Dict[str, Any]]]:
+    result = conn.execute(query, execution_options={"yield_per": CHUNK_SIZE})
+    for chunk in result.mappings().partitions():
+        yield [dict(row) for row in chunk]
+
+
+def iter_records(member_id: int, include_archived: bool = True) -> Iterator[List[Dict[str, Any]]]:
+    """Chunks of rows tagged with their `record` type: programs, then logs, then adherence."""
+    with engine.connect() as conn:
+        program_ids = []
+        for chunk in _stream(conn, select(PROGRAM_TABLE).where(PROGRAM_TABLE.c.member_id == member_id).order_by(PROGRAM_TABLE.c.id)):
+            program_ids.extend(row["id"] for row in chunk)
+            yield [{"record": "program", **row} for row in chunk]
+
+        for program_id in program_ids:
+            for chunk in log_store.iter_logs(conn, program_id, chunk_size=CHUNK_SIZE, include_archived=include_archived):
+                yield [{"record": "log", **row} for row in chunk]
+
+        if program_ids:
+            query = (
+                select(ADHERENCE_TABLE)
+                .where(ADHERENCE_TABLE.c.program_id.in_(program_ids))
+                .order_by(ADHERENCE_TABLE.c.program_id, ADHERENCE_TABLE.c.date)
+            )
+            for chunk in _stream(conn, query):
+                yield [{"record": "adherence", **row} for row in chunk]
+
+
+# --- 2. ENCODING ---
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson(chunks: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield "".join(
+            json.dumps({key: _jsonable(value) for key, value in row.items()}) + "\n" for row in chunk
+        ).encode()
+
+
+def _csv_cell(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return _jsonable(value)
+
+
+def _csv(chunks: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for chunk in chunks:
+        writer.writerows({key: _csv_cell(value) for key, value in row.items()} for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _gzip(parts: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # gzip container
+    for part in parts:
+        compressed = compressor.compress(part)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_member(member_id: int, format: str = "ndjson", compress: bool = False, include_archived: bool = True) -> Iterator[bytes]:
+    """The encoded export body, chunk by chunk."""
+    encode = _csv if format == "csv" else _ndjson
+    body = encode(iter_records(member_id, include_archived))
+    return _gzip(body) if compress else body
@@ -0,0 +1,163 @@
+"""
+Idempotency-Key Store.
+
+Clients on flaky networks retry POSTs. When they send an `Idempotency-Key`
+header, the first request with that key runs and its response is stored;
+retries get the stored response back instead of running again.
+
+- Completed responses live in a bounded TTL map in-process, and in the
+  shared cache tier (when configured) so a retry that lands on another
+  uvicorn worker is replayed too.
+- A retry that arrives while the first request is still running waits for
+  it, so a retry storm costs one unit of work. This coalescing only works
+  within one process: the shared tier holds completed responses only, so a
+  retry that reaches another worker while the first attempt is still
+  running is executed again there.
+- 5xx responses and failures are not stored: the next retry runs again.
+- A response can be stored for less than IDEMPOTENCY_TTL_S (finish's `ttl`),
+  e.g. a 202 whose job result expires sooner: replaying it any longer would
+  send the client to a 404.
+- A fingerprint of the request body is stored with the response. A key
+  reused with a different body gets 422 instead of the first response.
+  Multipart boundaries are left out of the fingerprint, since clients pick
+  a new one per attempt.
+
+Keys are scoped per caller (X-User-ID or client address) and route. The
+shared tier is a blocking SQLite file, so it is only touched from a thread.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.config import settings
+from app.services.cache import CacheBackend, cache
+
+
+_BOUNDARY = re.compile(rb'boundary="?([^";]+)"?')
+
+
+class BodyFingerprint:
+    """Streaming sha256 of a request body, with multipart boundaries blanked out."""
+
+    def __init__(self, content_type: Optional[bytes]):
+        match = _BOUNDARY.search(content_type or b"")
+        self._boundary = match.group(1) if match else b""
+        self._hash = hashlib.sha256()
+        self._tail = b""  # may hold the start of a boundary split across chunks
+
+    def update(self, chunk: bytes):
+        if not self._boundary:
+            self._hash.update(chunk)
+            return
+        data = (self._tail + chunk).replace(self._boundary, b"")
+        split = max(len(data) - (len(self._boundary) - 1), 0)
+        self._hash.update(data[:split])
+        self._tail = data[split:]
+
+    def hexdigest(self) -> str:
+        final = self._hash.copy()
+        final.update(self._tail)
+        return final.hexdigest()
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    fingerprint: str = ""  # of the request body that produced it
+    expires_at: Optional[float] = None  # wall clock; None = the store's TTL
+
+    def dumps(self) -> bytes:
+        return json.dumps({
+            "status": self.status,
+            "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in self.headers],
+            "body": base64.b64encode(self.body).decode(),
+            "fingerprint": self.fingerprint,
+            "expires_at": self.expires_at,
+        }).encode()
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "StoredResponse":
+        data = json.loads(raw)
+        return cls(
+            status=data["status"],
+            headers=[(name.encode("latin-1"), value.encode("latin-1")) for name, value in data["headers"]],
+            body=base64.b64decode(data["body"]),
+            fingerprint=data.get("fingerprint", ""),
+            expires_at=data.get("expires_at"),
+        )
+
+
+class IdempotencyStore:
+    def __init__(self, maxsize: int, ttl: float, shared: Optional[CacheBackend] = None):
+        self.ttl = ttl
+        self.shared = shared
+        self._done: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+        self.replayed = 0
+        self.mismatched = 0
+
+    @staticmethod
+    def make_key(caller: str, method: str, path: str, key: str) -> str:
+        return hashlib.sha256(f"{caller}|{method}|{path}|{key}".encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        response = self._done.get(key)
+        if response is None and self.shared is not None:
+            raw = await asyncio.to_thread(self.shared.get, f"idempotency:{key}")
+            if raw is not None:
+                response = self._done[key] = StoredResponse.loads(raw)
+        if response is not None and response.expires_at is not None and response.expires_at <= time.time():
+            self._done.pop(key, None)
+            return None
+        return response
+
+    def begin(self, key: str) -> Optional["asyncio.Future"]:
+        """
+        Claim `key` for this request. Returns None if the caller should run
+        the request, or the in-flight request's future to wait on.
+        """
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return pending
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "stored": len(self._done),
+            "in_flight": len(self._inflight),
+            "replayed": self.replayed,
+            "mismatched": self.mismatched,
+        }
+
+    async def finish(self, key: str, response: Optional[StoredResponse], ttl: Optional[float] = None):
+        """
+        Store the outcome (None = not storable) and release waiters.
+        `ttl` shortens how long this response is replayed (never lengthens it).
+        """
+        ttl = min(ttl, self.ttl) if ttl is not None else self.ttl
+        if response is not None:
+            if ttl < self.ttl:
+                response.expires_at = time.time() + ttl
+            self._done[key] = response
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(response)
+        if response is not None and self.shared is not None:
+            await asyncio.to_thread(self.shared.set, f"idempotency:{key}", response.dumps(), ttl)
+
+
+idempotency_store = IdempotencyStore(
+    maxsize=settings.IDEMPOTENCY_MAX_KEYS,
+    ttl=settings.IDEMPOTENCY_TTL_S,
+    shared=cache.l2,
+)
@@ -0,0 +1,141 @@
+import asyncio
+import enum
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+@dataclass
+class Job:
+    id: str
+    params: Dict[str, Any]
+    status: JobStatus = JobStatus.PENDING
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+
+class JobQueue:
+    """
+    In-process background job queue.
+
+    - A bounded asyncio.Queue holds pending jobs (submit fails fast when full).
+    - `workers` coroutines pull jobs. A blocking handler runs on a dedicated
+      thread pool, so it never stalls the event loop; an `async def` handler
+      is awaited directly (and can batch work across jobs).
+    - Pending jobs are tracked in a plain dict until they finish, then move to
+      a TTLCache so clients can poll for results (the TTL starts at
+      completion, and a busy queue cannot evict a job still in flight).
+
+    Workers are started lazily on the first submit, inside the running loop.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Job], Any],  # returns the result dict (or awaitable of it)
+        workers: int,
+        maxsize: int,
+        result_ttl: float,
+        result_maxsize: int = 10000,
+        name: str = "jobs",
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.name = name
+        self._pending: Dict[str, Job] = {}
+        self._jobs: TTLCache = TTLCache(maxsize=result_maxsize, ttl=result_ttl)
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # --- Lifecycle ---
+    def start(self):
+        """Start the worker pool on the running loop (no-op if already running)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if self._executor is None and not asyncio.iscoroutinefunction(self.handler):
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix=self.name
+            )
+        self._tasks = [
+            loop.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} '{self.name}' workers (queue size {self.maxsize})")
+
+    async def stop(self):
+        """Cancel the workers and release the thread pool."""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # --- Public API ---
+    def submit(self, **params) -> Job:
+        """Enqueue a job. Raises QueueFullError instead of waiting for space."""
+        self.start()
+        job = Job(id=uuid.uuid4().hex, params=params)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"'{self.name}' queue is full ({self.maxsize} pending)")
+        self._pending[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._pending.get(job_id)
+        return job if job is not None else self._jobs.get(job_id)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"depth": self.depth, "maxsize": self.maxsize, "pending_jobs": len(self._pending), "finished_jobs": len(self._jobs)}
+
+    # --- Worker ---
+    async def _worker(self, index: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                if asyncio.iscoroutinefunction(self.handler):
+                    job.result = await self.handler(job)
+                else:
+                    job.result = await loop.run_in_executor(self._executor, self.handler, job)
+                job.status = JobStatus.COMPLETED
+            except Exception as exc:
+                logger.exception(f"Job {job.id} failed")
+                job.error = str(exc)
+                job.status = JobStatus.FAILED
+            finally:
+                job.finished_at = datetime.utcnow()
+                self._jobs[job.id] = job
+                self._pending.pop(job.id, None)
+                self._queue.task_done()
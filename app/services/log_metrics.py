@@ -0,0 +1,200 @@
+"""
+Extracted Payload Fields.
+
+DailyLog.payload is free-form JSON. The fields people filter on (calories,
+macros, blood pressure, workout sessions) are copied into LogMetric at write
+time, one typed row per (log, field), so questions like "systolic above 140
+this month" are a range scan over an index instead of parsing every payload.
+
+Which fields are extracted, and where they are looked up in the payload, is
+declared per log_type in FIELDS. Non-numeric or missing values are skipped.
+
+Existing logs (every tier, see app/services/log_store.py) are indexed with:
+    python -m app.services.log_metrics
+"""
+import argparse
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.health import LogMetric
+
+logger = logging.getLogger(__name__)
+
+# log_type -> field -> payload paths to try, in order ("a.b" = nested key)
+FIELDS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "NUTRITION": {
+        "calories": ("calories",),
+        "protein_g": ("macros.protein_g", "protein_g"),
+        "carbs_g": ("macros.carbs_g", "carbs_g"),
+        "fats_g": ("macros.fats_g", "fats_g"),
+    },
+    "WORKOUT": {
+        "sessions": ("sessions",),
+    },
+    "CLINICAL": {
+        "systolic": ("systolic", "blood_pressure.systolic", "bp.systolic"),
+        "diastolic": ("diastolic", "blood_pressure.diastolic", "bp.diastolic"),
+    },
+}
+FIELDS["CHECKIN"] = FIELDS["CLINICAL"]
+
+ALL_FIELDS = sorted({name for fields in FIELDS.values() for name in fields})
+
+# Rows per INSERT statement
+INSERT_CHUNK = 500
+
+
+# --- 1. EXTRACTION ---
+def _lookup(payload: Dict[str, Any], path: str) -> Any:
+    value: Any = payload
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_fields(log_type: str, payload: Dict[str, Any]) -> Dict[str, float]:
+    """The numeric hot fields present in one payload."""
+    found = {}
+    payload = payload or {}
+    for name, paths in FIELDS.get((log_type or "").upper(), {}).items():
+        for path in paths:
+            value = _number(_lookup(payload, path))
+            if value is not None:
+                found[name] = value
+                break
+    # Blood pressure sent as a single "120/80" reading
+    bp = payload.get("blood_pressure") if isinstance(payload, dict) else None
+    if isinstance(bp, str) and "/" in bp and (log_type or "").upper() in ("CLINICAL", "CHECKIN"):
+        systolic, _, diastolic = bp.partition("/")
+        for name, raw in (("systolic", systolic), ("diastolic", diastolic)):
+            value = _number(raw.strip())
+            if value is not None:
+                found.setdefault(name, value)
+    return found
+
+
+def _rows(logs: Iterable[Any]) -> List[Dict[str, Any]]:
+    """LogMetric rows for ORM logs or row dicts."""
+    rows = []
+    for log in logs:
+        get = log.get if isinstance(log, dict) else lambda key: getattr(log, key)
+        for name, value in extract_fields(get("log_type"), get("payload")).items():
+            rows.append({
+                "log_id": get("id"),
+                "program_id": get("program_id"),
+                "log_type": get("log_type"),
+                "field": name,
+                "value": value,
+                "timestamp": get("timestamp"),
+            })
+    return rows
+
+
+def _insert_rows(db: Session, rows: List[Dict[str, Any]]):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.execute(insert(LogMetric).values(rows[start:start + INSERT_CHUNK]))
+
+
+# --- 2. WRITE PATH ---
+def index_logs(db: Session, logs: Iterable[Any]) -> int:
+    """
+    Extract the hot fields of freshly inserted (flushed) logs.
+    Runs inside the caller's write transaction.
+    """
+    rows = _rows(logs)
+    _insert_rows(db, rows)
+    return len(rows)
+
+
+def reindex_logs(db: Session, logs: List[Dict[str, Any]]) -> int:
+    """Replace the extracted fields of already-stored logs (idempotent)."""
+    db.execute(delete(LogMetric).where(LogMetric.log_id.in_([log["id"] for log in logs])))
+    return index_logs(db, logs)
+
+
+# --- 3. READ PATH ---
+def range_query(
+    program_id: int,
+    field: str,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: int = 100,
+):
+    """
+    SELECT for one program's values of `field`, newest first, answered from
+    ix_log_metrics_program_field_timestamp. Keyset-paginated on (timestamp, log_id).
+    """
+    conditions = [LogMetric.program_id == program_id, LogMetric.field == field]
+    if min_value is not None:
+        conditions.append(LogMetric.value >= min_value)
+    if max_value is not None:
+        conditions.append(LogMetric.value <= max_value)
+    if since:
+        conditions.append(LogMetric.timestamp >= since)
+    if until:
+        conditions.append(LogMetric.timestamp < until)
+    if after:
+        after_timestamp, after_id = after
+        conditions.append(or_(
+            LogMetric.timestamp < after_timestamp,
+            and_(LogMetric.timestamp == after_timestamp, LogMetric.log_id < after_id),
+        ))
+    return (
+        select(LogMetric.log_id, LogMetric.field, LogMetric.value, LogMetric.timestamp)
+        .where(*conditions)
+        .order_by(LogMetric.timestamp.desc(), LogMetric.log_id.desc())
+        .limit(limit)
+    )
+
+
+# --- 4. BACKFILL ---
+def backfill(chunk_size: int = 1000, include_archived: bool = True) -> Dict[str, int]:
+    """(Re)extract fields for every stored log, one transaction per chunk."""
+    from app.db.session import SessionLocal, engine
+    from app.services import log_store
+
+    totals = {"logs": 0, "fields": 0}
+    with engine.connect() as reader:
+        for chunk in log_store.iter_all_logs(reader, chunk_size, include_archived):
+            db = SessionLocal()
+            try:
+                totals["fields"] += reindex_logs(db, chunk)
+                db.commit()
+            finally:
+                db.close()
+            totals["logs"] += len(chunk)
+            logger.info(f"Indexed {totals['logs']} logs ({totals['fields']} fields)")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract hot payload fields of existing logs into log_metrics.")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--skip-archived", action="store_true", help="leave archived months out")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(backfill(args.chunk_size, include_archived=not args.skip_archived)))
+
+
+if __name__ == "__main__":
+    main()
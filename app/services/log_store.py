@@ -0,0 +1,571 @@
+"""
+Time-partitioned DailyLog storage.
+
+Three tiers, newest to oldest:
+- Hot: the `daily_logs` table. Every write lands here, so the ORM model, the
+  adherence engine and the single writer are unchanged. It only holds the
+  current month (plus any backdated logs since the last rotation), so it and
+  its index stay small enough to live in the page cache.
+- Warm: one table per closed month, `daily_logs_YYYY_MM`, same columns and
+  (program_id, timestamp, id) index. Range queries only open the months they
+  overlap.
+- Cold: months older than LOG_RETENTION_MONTHS are compacted into one
+  gzip'd columnar file per month under LOG_ARCHIVE_DIR (rows sorted by
+  program, one JSON array per column) and their table is dropped. Archived
+  history is only read when a caller asks for it, and only the requested
+  program's rows are turned into dicts (its rows are contiguous, found by
+  bisecting the program_id column). Decoded months are kept as columns in
+  an LRU bounded by LOG_ARCHIVE_CACHE_ROWS in total. The file is staged as
+  `.pending` and only moved into place once the transaction dropping the
+  table commits (removed on rollback), so a month is never both a table and
+  an archive.
+
+Read paths list the warm tables through cached_partitions(), which only
+re-inspects the schema when it changed: on SQLite, PRAGMA schema_version
+moves with every committed CREATE/DROP (including ones made by the
+compaction job in another process); other databases re-list every
+LOG_PARTITION_CACHE_S seconds. Compaction itself always lists afresh.
+
+Adherence never reads raw logs (it works off DailyRollup), so moving logs
+between tiers does not change any score.
+
+Compaction (rotate + archive) is a job:
+    python -m app.services.log_store [--dry-run]
+"""
+import argparse
+import bisect
+import gzip
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, and_, event, func, inspect, or_, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.health import DailyLog
+
+logger = logging.getLogger(__name__)
+
+HOT_TABLE = DailyLog.__table__
+PARTITION_PATTERN = re.compile(r"^daily_logs_(\d{4})_(\d{2})$")
+ARCHIVE_SUFFIX = ".cols.json.gz"
+PENDING_SUFFIX = ".pending"
+COLUMNS = [column.name for column in HOT_TABLE.columns]
+
+Month = Tuple[int, int]
+
+_partition_metadata = MetaData()
+
+
+# --- 1. MONTHS & PARTITION TABLES ---
+def month_of(timestamp: datetime) -> Month:
+    return timestamp.year, timestamp.month
+
+
+def month_start(month: Month) -> datetime:
+    return datetime(month[0], month[1], 1)
+
+
+def next_month(month: Month) -> Month:
+    year, number = month
+    return (year + 1, 1) if number == 12 else (year, number + 1)
+
+
+def months_before(month: Month, count: int) -> Month:
+    year, number = month
+    index = year * 12 + (number - 1) - count
+    return index // 12, index % 12 + 1
+
+
+def partition_name(month: Month) -> str:
+    return f"daily_logs_{month[0]:04d}_{month[1]:02d}"
+
+
+def partition_table(month: Month) -> Table:
+    """Table object for one month (same columns as daily_logs, no FK)."""
+    name = partition_name(month)
+    table = _partition_metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, _partition_metadata,
+            *[Column(c.name, c.type, primary_key=c.primary_key) for c in HOT_TABLE.columns],
+            Index(f"ix_{name}_program_timestamp", "program_id", "timestamp", "id"),
+        )
+    return table
+
+
+def list_partitions(conn: Connection) -> List[Month]:
+    """Warm months present in the database, oldest first (always inspects)."""
+    months = []
+    for name in inspect(conn).get_table_names():
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            months.append((int(match.group(1)), int(match.group(2))))
+    return sorted(months)
+
+
+# (schema stamp, listed at, months) of the last list_partitions() on a read path
+_partition_cache: Optional[Tuple[Optional[int], float, List[Month]]] = None
+_partition_cache_lock = threading.Lock()
+
+
+def _schema_stamp(conn: Connection) -> Optional[int]:
+    """A counter that changes whenever a table is created or dropped, if the database has one."""
+    if conn.dialect.name == "sqlite":
+        return conn.exec_driver_sql("PRAGMA schema_version").scalar()
+    return None
+
+
+def cached_partitions(conn: Connection) -> List[Month]:
+    """list_partitions() for read paths, re-inspected only when the schema changed."""
+    global _partition_cache
+    stamp = _schema_stamp(conn)
+    cached = _partition_cache
+    if cached is not None:
+        cached_stamp, listed_at, months = cached
+        if stamp is not None and stamp == cached_stamp:
+            return months
+        if stamp is None and time.monotonic() - listed_at < settings.LOG_PARTITION_CACHE_S:
+            return months
+    months = list_partitions(conn)
+    with _partition_cache_lock:
+        _partition_cache = (stamp, time.monotonic(), months)
+    return months
+
+
+def forget_partitions(*_args):
+    """Drop the cached partition list (this process re-lists on its next read)."""
+    global _partition_cache
+    with _partition_cache_lock:
+        _partition_cache = None
+
+
+def list_archives() -> List[Month]:
+    """Cold months present in the archive directory, oldest first."""
+    if not os.path.isdir(settings.LOG_ARCHIVE_DIR):
+        return []
+    months = []
+    for filename in os.listdir(settings.LOG_ARCHIVE_DIR):
+        if filename.endswith(ARCHIVE_SUFFIX):
+            match = PARTITION_PATTERN.match(filename[: -len(ARCHIVE_SUFFIX)])
+            if match:
+                months.append((int(match.group(1)), int(match.group(2))))
+    return sorted(months)
+
+
+def archive_path(month: Month) -> str:
+    return os.path.join(settings.LOG_ARCHIVE_DIR, partition_name(month) + ARCHIVE_SUFFIX)
+
+
+# --- 2. COMPACTION ---
+def rotate(conn: Connection, current: Month, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Move every log older than `current` month out of the hot table into its
+    month's partition (created on first use). Returns {partition: rows}.
+    """
+    # SQLite hands out max(rowid) + 1 as the next id. Leaving the newest row
+    # behind keeps ids from being reused after the hot table is drained.
+    max_id = conn.execute(select(func.max(HOT_TABLE.c.id))).scalar()
+    if max_id is None:
+        return {}
+    cutoff = month_start(current)
+    rows = conn.execute(
+        select(HOT_TABLE.c.timestamp).where(HOT_TABLE.c.timestamp < cutoff, HOT_TABLE.c.id < max_id)
+    ).scalars()
+    counts: Dict[Month, int] = {}
+    for timestamp in rows:
+        counts[month_of(timestamp)] = counts.get(month_of(timestamp), 0) + 1
+
+    moved = {}
+    if counts and not dry_run:
+        _forget_partitions_on_end(conn)
+    for month, count in sorted(counts.items()):
+        moved[partition_name(month)] = count
+        if dry_run:
+            continue
+        table = partition_table(month)
+        table.create(conn, checkfirst=True)
+        in_month = and_(
+            HOT_TABLE.c.timestamp >= month_start(month),
+            HOT_TABLE.c.timestamp < month_start(next_month(month)),
+            HOT_TABLE.c.id < max_id,
+        )
+        conn.execute(table.insert().from_select(COLUMNS, select(HOT_TABLE).where(in_month)))
+        conn.execute(HOT_TABLE.delete().where(in_month))
+        logger.info(f"Rotated {count} logs into {table.name}")
+    return moved
+
+
+def _write_archive(month: Month, rows: List[Dict[str, Any]]):
+    """
+    Columnar layout: one array per column, rows sorted by (program_id, timestamp, id).
+    Written to the month's pending path; _publish_on_commit moves it into place.
+    """
+    path = archive_path(month) + PENDING_SUFFIX
+    document = {
+        "partition": partition_name(month),
+        "rows": len(rows),
+        "columns": {
+            name: [
+                row[name].isoformat() if isinstance(row[name], datetime) else row[name]
+                for row in rows
+            ]
+            for name in COLUMNS
+        },
+    }
+    os.makedirs(settings.LOG_ARCHIVE_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(document, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _forget_partitions_on_end(conn: Connection):
+    """The tables are changing: re-list once the transaction ends, whichever way."""
+    forget_partitions()
+    event.listen(conn, "commit", forget_partitions, once=True)
+    event.listen(conn, "rollback", forget_partitions, once=True)
+
+
+def _publish(month: Month):
+    pending = archive_path(month) + PENDING_SUFFIX
+    if os.path.exists(pending):  # a recovering run may have got there first
+        os.replace(pending, archive_path(month))
+
+
+def _publish_on_commit(conn: Connection, months: List[Month]):
+    """Publish the months' pending archives when `conn` commits; delete them on rollback."""
+    def publish(_conn):
+        while months:
+            _publish(months.pop())
+
+    def discard(_conn):
+        while months:
+            pending = archive_path(months.pop()) + PENDING_SUFFIX
+            if os.path.exists(pending):
+                os.remove(pending)
+
+    event.listen(conn, "commit", publish, once=True)
+    event.listen(conn, "rollback", discard, once=True)
+
+
+def _recover_pending(conn: Connection):
+    """
+    A pending archive whose table is gone was committed by a run that stopped
+    before publishing it. One whose table still exists is left alone: it is
+    rewritten when that month is archived again.
+    """
+    if not os.path.isdir(settings.LOG_ARCHIVE_DIR):
+        return
+    warm = set(list_partitions(conn))
+    for filename in os.listdir(settings.LOG_ARCHIVE_DIR):
+        if not filename.endswith(ARCHIVE_SUFFIX + PENDING_SUFFIX):
+            continue
+        match = PARTITION_PATTERN.match(filename[: -len(ARCHIVE_SUFFIX + PENDING_SUFFIX)])
+        if match and (int(match.group(1)), int(match.group(2))) not in warm:
+            month = (int(match.group(1)), int(match.group(2)))
+            logger.warning(f"Publishing archive left pending by an earlier run: {partition_name(month)}")
+            _publish(month)
+
+
+def archive(conn: Connection, current: Month, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Compact warm partitions older than the retention window into archive
+    files and drop their tables. Returns {partition: rows}. The files
+    appear when the caller's transaction commits.
+    """
+    oldest_kept = months_before(current, settings.LOG_RETENTION_MONTHS)
+    archived = {}
+    staged: List[Month] = []
+    if not dry_run:
+        _recover_pending(conn)
+        # Registered up front so a failure part-way through still cleans up
+        _publish_on_commit(conn, staged)
+    for month in list_partitions(conn):
+        if month >= oldest_kept:
+            break
+        table = partition_table(month)
+        rows = [
+            dict(row) for row in conn.execute(
+                select(table).order_by(table.c.program_id, table.c.timestamp, table.c.id)
+            ).mappings()
+        ]
+        archived[table.name] = len(rows)
+        if dry_run:
+            continue
+        if not staged:
+            _forget_partitions_on_end(conn)
+        if os.path.exists(archive_path(month)):
+            # The month was archived before and then received backdated logs
+            rows = sorted(
+                _rows(_decode_archive(archive_path(month))) + rows,
+                key=lambda row: (row["program_id"], row["timestamp"], row["id"]),
+            )
+        _write_archive(month, rows)
+        staged.append(month)
+        table.drop(conn)
+        _partition_metadata.remove(table)
+        logger.info(f"Archived {len(rows)} logs from {table.name}")
+    return archived
+
+
+def compact(conn: Connection, today: Optional[date] = None, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+    """Rotation then archival, in the caller's transaction."""
+    if not dry_run and conn.dialect.name == "sqlite" and not conn.connection.dbapi_connection.in_transaction:
+        # pysqlite only opens its transaction at the first INSERT/DELETE, so the
+        # first partition CREATE would otherwise autocommit and survive a rollback
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    current = month_of(today or datetime.now())
+    return {
+        "rotated": rotate(conn, current, dry_run),
+        "archived": archive(conn, current, dry_run),
+    }
+
+
+# --- 3. READ PATH ---
+def _keyset_filter(columns, program_id, since, until, log_type, after):
+    conditions = [columns.program_id == program_id]
+    if since:
+        conditions.append(columns.timestamp >= since)
+    if until:
+        conditions.append(columns.timestamp < until)
+    if log_type:
+        conditions.append(columns.log_type == log_type)
+    if after:
+        after_timestamp, after_id = after
+        conditions.append(or_(
+            columns.timestamp < after_timestamp,
+            and_(columns.timestamp == after_timestamp, columns.id < after_id),
+        ))
+    return and_(*conditions)
+
+
+def _newest_first(row: Dict[str, Any]):
+    return row["timestamp"], row["id"]
+
+
+def _overlaps(month: Month, since: Optional[datetime], until: Optional[datetime], newest: Optional[datetime] = None) -> bool:
+    """Whether the month can hold rows in [since, until) that are no newer than `newest`."""
+    if since and month_start(next_month(month)) <= since:
+        return False
+    if until and month_start(month) >= until:
+        return False
+    if newest and month_start(month) > newest:
+        return False
+    return True
+
+
+def _decode_archive(path: str) -> Dict[str, list]:
+    """An archive file's columns (timestamps still ISO strings)."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)["columns"]
+
+
+def _rows(columns: Dict[str, list], start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Materialize rows [start, stop) of a decoded archive."""
+    rows = [
+        dict(zip(COLUMNS, values))
+        for values in zip(*(columns[name][start:stop] for name in COLUMNS))
+    ]
+    for row in rows:
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return rows
+
+
+class _ArchiveCache:
+    """
+    LRU of decoded archive months, kept as columns (far smaller than one dict
+    per row) and bounded by their total row count. A month bigger than the
+    whole budget is decoded per read instead of cached.
+    """
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self._months: "OrderedDict[Tuple[str, float], Dict[str, list]]" = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def columns(self, path: str) -> Dict[str, list]:
+        # mtime is part of the key so a re-written archive is picked up
+        key = (path, os.path.getmtime(path))
+        with self._lock:
+            columns = self._months.get(key)
+            if columns is not None:
+                self._months.move_to_end(key)
+                return columns
+        columns = _decode_archive(path)
+        size = len(columns["id"])
+        if size > self.max_rows:
+            return columns
+        with self._lock:
+            if key not in self._months:
+                self._months[key] = columns
+                self._rows += size
+            while self._rows > self.max_rows:
+                _, evicted = self._months.popitem(last=False)
+                self._rows -= len(evicted["id"])
+        return columns
+
+    def clear(self):
+        with self._lock:
+            self._months.clear()
+            self._rows = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"months": len(self._months), "rows": self._rows, "max_rows": self.max_rows}
+
+
+archive_cache = _ArchiveCache(settings.LOG_ARCHIVE_CACHE_ROWS)
+
+
+def _program_rows(month: Month, program_id: int) -> List[Dict[str, Any]]:
+    """One program's rows of an archived month (contiguous: rows are sorted by program)."""
+    columns = archive_cache.columns(archive_path(month))
+    program_ids = columns["program_id"]
+    start = bisect.bisect_left(program_ids, program_id)
+    stop = bisect.bisect_right(program_ids, program_id, lo=start)
+    return _rows(columns, start, stop) if start < stop else []
+
+
+def _scan_archive(month: Month, program_id, since, until, log_type, after, limit) -> List[Dict[str, Any]]:
+    matches = []
+    for row in _program_rows(month, program_id):
+        if since and row["timestamp"] < since:
+            continue
+        if until and row["timestamp"] >= until:
+            continue
+        if log_type and row["log_type"] != log_type:
+            continue
+        if after and (row["timestamp"], row["id"]) >= after:
+            continue
+        matches.append(row)
+    return heapq.nlargest(limit, matches, key=_newest_first)
+
+
+def iter_logs(
+    conn: Connection,
+    program_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    chunk_size: int = 1000,
+    include_archived: bool = True,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Every log of one program in [since, until), across all tiers, as lists of
+    at most `chunk_size` rows. Rows are streamed from the database, so memory
+    is bounded by the chunk size (plus one decoded archive month).
+    """
+    for month in list_archives() if include_archived else []:
+        if not _overlaps(month, since, until):
+            continue
+        rows = [
+            row for row in _program_rows(month, program_id)
+            if (since is None or row["timestamp"] >= since)
+            and (until is None or row["timestamp"] < until)
+        ]
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    tables = [partition_table(month) for month in cached_partitions(conn) if _overlaps(month, since, until)]
+    for table in tables + [HOT_TABLE]:
+        result = conn.execute(
+            select(table).where(_keyset_filter(table.c, program_id, since, until, None, None)),
+            execution_options={"stream_results": True, "max_row_buffer": chunk_size},
+        )
+        for chunk in result.mappings().partitions(chunk_size):
+            yield [dict(row) for row in chunk]
+
+
+def iter_all_logs(conn: Connection, chunk_size: int = 1000, include_archived: bool = True) -> Iterator[List[Dict[str, Any]]]:
+    """Every log of every program, tier by tier, in chunks (for backfills)."""
+    for month in list_archives() if include_archived else []:
+        # Read once, start to end: not worth a place in the archive cache
+        columns = _decode_archive(archive_path(month))
+        for start in range(0, len(columns["id"]), chunk_size):
+            yield _rows(columns, start, start + chunk_size)
+
+    tables = [partition_table(month) for month in cached_partitions(conn)]
+    for table in tables + [HOT_TABLE]:
+        result = conn.execute(
+            select(table),
+            execution_options={"stream_results": True, "max_row_buffer": chunk_size},
+        )
+        for chunk in result.mappings().partitions(chunk_size):
+            yield [dict(row) for row in chunk]
+
+
+async def fetch_history(
+    db: AsyncSession,
+    program_id: int,
+    limit: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    log_type: Optional[str] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    include_archived: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` logs of one program, newest first, across the hot table and
+    the months overlapping the window (archives only if include_archived).
+    Same keyset semantics as a single-table query on (timestamp, id).
+    """
+    rows = [
+        dict(row) for row in (await db.execute(
+            select(HOT_TABLE)
+            .where(_keyset_filter(HOT_TABLE.c, program_id, since, until, log_type, after))
+            .order_by(HOT_TABLE.c.timestamp.desc(), HOT_TABLE.c.id.desc())
+            .limit(limit)
+        )).mappings()
+    ]
+
+    # Skip months after the window or the cursor
+    newest = after[0] if after else None
+    warm = [m for m in await db.run_sync(lambda s: cached_partitions(s.connection())) if _overlaps(m, since, until, newest)]
+    cold = [m for m in list_archives() if _overlaps(m, since, until, newest)] if include_archived else []
+
+    sources = [(month, "warm") for month in warm] + [(month, "cold") for month in cold]
+    for month, tier in sorted(sources, reverse=True):
+        if len(rows) >= limit:
+            # Every remaining month is older than the oldest row we would return
+            floor = sorted(rows, key=_newest_first, reverse=True)[limit - 1]["timestamp"]
+            if month_start(next_month(month)) <= floor:
+                break
+        if tier == "warm":
+            table = partition_table(month)
+            rows.extend(dict(row) for row in (await db.execute(
+                select(table)
+                .where(_keyset_filter(table.c, program_id, since, until, log_type, after))
+                .order_by(table.c.timestamp.desc(), table.c.id.desc())
+                .limit(limit)
+            )).mappings())
+        else:
+            rows.extend(_scan_archive(month, program_id, since, until, log_type, after, limit))
+
+    return heapq.nlargest(limit, rows, key=_newest_first)
+
+
+# --- 4. CLI ---
+def main():
+    from app.db.session import engine
+
+    parser = argparse.ArgumentParser(description="Rotate closed months out of daily_logs and archive old partitions.")
+    parser.add_argument("--dry-run", action="store_true", help="report what would move without changing anything")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as conn:
+        result = compact(conn, dry_run=args.dry_run)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Request Instrumentation.
+
+- MetricsMiddleware (app/api/middleware.py) times every request and records,
+  per route template: a latency histogram, request counts by status, and the
+  SQL statements / DB time spent serving it. In-flight requests are a gauge.
+- SQL is counted by engine events (instrument_engine), on the sync engine and
+  on the async engine's sync core. The current request's RequestStats sits in
+  a contextvar; it is a mutable object, so the threadpool and run_sync
+  greenlets (which copy the context) add to the same record. Writes handed to
+  the single writer thread run outside any request and are counted as
+  background queries.
+- Service stats (cache hit/miss, admission, audit writer, ...) are pulled
+  from registered collectors at scrape time.
+- render() produces the Prometheus text format served at /metrics.
+- Requests slower than METRICS_SLOW_REQUEST_MS (0 = off) are logged with
+  their query breakdown.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statements shown per slow request
+SLOW_LOG_TOP_STATEMENTS = 5
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_time: float = 0.0
+    # statement -> [count, seconds]; only collected when the slow log is on
+    statements: Optional[Dict[str, List[float]]] = None
+    started: float = field(default_factory=time.perf_counter)
+
+    def add(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+        if self.statements is not None:
+            entry = self.statements.setdefault(statement, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, slow_request_s: float = 0):
+        self.buckets = buckets
+        self.slow_request_s = slow_request_s
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, str], Histogram] = {}
+        self._requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self._db_queries: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._db_seconds: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._background_queries = 0
+        self._background_db_seconds = 0.0
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.in_flight = 0
+
+    # --- Requests ---
+    def begin_request(self) -> Tuple[RequestStats, Token]:
+        stats = RequestStats(statements={} if self.slow_request_s else None)
+        with self._lock:
+            self.in_flight += 1
+        return stats, _current.set(stats)
+
+    def end_request(self, method: str, route: str, status: int, stats: RequestStats, token: Token):
+        _current.reset(token)
+        elapsed = time.perf_counter() - stats.started
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = Histogram(self.buckets)
+            histogram.observe(elapsed)
+            self._requests[(method, route, str(status))] += 1
+            self._db_queries[key] += stats.queries
+            self._db_seconds[key] += stats.db_time
+        if self.slow_request_s and elapsed >= self.slow_request_s:
+            self._log_slow(method, route, status, elapsed, stats)
+
+    def _log_slow(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        top = sorted((stats.statements or {}).items(), key=lambda item: item[1][1], reverse=True)
+        breakdown = "".join(
+            f"\n  {count}x {seconds * 1000:.1f}ms  {' '.join(statement.split())[:200]}"
+            for statement, (count, seconds) in top[:SLOW_LOG_TOP_STATEMENTS]
+        )
+        logger.warning(
+            f"Slow request {method} {route} -> {status} in {elapsed * 1000:.0f}ms "
+            f"({stats.queries} queries, {stats.db_time * 1000:.0f}ms in DB){breakdown}"
+        )
+
+    # --- Queries ---
+    def record_query(self, statement: str, elapsed: float):
+        stats = _current.get()
+        if stats is not None:
+            stats.add(statement, elapsed)
+            return
+        with self._lock:
+            self._background_queries += 1
+            self._background_db_seconds += elapsed
+
+    # --- Service Stats ---
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, Any]]):
+        """`collect()` returns {stat: number}; exported as praan_<name>_<stat> gauges."""
+        self._collectors[name] = collect
+
+    # --- Exposition ---
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            latency = {key: (list(h.counts), h.sum, h.count) for key, h in self._latency.items()}
+            requests = dict(self._requests)
+            db_queries = dict(self._db_queries)
+            db_seconds = dict(self._db_seconds)
+            background = (self._background_queries, self._background_db_seconds)
+            in_flight = self.in_flight
+
+        header("praan_http_request_duration_seconds", "histogram", "Request latency by route.")
+        for (method, route), (counts, total, count) in sorted(latency.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'praan_http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"praan_http_request_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"praan_http_request_duration_seconds_count{{{labels}}} {count}")
+
+        header("praan_http_requests_total", "counter", "Requests by route and status.")
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f'praan_http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+
+        header("praan_http_requests_in_flight", "gauge", "Requests currently being served.")
+        lines.append(f"praan_http_requests_in_flight {in_flight}")
+
+        header("praan_db_queries_total", "counter", "SQL statements executed, by route (background = outside requests).")
+        for (method, route), count in sorted(db_queries.items()):
+            lines.append(f'praan_db_queries_total{{method="{method}",route="{_escape(route)}"}} {count}')
+        lines.append(f'praan_db_queries_total{{method="",route="background"}} {background[0]}')
+
+        header("praan_db_seconds_total", "counter", "Time spent executing SQL, by route (background = outside requests).")
+        for (method, route), seconds in sorted(db_seconds.items()):
+            lines.append(f'praan_db_seconds_total{{method="{method}",route="{_escape(route)}"}} {seconds}')
+        lines.append(f'praan_db_seconds_total{{method="",route="background"}} {background[1]}')
+
+        for name, collect in sorted(self._collectors.items()):
+            try:
+                values = collect()
+            except Exception:
+                logger.exception(f"Metrics collector '{name}' failed")
+                continue
+            for stat, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"praan_{name}_{stat}"
+                header(metric, "gauge", f"{name} {stat}.")
+                lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+# --- Engine Events ---
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    metrics.record_query(statement, time.perf_counter() - started)
+
+
+def _on_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def instrument_engine(engine: Engine):
+    """Count statements and DB time on `engine` (pass async_engine.sync_engine for async)."""
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _on_error)
+
+
+metrics = Metrics(slow_request_s=settings.METRICS_SLOW_REQUEST_MS / 1000)
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# File extension we store each accepted content type under
+EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/heic": ".heic",
+}
+CONTENT_TYPES = {ext: content_type for content_type, ext in EXTENSIONS.items()}
+
+# Magic bytes checked against the first chunk, so a mislabelled body is
+# rejected before the rest of it is written.
+SIGNATURES = {
+    "image/jpeg": lambda head: head.startswith(b"\xff\xd8"),
+    "image/png": lambda head: head.startswith(b"\x89PNG\r\n\x1a\n"),
+    "image/webp": lambda head: head[:4] == b"RIFF" and head[8:12] == b"WEBP",
+    "image/heic": lambda head: head[4:8] == b"ftyp",
+}
+
+# Derived image sizes (longest edge, px), generated once on first request
+VARIANTS = {
+    "thumb": 256,
+    "preview": 1024,
+}
+
+# Content-addressed keys look like "<sha256 hex><ext>"
+KEY_PATTERN = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]+)$")
+
+
+def _pillow():
+    """
+    PIL.Image, imported on the first variant request instead of at startup.
+    Optional: without Pillow, variants fall back to the original image.
+    """
+    try:
+        from PIL import Image
+    except ImportError:  # pragma: no cover
+        return None
+    return Image
+
+
+@dataclass
+class StoredFile:
+    key: str        # "<sha256><ext>", served at /uploads/{key}
+    digest: str     # sha256 of the content
+    path: str
+    size: int
+    content_type: str
+    original_filename: Optional[str] = None
+    deduplicated: bool = False  # True when identical bytes were already stored
+
+
+@dataclass
+class ServedFile:
+    path: str
+    etag: str
+    content_type: str
+    immutable: bool
+
+
+class LocalStorage:
+    """
+    Content-addressed image store on local disk.
+
+    Layout under `root`:
+        objects/ab/<sha256>.jpg              original upload
+        objects/ab/<sha256>.analysis.json    cached AI analysis for that image
+        variants/ab/<sha256>_thumb.jpg       derived sizes (see VARIANTS)
+
+    Uploads are streamed without blocking the event loop:
+    - Content type is checked before any byte is written.
+    - The body is read in chunks; hashing and disk writes run on the threadpool.
+    - The size cap is enforced while streaming.
+    - Data goes to a temp file which is fsync'ed and atomically renamed to its
+      content hash, so identical photos are stored (and analysed) only once.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int,
+        allowed_types: Iterable[str],
+        chunk_size: int = 256 * 1024,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.allowed_types = set(allowed_types)
+        self.chunk_size = chunk_size
+        self.objects_dir = os.path.join(root, "objects")
+        self.variants_dir = os.path.join(root, "variants")
+
+    def check_content_type(self, content_type: Optional[str]) -> str:
+        content_type = (content_type or "").split(";")[0].strip().lower()
+        if content_type not in self.allowed_types:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Unsupported file type '{content_type}'. Allowed: {sorted(self.allowed_types)}",
+            )
+        return content_type
+
+    # --- 1. Writing ---
+    async def save(self, upload: UploadFile) -> StoredFile:
+        """Stream an UploadFile into the store and return its content key."""
+        content_type = self.check_content_type(upload.content_type)
+        extension = EXTENSIONS.get(content_type, "")
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix=".part")
+        out = os.fdopen(fd, "wb")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                if size == 0:
+                    self._check_signature(content_type, chunk)
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {self.max_bytes} byte upload limit",
+                    )
+                await run_in_threadpool(self._write, out, hasher, chunk)
+
+            if size == 0:
+                raise HTTPException(status_code=400, detail="Empty file")
+
+            digest = hasher.hexdigest()
+            final_path = self._object_path(digest, extension)
+            deduplicated = await run_in_threadpool(self._commit, out, tmp_path, final_path)
+        except BaseException:
+            await run_in_threadpool(self._discard, out, tmp_path)
+            raise
+
+        return StoredFile(
+            key=f"{digest}{extension}",
+            digest=digest,
+            path=final_path,
+            size=size,
+            content_type=content_type,
+            original_filename=upload.filename,
+            deduplicated=deduplicated,
+        )
+
+    # --- 2. Cached analysis results (keyed by content hash) ---
+    def load_analysis(self, digest: str) -> Optional[dict]:
+        try:
+            with open(self._analysis_path(digest)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save_analysis(self, digest: str, analysis: dict):
+        self._atomic_write(self._analysis_path(digest), json.dumps(analysis).encode())
+
+    # --- 3. Reading / serving ---
+    def resolve(self, key: str, variant: Optional[str] = None) -> Optional[ServedFile]:
+        """
+        Map a public key to a file on disk (blocking; call from a threadpool).
+        Variants are generated and cached on first use.
+        Keys from before content addressing (flat files in `root`) still resolve.
+        """
+        match = KEY_PATTERN.match(key)
+        if not match:
+            return self._resolve_legacy(key)
+
+        digest, extension = match.groups()
+        path = self._object_path(digest, extension)
+        if not os.path.exists(path):
+            return None
+
+        if variant is None:
+            return ServedFile(path, f'"{digest}"', CONTENT_TYPES.get(extension, "application/octet-stream"), True)
+
+        if variant not in VARIANTS:
+            raise HTTPException(status_code=400, detail=f"Unknown variant '{variant}'. Allowed: {sorted(VARIANTS)}")
+        variant_path = self._variant(digest, path, variant)
+        if variant_path is None:
+            # Could not derive (no Pillow / unsupported format): serve the original
+            return ServedFile(path, f'"{digest}"', CONTENT_TYPES.get(extension, "application/octet-stream"), True)
+        return ServedFile(variant_path, f'"{digest}-{variant}"', "image/jpeg", True)
+
+    def _resolve_legacy(self, key: str) -> Optional[ServedFile]:
+        if os.path.basename(key) != key or key.startswith("."):
+            return None
+        path = os.path.join(self.root, key)
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        extension = os.path.splitext(key)[1].lower().replace(".jpeg", ".jpg")
+        etag = f'"{int(stat.st_mtime)}-{stat.st_size}"'
+        return ServedFile(path, etag, CONTENT_TYPES.get(extension, "application/octet-stream"), False)
+
+    def _variant(self, digest: str, original_path: str, variant: str) -> Optional[str]:
+        variant_path = os.path.join(self.variants_dir, digest[:2], f"{digest}_{variant}.jpg")
+        if os.path.exists(variant_path):
+            return variant_path
+        Image = _pillow()
+        if Image is None:
+            return None
+        try:
+            with Image.open(original_path) as img:
+                img = img.convert("RGB")
+                img.thumbnail((VARIANTS[variant], VARIANTS[variant]))
+                os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(variant_path), suffix=".part")
+                with os.fdopen(fd, "wb") as out:
+                    img.save(out, format="JPEG", quality=80, optimize=True)
+                os.replace(tmp_path, variant_path)
+        except Exception:
+            logger.warning(f"Could not build '{variant}' for {digest}, serving original", exc_info=True)
+            return None
+        return variant_path
+
+    # --- Helpers (run on the threadpool) ---
+    def _object_path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}{extension}")
+
+    def _analysis_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.analysis.json")
+
+    def _check_signature(self, content_type: str, head: bytes):
+        check = SIGNATURES.get(content_type)
+        if check and not check(head):
+            raise HTTPException(status_code=415, detail=f"File content is not a valid {content_type}")
+
+    @staticmethod
+    def _write(out, hasher, chunk: bytes):
+        hasher.update(chunk)
+        out.write(chunk)
+
+    def _commit(self, out, tmp_path: str, final_path: str) -> bool:
+        """Move the temp file into place. Returns True if the content already existed."""
+        if os.path.exists(final_path):
+            self._discard(out, tmp_path)
+            return True
+        out.flush()
+        os.fsync(out.fileno())
+        out.close()
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+        self._fsync_dir(os.path.dirname(final_path))
+        return False
+
+    def _atomic_write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _fsync_dir(path: str):
+        dir_fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    @staticmethod
+    def _discard(out, tmp_path: str):
+        if not out.closed:
+            out.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+storage = LocalStorage(
+    root=settings.UPLOAD_DIR,
+    max_bytes=settings.MAX_UPLOAD_BYTES,
+    allowed_types=settings.ALLOWED_UPLOAD_TYPES,
+    chunk_size=settings.UPLOAD_CHUNK_SIZE,
+)
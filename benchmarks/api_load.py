@@ -0,0 +1,300 @@
+"""
+Load test for the API hot paths.
+
+Seeds a synthetic dataset (users x members x programs x logs/day x days),
+scores it with the adherence backfill, then drives each endpoint with N
+concurrent clients and reports throughput and p50/p95/p99 latency:
+- create_log                    POST /api/v1/logs/logs
+- get_adherence                 GET  /api/v1/logs/adherence/{program_id}
+- get_log_history               GET  /api/v1/logs/{program_id}/history
+- get_all_users_with_families   GET  /api/v1/members/users/all
+
+Modes:
+- inprocess: httpx ASGITransport against app.main (no network, no server)
+- uvicorn:   a local `uvicorn app.main:app` (--workers N) over real sockets
+
+Results are written as JSON (--out); pass a previous run as --baseline to
+flag regressions (exit status 1 when any are found).
+
+Usage:
+    python -m benchmarks.api_load --users 200 --days 90 --concurrency 10 50 --out run.json
+    python -m benchmarks.api_load --mode uvicorn --workers 2 --baseline run.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import (
+    REPO_ROOT, compare, drive, print_table, run_metadata, save_results, setup_environment,
+)
+
+ENDPOINTS = ["create_log", "get_adherence", "get_log_history", "get_all_users_with_families"]
+
+# Rows per INSERT while seeding
+SEED_CHUNK = 5000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    scale = parser.add_argument_group("dataset")
+    scale.add_argument("--users", type=int, default=50)
+    scale.add_argument("--members", type=int, default=3, help="members per user")
+    scale.add_argument("--programs", type=int, default=1, help="programs per member")
+    scale.add_argument("--logs-per-day", type=int, default=6, help="logs per program per day")
+    scale.add_argument("--days", type=int, default=90)
+    scale.add_argument("--partition", action="store_true", help="run log compaction after seeding (warm/cold tiers)")
+    run = parser.add_argument_group("run")
+    run.add_argument("--mode", nargs="+", choices=["inprocess", "uvicorn"], default=["inprocess"])
+    run.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    run.add_argument("--requests", type=int, default=1000, help="requests per endpoint and concurrency level")
+    run.add_argument("--concurrency", type=int, nargs="+", default=[10, 50])
+    run.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    run.add_argument("--port", type=int, default=8799)
+    run.add_argument("--seed", type=int, default=42, help="random seed")
+    out = parser.add_argument_group("results")
+    out.add_argument("--out", help="write results as JSON to this path")
+    out.add_argument("--baseline", help="previous results JSON to compare against")
+    out.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+# --- 1. DATASET ---
+NUTRITION_GOALS = {"calories": 2000, "protein_g": 90, "carbs_g": 250, "fats_g": 70}
+STRENGTH_GOALS = {"sessions_per_week": 3}
+CLINICAL_GOALS = {"blood_pressure": "daily"}
+
+
+def _payload(rng: random.Random, log_type: str) -> Dict[str, Any]:
+    if log_type == "NUTRITION":
+        return {
+            "calories": rng.randint(250, 800),
+            "macros": {"protein_g": rng.randint(10, 45), "carbs_g": rng.randint(20, 90), "fats_g": rng.randint(5, 30)},
+        }
+    if log_type == "WORKOUT":
+        return {"sessions": 1, "minutes": rng.randint(20, 60)}
+    return {"systolic": rng.randint(110, 160), "diastolic": rng.randint(70, 100)}
+
+
+def _log_type(slot: int) -> str:
+    return ("NUTRITION", "NUTRITION", "WORKOUT", "CLINICAL")[slot % 4]
+
+
+def seed(args) -> Dict[str, Any]:
+    """Insert the dataset with bulk Core inserts, then score it. Returns the ids to target."""
+    from sqlalchemy import insert, select
+
+    from app.db.bootstrap import migrate
+    from app.db.session import engine
+    from app.models import CareProgram, DailyLog, Member, ProgramConfig, User
+    from app.services import log_store
+    from app.services.backfill import run_backfill
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"bench{u}@example.com", "hashed_password": "x", "full_name": f"Bench {u}"}
+            for u in range(args.users)
+        ])
+        user_ids = list(conn.execute(select(User.id).order_by(User.id)).scalars())
+        conn.execute(insert(Member), [
+            {"user_id": user_id, "name": f"Member {m}", "age": rng.randint(30, 85), "relation_type": "Parent"}
+            for user_id in user_ids for m in range(args.members)
+        ])
+        members = conn.execute(select(Member.id, Member.user_id)).all()
+        conn.execute(insert(CareProgram), [
+            {"member_id": member_id, "start_date": datetime.now() - timedelta(days=args.days)}
+            for member_id, _ in members for _ in range(args.programs)
+        ])
+        owner = dict(members)
+        programs = [
+            (program_id, owner[member_id])
+            for program_id, member_id in conn.execute(select(CareProgram.id, CareProgram.member_id))
+        ]
+        conn.execute(insert(ProgramConfig), [
+            {
+                "program_id": program_id,
+                "nutrition_goals": NUTRITION_GOALS,
+                "strength_goals": STRENGTH_GOALS,
+                "clinical_goals": CLINICAL_GOALS,
+            }
+            for program_id, _ in programs
+        ])
+
+    first_day = datetime.combine(date.today() - timedelta(days=args.days - 1), datetime.min.time())
+    step = timedelta(hours=16) / max(args.logs_per_day, 1)
+    rows, total_logs = [], 0
+    for program_id, _ in programs:
+        for day in range(args.days):
+            for slot in range(args.logs_per_day):
+                log_type = _log_type(slot)
+                rows.append({
+                    "program_id": program_id,
+                    "log_type": log_type,
+                    "payload": _payload(rng, log_type),
+                    "is_verified": log_type == "NUTRITION",
+                    "timestamp": first_day + timedelta(days=day, hours=7) + step * slot,
+                })
+            if len(rows) >= SEED_CHUNK:
+                with engine.begin() as conn:
+                    conn.execute(insert(DailyLog), rows)
+                total_logs += len(rows)
+                rows = []
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(insert(DailyLog), rows)
+        total_logs += len(rows)
+
+    if args.partition:
+        with engine.begin() as conn:
+            log_store.compact(conn)
+
+    run_backfill(None, first_day.date(), date.today(), workers=min(4, os.cpu_count() or 1))
+    logging.getLogger(__name__).warning(
+        f"Seeded {len(user_ids)} users, {len(members)} members, {len(programs)} programs, "
+        f"{total_logs} logs in {time.perf_counter() - started:.1f}s"
+    )
+    return {"programs": programs, "user_ids": user_ids}
+
+
+# --- 2. SCENARIOS ---
+def scenarios(data: Dict[str, Any], rng: random.Random) -> Dict[str, Callable]:
+    programs = data["programs"]
+
+    def pick():
+        return programs[rng.randrange(len(programs))]
+
+    async def create_log(client, i):
+        program_id, user_id = pick()
+        log_type = _log_type(i)
+        return await client.post(
+            "/api/v1/logs/logs",
+            json={"program_id": program_id, "log_type": log_type, "payload": _payload(rng, log_type)},
+            headers={"X-User-ID": str(user_id)},
+        )
+
+    async def get_adherence(client, i):
+        program_id, _ = pick()
+        return await client.get(f"/api/v1/logs/adherence/{program_id}")
+
+    async def get_log_history(client, i):
+        program_id, _ = pick()
+        return await client.get(f"/api/v1/logs/{program_id}/history", params={"limit": 50})
+
+    async def get_all_users_with_families(client, i):
+        return await client.get("/api/v1/members/users/all", params={"limit": 100})
+
+    return {
+        "create_log": create_log,
+        "get_adherence": get_adherence,
+        "get_log_history": get_log_history,
+        "get_all_users_with_families": get_all_users_with_families,
+    }
+
+
+# --- 3. MODES ---
+async def run_inprocess(args, data) -> List[Dict[str, Any]]:
+    import httpx
+
+    from app.db.session import async_engine
+    from app.main import app
+
+    logging.getLogger().setLevel(logging.WARNING)  # per-request INFO logs would dominate the profile
+    transport = httpx.ASGITransport(app=app)
+    try:
+        # ASGITransport doesn't send lifespan events: run startup/shutdown so background writers stop
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await _run_all(args, data, client, "inprocess")
+    finally:
+        # Pooled aiosqlite connections each hold a non-daemon thread
+        await async_engine.dispose()
+
+
+async def run_uvicorn(args, data, workdir: str) -> List[Dict[str, Any]]:
+    import httpx
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server_log = open(os.path.join(workdir, "uvicorn.log"), "w")
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=REPO_ROOT, env=os.environ.copy(), stdout=server_log, stderr=subprocess.STDOUT,
+    )
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            await _wait_until_up(client, server, server_log.name)
+            return await _run_all(args, data, client, "uvicorn")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        server_log.close()
+
+
+async def _wait_until_up(client, server: subprocess.Popen, log_path: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}; see {log_path}")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"uvicorn did not come up within {timeout}s; see {log_path}")
+
+
+async def _run_all(args, data, client, mode: str) -> List[Dict[str, Any]]:
+    requests = scenarios(data, random.Random(args.seed))
+    results = []
+    for endpoint in args.endpoints:
+        # Warm-up: connection pools, caches, lazily started background tasks
+        await drive(client, requests[endpoint], min(50, args.requests), min(5, max(args.concurrency)))
+        for concurrency in args.concurrency:
+            summary = await drive(client, requests[endpoint], args.requests, concurrency)
+            results.append({"mode": mode, "endpoint": endpoint, "concurrency": concurrency, **summary})
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = setup_environment()
+    logging.basicConfig(level=logging.WARNING)
+    data = seed(args)
+
+    results = []
+    if "inprocess" in args.mode:
+        results += asyncio.run(run_inprocess(args, data))
+    if "uvicorn" in args.mode:
+        results += asyncio.run(run_uvicorn(args, data, workdir))
+    print_table(results)
+
+    if args.out:
+        save_results(args.out, run_metadata(vars(args)), results)
+        print(f"Results written to {args.out}")
+    if args.baseline:
+        regressions = compare(args.baseline, results, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
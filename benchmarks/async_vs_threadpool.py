@@ -0,0 +1,168 @@
+"""
+Benchmark: async DB path vs. the threadpool (sync Session) path.
+
+Runs the same history endpoint two ways against a throwaway SQLite database:
+- /sync/...  : `def` endpoint + SessionLocal, executed on FastAPI's threadpool
+- /api/v1/logs/{id}/history : the real `async def` endpoint on AsyncSession
+
+Both call log_store.fetch_history with the same arguments, audit dependency
+and response model; only the session type (and so the driver and the thread
+the queries run on) differs.
+
+Past ~70 clients the threadpool mode stalls until DB_POOL_TIMEOUT: a `def`
+endpoint's response model is validated on the threadpool too, so sessions
+holding every pooled connection queue for a thread while all 40 threads
+wait for a connection. Lower DB_POOL_TIMEOUT to see the errors sooner.
+
+Both are driven in-process (httpx ASGITransport) by N concurrent clients.
+
+Usage:
+    python -m benchmarks.async_vs_threadpool --logs 2000 --requests 2000 --concurrency 10 50 200
+"""
+import argparse
+import asyncio
+
+from benchmarks.common import drive, print_table, run_metadata, save_results, setup_environment
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=2000, help="logs to seed for the program")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--out", help="write results as JSON to this path (same format as benchmarks.api_load)")
+    return parser.parse_args()
+
+
+def seed(n_logs: int) -> int:
+    from datetime import datetime, timedelta
+
+    from app.db.bootstrap import migrate
+    from app.db.session import SessionLocal, engine
+    from app.models import CareProgram, DailyLog, Member, User
+
+    migrate(engine)
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password="x", full_name="Bench")
+    db.add(user)
+    db.flush()
+    member = Member(user_id=user.id, name="Parent", age=70, relation_type="Mother")
+    db.add(member)
+    db.flush()
+    program = CareProgram(member_id=member.id)
+    db.add(program)
+    db.flush()
+    start = datetime.now() - timedelta(days=90)
+    db.add_all([
+        DailyLog(
+            program_id=program.id,
+            log_type="NUTRITION",
+            payload={"calories": 450, "macros": {"protein_g": 30}},
+            is_verified=True,
+            timestamp=start + timedelta(minutes=60 * i),
+        )
+        for i in range(n_logs)
+    ])
+    db.commit()
+    program_id = program.id
+    db.close()
+    return program_id
+
+
+class SyncSessionAdapter:
+    """The two AsyncSession calls fetch_history makes, answered by a sync Session."""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def execute(self, statement):
+        return self.session.execute(statement)
+
+    async def run_sync(self, fn):
+        return fn(self.session)
+
+
+def run_inline(coroutine):
+    """Run a coroutine that never suspends (its awaits are all the adapter's) on this thread."""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    coroutine.close()
+    raise RuntimeError("coroutine suspended; it needs an event loop")
+
+
+def build_app():
+    from typing import Optional
+
+    from fastapi import Depends, FastAPI, Query
+    from sqlalchemy.orm import Session
+
+    from app.api.v1 import logs
+    from app.db.session import get_db
+    from app.schemas.health import LogHistoryPage
+    from app.services import log_store
+    from app.services.audit import audited
+
+    app = FastAPI()
+    app.include_router(logs.router, prefix="/api/v1/logs")
+
+    # Mirrors logs.get_log_history (minus the window filters the benchmark does not send)
+    @app.get("/sync/{program_id}/history", response_model=LogHistoryPage, dependencies=[Depends(audited("log.history"))])
+    def sync_history(
+        program_id: int,
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = None,
+        db: Session = Depends(get_db),
+    ):
+        rows = run_inline(log_store.fetch_history(
+            SyncSessionAdapter(db), program_id, limit + 1,
+            after=logs._decode_cursor(cursor) if cursor else None,
+        ))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return LogHistoryPage(items=rows, next_cursor=logs._encode_cursor(rows[-1]) if has_more else None)
+
+    return app
+
+
+async def run(app, url: str, total: int, concurrency: int):
+    import httpx
+
+    async def request(client, i):
+        return await client.get(url)
+
+    from app.db.session import async_engine
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await drive(client, request, total, concurrency)
+    finally:
+        # Pooled aiosqlite connections are bound to this run's event loop
+        await async_engine.dispose()
+
+
+def main():
+    args = parse_args()
+    setup_environment()
+    program_id = seed(args.logs)
+    app = build_app()
+
+    paths = {
+        "threadpool": f"/sync/{program_id}/history?limit={args.page_size}",
+        "async": f"/api/v1/logs/{program_id}/history?limit={args.page_size}",
+    }
+    results = []
+    for concurrency in args.concurrency:
+        for mode, url in paths.items():
+            result = asyncio.run(run(app, url, args.requests, concurrency))
+            results.append({"mode": mode, "endpoint": "get_log_history", "concurrency": concurrency, **result})
+    print_table(results)
+    if args.out:
+        save_results(args.out, run_metadata(vars(args)), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Shared benchmark plumbing: a throwaway environment, concurrent request
+drivers, latency summaries and JSON results that can be compared run to run.
+"""
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- 1. ENVIRONMENT ---
+def setup_environment() -> str:
+    """Point the app at a temp database/upload dir before it is imported."""
+    workdir = tempfile.mkdtemp(prefix="praan-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir}/uploads")
+    os.environ.setdefault("CACHE_SHARED_PATH", f"{workdir}/cache.db")
+    os.environ.setdefault("LOG_ARCHIVE_DIR", f"{workdir}/archive")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    return workdir
+
+
+# --- 2. DRIVING LOAD ---
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(q / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": len(ordered) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+async def drive(
+    client,
+    request: Callable[[Any, int], Awaitable[Any]],
+    total: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    """
+    `concurrency` clients issue `request(client, i)` until `total` requests
+    are done. Non-2xx/3xx responses and exceptions count as errors.
+    """
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def client_loop():
+        nonlocal errors
+        for i in remaining:
+            started = time.perf_counter()
+            try:
+                response = await request(client, i)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client_loop() for _ in range(concurrency)])
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+# --- 3. RESULTS ---
+def run_metadata(args: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": args,
+    }
+
+
+def save_results(path: str, metadata: Dict[str, Any], results: List[Dict[str, Any]]):
+    with open(path, "w") as f:
+        json.dump({"meta": metadata, "results": results}, f, indent=2)
+
+
+def _result_key(result: Dict[str, Any]) -> Tuple:
+    return result.get("mode"), result["endpoint"], result["concurrency"]
+
+
+def compare(baseline_path: str, results: List[Dict[str, Any]], threshold: float) -> List[str]:
+    """
+    Regressions against a saved run: p95 latency up, or throughput down, by
+    more than `threshold` (0.2 = 20%) for the same mode/endpoint/concurrency.
+    """
+    with open(baseline_path) as f:
+        baseline = {_result_key(result): result for result in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        before: Optional[Dict[str, Any]] = baseline.get(_result_key(result))
+        if before is None:
+            continue
+        label = "/".join(str(part) for part in _result_key(result) if part is not None)
+        if before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{label}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if before["rps"] and result["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{label}: throughput {before['rps']:.0f} -> {result['rps']:.0f} req/s")
+        if result["errors"] > before.get("errors", 0):
+            regressions.append(f"{label}: errors {before.get('errors', 0)} -> {result['errors']}")
+    return regressions
+
+
+def print_table(results: List[Dict[str, Any]]):
+    print(f"{'mode':<11}{'endpoint':<30}{'conc':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for r in results:
+        print(
+            f"{r.get('mode', '-'):<11}{r['endpoint']:<30}{r['concurrency']:>6}{r['rps']:>9.0f}"
+            f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['errors']:>8}"
+        )
@@ -0,0 +1,105 @@
+"""
+Benchmark: cold start of a new replica.
+
+Measures, over several fresh processes against the same (already migrated)
+database:
+- import:  `import app.main` in a new interpreter
+- ready:   `uvicorn app.main:app` spawn until the first 200 from GET /
+
+The app also logs its own breakdown at startup ("Ready in ...") and exports
+it at /metrics as praan_startup_*.
+
+Usage:
+    python -m benchmarks.startup --runs 5 --out startup.json
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmarks.common import REPO_ROOT, percentile, run_metadata, save_results, setup_environment
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for a replica")
+    parser.add_argument("--out", help="write results as JSON to this path")
+    return parser.parse_args()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_import() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], cwd=REPO_ROOT, env=os.environ.copy(), check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def time_ready(timeout: float) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"uvicorn not ready within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=15)
+
+
+def main():
+    args = parse_args()
+    setup_environment()
+    from app.db.bootstrap import migrate
+    from app.db.session import engine
+
+    migrate(engine)  # replicas start against a migrated database
+
+    samples = {"import": [], "ready": []}
+    for _ in range(args.runs):
+        samples["import"].append(time_import())
+        samples["ready"].append(time_ready(args.timeout))
+
+    results = []
+    print(f"{'phase':<10}{'p50 ms':>10}{'max ms':>10}")
+    for phase, values in samples.items():
+        ordered = sorted(values)
+        result = {
+            "endpoint": f"startup_{phase}",
+            "concurrency": 1,
+            "requests": len(ordered),
+            "errors": 0,
+            "rps": 0.0,
+            "p50_ms": percentile(ordered, 50) * 1000,
+            "p95_ms": percentile(ordered, 95) * 1000,
+            "p99_ms": percentile(ordered, 99) * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+        results.append(result)
+        print(f"{phase:<10}{result['p50_ms']:>10.0f}{result['max_ms']:>10.0f}")
+    if args.out:
+        save_results(args.out, run_metadata(vars(args)), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Shared fixtures: a throwaway SQLite database (configured before the app is
+imported, like benchmarks/common.py) that is rebuilt for every test, an API
+client running the app's lifespan, and a seeded family.
+"""
+import os
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix="praan-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/test.db"
+os.environ["UPLOAD_DIR"] = f"{WORKDIR}/uploads"
+os.environ["LOG_ARCHIVE_DIR"] = f"{WORKDIR}/archive"
+os.environ["CACHE_SHARED_PATH"] = ""  # L1 only: no state shared between tests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import pytest  # noqa: E402
+from sqlalchemy import inspect, text  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.db.bootstrap import migrate  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.services import log_store  # noqa: E402
+from app.services.cache import LRUBackend, cache  # noqa: E402
+from app.services.idempotency import idempotency_store  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path, monkeypatch):
+    """Empty, migrated schema and an empty archive dir for each test."""
+    monkeypatch.setattr(settings, "LOG_ARCHIVE_DIR", str(tmp_path / "archive"))
+    with engine.begin() as conn:
+        for name in inspect(conn).get_table_names():
+            conn.execute(text(f'DROP TABLE "{name}"'))
+    log_store._partition_metadata.clear()
+    log_store.forget_partitions()
+    log_store.archive_cache.clear()
+    # Ids restart with the database, so cached DTOs must not outlive it
+    cache.l1 = LRUBackend(maxsize=settings.CACHE_L1_MAXSIZE, ttl=settings.CACHE_TTL)
+    cache._versions.clear()
+    idempotency_store._done.clear()
+    migrate(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+NUTRITION_GOALS = {"calories": 2000, "protein_g": 100}
+
+
+@pytest.fixture
+def family(db):
+    """One user with one member enrolled in an ACTIVE program that has goals."""
+    from app.models import CareProgram, Member, ProgramConfig, User
+
+    user = User(email="owner@example.com", hashed_password="x", full_name="Owner")
+    db.add(user)
+    db.flush()
+    member = Member(user_id=user.id, name="Mother", age=64, relation_type="Mother")
+    db.add(member)
+    db.flush()
+    program = CareProgram(member_id=member.id, status="ACTIVE")
+    db.add(program)
+    db.flush()
+    db.add(ProgramConfig(program_id=program.id, nutrition_goals=NUTRITION_GOALS))
+    db.commit()
+    return {
+        "user_id": user.id,
+        "member_id": member.id,
+        "program_id": program.id,
+        "headers": {"X-User-ID": str(user.id)},
+    }
+
+
+@pytest.fixture
+def instant_inference(monkeypatch):
+    """The mock AI backend answers without its simulated 1.5s round trip."""
+    from app.services.ai_service import meal_analyzer
+
+    monkeypatch.setattr(meal_analyzer.backend, "latency", 0)
+    monkeypatch.setattr(meal_analyzer.backend, "per_image", 0)
+
+
+@pytest.fixture
+def jpeg():
+    """Encodes a small solid-colour JPEG (distinct colours give distinct bytes)."""
+    import io
+
+    from PIL import Image
+
+    def make(color=(200, 80, 40), size=(640, 480)) -> bytes:
+        out = io.BytesIO()
+        Image.new("RGB", size, color).save(out, format="JPEG")
+        return out.getvalue()
+    return make
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+from app.models.health import DailyLog
+from app.models.program import AdherenceMetric, DailyRollup, ProgramConfig
+from app.services import adherence
+from app.services.adherence import MEASURES, apply_logs, score_day, upsert_rows
+
+
+def totals(**values):
+    return {**dict.fromkeys(MEASURES, 0.0), **values}
+
+
+def config(nutrition=None, strength=None, clinical=None, program_id=1):
+    return ProgramConfig(
+        program_id=program_id,
+        nutrition_goals=nutrition or {},
+        strength_goals=strength or {},
+        clinical_goals=clinical or {},
+    )
+
+
+# --- score_day ---
+def test_score_day_against_every_goal():
+    scores = score_day(
+        totals(protein_g=150, calories=3000, workout_sessions=1, clinical_checkins=0),
+        config(
+            nutrition={"protein_g": 100, "calories": 2000},
+            strength={"sessions_per_week": 7},
+            clinical={"blood_pressure": "daily"},
+        ),
+    )
+    # Protein over its floor is capped at 1.0; calories 50% over target score 0.5
+    assert scores["nutrition_score"] == 75.0
+    assert scores["strength_score"] == 100.0
+    assert scores["clinical_score"] == 0.0
+    assert scores["total_score"] == round((0.75 + 1.0 + 0.0) / 3 * 100, 1)
+    assert scores["details"]["scored_dimensions"] == ["nutrition", "strength", "clinical"]
+
+
+def test_score_day_target_penalised_symmetrically():
+    goals = config(nutrition={"calories": 2000})
+    assert score_day(totals(calories=1500), goals)["nutrition_score"] == 75.0
+    assert score_day(totals(calories=2500), goals)["nutrition_score"] == 75.0
+    assert score_day(totals(calories=5000), goals)["nutrition_score"] == 0.0
+
+
+def test_score_day_excludes_dimensions_without_goals():
+    scores = score_day(totals(protein_g=20, workout_sessions=3), config())
+    # No numeric targets: legacy rule, 3 points per gram of protein
+    assert scores["nutrition_score"] == 60.0
+    assert scores["strength_score"] == 0.0
+    assert scores["total_score"] == 60.0
+    assert scores["details"]["scored_dimensions"] == ["nutrition"]
+
+
+def test_score_day_clinical_frequencies_add_up():
+    goals = config(clinical={"glucose": "twice_daily", "weight": "daily", "notes": 3})
+    assert score_day(totals(clinical_checkins=2), goals)["clinical_score"] == round(2 / 3 * 100, 1)
+    assert score_day(totals(clinical_checkins=5), goals)["clinical_score"] == 100.0
+
+
+# --- apply_logs ---
+def log(program_id, log_type, payload, timestamp=datetime(2026, 3, 14, 9)):
+    return DailyLog(program_id=program_id, log_type=log_type, payload=payload, timestamp=timestamp)
+
+
+def test_apply_logs_sums_a_batch_per_program_day(db):
+    db.add(config(nutrition={"protein_g": 100}, strength={"sessions_per_week": 7}))
+    db.commit()
+
+    results = apply_logs(db, [
+        log(1, "NUTRITION", {"calories": 600, "macros": {"protein_g": 30}}),
+        log(1, "NUTRITION", {"calories": 400, "protein_g": 20}),
+        log(1, "WORKOUT", {}),
+        log(1, "NUTRITION", {"calories": 300, "macros": {"protein_g": 10}}, datetime(2026, 3, 15, 9)),
+        log(2, "WORKOUT", {"sessions": 2}),
+    ])
+    db.commit()
+
+    day = results[(1, "2026-03-14")]
+    assert day["nutrition_score"] == 50.0
+    assert day["strength_score"] == 100.0
+    assert results[(1, "2026-03-15")]["nutrition_score"] == 10.0
+    # No config yet: the rollup is kept, nothing is scored
+    assert results[(2, "2026-03-14")] is None
+    assert db.query(AdherenceMetric).filter_by(program_id=2).count() == 0
+
+    rollup = db.query(DailyRollup).filter_by(program_id=1, date="2026-03-14").one()
+    assert (rollup.calories, rollup.protein_g, rollup.meals, rollup.workout_sessions, rollup.log_count) == (1000, 50, 2, 1, 3)
+    assert db.query(DailyRollup).filter_by(program_id=2).one().workout_sessions == 2
+
+
+def test_apply_logs_accumulates_across_calls(db):
+    db.add(config(nutrition={"protein_g": 100}))
+    db.commit()
+
+    apply_logs(db, [log(1, "NUTRITION", {"protein_g": 40})])
+    db.commit()
+    scores = apply_logs(db, [log(1, "NUTRITION", {"protein_g": 40})])[(1, "2026-03-14")]
+    db.commit()
+
+    assert scores["nutrition_score"] == 80.0
+    metric = db.query(AdherenceMetric).filter_by(program_id=1, date="2026-03-14").one()
+    assert metric.nutrition_score == 80.0
+    assert metric.details["actual"]["protein_g"] == 80
+    assert db.query(DailyRollup).filter_by(program_id=1).one().log_count == 2
+
+
+# --- upsert_rows ---
+def test_upsert_rows_overwrites_only_given_columns(db):
+    count = adherence.UPSERT_CHUNK * 2 + 50
+    table = AdherenceMetric.__table__
+    upsert_rows(db, table, [
+        {"program_id": 1, "date": f"2026-01-{i:04d}", "nutrition_score": 10.0, "total_score": 10.0}
+        for i in range(count)
+    ])
+    db.commit()
+    upsert_rows(db, table, [
+        {"program_id": 1, "date": f"2026-01-{i:04d}", "total_score": float(i)}
+        for i in range(count)
+    ])
+    db.commit()
+
+    rows = db.query(AdherenceMetric).order_by(AdherenceMetric.date).all()
+    assert len(rows) == count
+    assert [row.total_score for row in rows] == [float(i) for i in range(count)]
+    assert {row.nutrition_score for row in rows} == {10.0}
@@ -0,0 +1,93 @@
+import asyncio
+from collections import OrderedDict
+
+from app.api.v1 import logs
+from app.services.admission import AdmissionController
+
+
+def controller(**overrides):
+    options = dict(
+        max_concurrency=1, max_waiting=0, queue_timeout=0.05, rate_per_minute=1, burst=2, shed_when=None,
+    )
+    return AdmissionController(**{**options, **overrides})
+
+
+def test_empty_bucket_is_rate_limited():
+    admission = controller(max_concurrency=10)
+
+    async def run():
+        decisions = []
+        for _ in range(3):
+            decisions.append(await admission.acquire("user:1"))
+        return decisions, await admission.acquire("user:2")
+
+    (first, second, third), other_user = asyncio.run(run())
+    assert first.admitted and second.admitted and other_user.admitted
+    assert (third.admitted, third.status_code) == (False, 429)
+    assert third.retry_after >= 1
+    assert admission.stats()["rejected_rate_limited"] == 1
+
+
+def test_shed_requests_keep_their_token():
+    shedding = True
+    admission = controller(burst=1, shed_when=lambda: shedding)
+
+    async def run():
+        nonlocal shedding
+        rejected = [await admission.acquire("user:1") for _ in range(3)]
+        shedding = False
+        return rejected, await admission.acquire("user:1")
+
+    rejected, retry = asyncio.run(run())
+    assert [decision.status_code for decision in rejected] == [503, 503, 503]
+    assert retry.admitted  # three 503s did not spend the single token
+
+
+def test_queue_full_and_timeout_keep_their_token():
+    async def run(admission):
+        holder = await admission.acquire("user:1")
+        busy = await admission.acquire("user:2")
+        admission.release()
+        return holder, busy, await admission.acquire("user:2")
+
+    for admission, reason in ((controller(burst=1), "queue_full"), (controller(burst=1, max_waiting=1), "timeout")):
+        holder, busy, retry = asyncio.run(run(admission))
+        assert holder.admitted
+        assert (busy.status_code, busy.retry_after) == (503, 1)
+        assert admission.stats()[f"rejected_{reason}"] == 1
+        assert retry.admitted
+
+
+def test_waiting_request_is_admitted_when_a_slot_frees():
+    admission = controller(max_waiting=1, queue_timeout=1)
+
+    async def run():
+        await admission.acquire("user:1")
+        waiter = asyncio.create_task(admission.acquire("user:2"))
+        await asyncio.sleep(0.01)
+        assert admission.stats()["queue_depth"] == 1
+        admission.release()
+        return await waiter
+
+    assert asyncio.run(run()).admitted
+    assert admission.stats()["queued"] == 1
+
+
+def test_middleware_answers_429_and_503_before_the_upload(client, family, monkeypatch):
+    monkeypatch.setattr(logs.meal_admission, "_buckets", OrderedDict())
+    monkeypatch.setattr(logs.meal_admission, "burst", 1)
+
+    def upload():
+        return client.post(
+            "/api/v1/logs/meals/analyze", headers=family["headers"],
+            files={"file": ("meal.jpg", b"not even an image", "image/jpeg")},
+        )
+
+    monkeypatch.setattr(logs.meal_admission, "shed_when", lambda: True)
+    shed = upload()
+    assert shed.status_code == 503 and shed.headers["Retry-After"]
+
+    monkeypatch.setattr(logs.meal_admission, "shed_when", lambda: False)
+    assert upload().status_code == 415  # admitted: the token survived the 503
+    limited = upload()
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) >= 1
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.models.health import AuditLog
+from app.services.audit import AuditEntry, AuditWriter, audit_writer
+
+
+def entries(count, **fields):
+    return [AuditEntry(action=f"action.{i}", resource="/test", **fields) for i in range(count)]
+
+
+@pytest.mark.parametrize("overflow, kept", [("drop_oldest", [2, 3, 4]), ("drop_newest", [0, 1, 2])])
+def test_full_buffer_drops_by_policy(db, overflow, kept):
+    writer = AuditWriter(max_buffer=3, batch_size=100, flush_interval=60, overflow=overflow)
+    for entry in entries(5):
+        writer.record(entry)
+    asyncio.run(writer.flush())
+
+    assert writer.stats() == {"buffered": 0, "written": 3, "dropped": 2, "flushes": 1}
+    assert sorted(row.action for row in db.query(AuditLog)) == [f"action.{i}" for i in kept]
+
+
+def test_a_full_batch_is_flushed_without_waiting_for_the_interval(db):
+    writer = AuditWriter(max_buffer=100, batch_size=3, flush_interval=60)
+
+    async def run():
+        writer.start()
+        for entry in entries(3):
+            writer.record(entry)
+        for _ in range(100):
+            if writer.written:
+                break
+            await asyncio.sleep(0.01)
+        await writer.stop()
+
+    asyncio.run(run())
+    assert writer.stats()["flushes"] == 1
+    assert db.query(AuditLog).count() == 3
+
+
+def test_program_ids_are_resolved_to_their_member(db, family):
+    writer = AuditWriter(max_buffer=10, batch_size=10, flush_interval=60)
+    writer.record(AuditEntry(action="log.batch", resource="/logs/batch", actor_id=family["user_id"],
+                             program_ids=[family["program_id"], family["program_id"]]))
+    asyncio.run(writer.flush())
+
+    rows = [(row.action, row.actor_id, row.target_member_id) for row in db.query(AuditLog)]
+    assert rows == [("log.batch", family["user_id"], family["member_id"])]  # one row per distinct program
+
+
+def test_audited_endpoint_records_after_responding(client, family, db):
+    response = client.get(f"/api/v1/logs/adherence/{family['program_id']}", headers=family["headers"])
+    assert response.status_code == 200
+    assert db.query(AuditLog).count() == 0  # buffered, not written on the request path
+
+    asyncio.run(audit_writer.flush())
+    row = db.query(AuditLog).one()
+    assert (row.action, row.actor_id, row.target_member_id) == ("adherence.read", family["user_id"], family["member_id"])
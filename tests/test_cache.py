@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.cache import LRUBackend, SQLiteBackend, TieredCache
+
+
+@pytest.fixture
+def cache():
+    return TieredCache(LRUBackend(maxsize=64), ttl=60)
+
+
+def test_invalidate_makes_entries_unreachable(cache):
+    cache.set("adherence:1", "today", {"v": 1})
+    cache.set("adherence:2", "today", {"v": 2})
+    cache.invalidate("adherence:1")
+
+    assert cache.get("adherence:1", "today") is None
+    assert cache.get("adherence:2", "today") == {"v": 2}
+
+
+def test_get_or_load_does_not_cache_a_load_overlapping_an_invalidation(cache):
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_loader():
+        loading.set()
+        release.wait(5)
+        return {"v": "old"}
+
+    reader = threading.Thread(target=cache.get_or_load, args=("adherence:1", "today", slow_loader))
+    reader.start()
+    assert loading.wait(5)
+    cache.invalidate("adherence:1")  # a write lands while the old value is being loaded
+    release.set()
+    reader.join(5)
+
+    assert cache.get("adherence:1", "today") is None
+    assert cache.get_or_load("adherence:1", "today", lambda: {"v": "new"}) == {"v": "new"}
+
+
+def test_aget_or_load_does_not_cache_a_load_overlapping_an_invalidation(cache):
+    async def run():
+        loading, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_loader():
+            loading.set()
+            await release.wait()
+            return {"v": "old"}
+
+        reader = asyncio.create_task(cache.aget_or_load("adherence:1", "today", slow_loader))
+        await loading.wait()
+        await cache.ainvalidate("adherence:1")
+        release.set()
+        assert await reader == {"v": "old"}  # the caller that loaded it still gets it
+
+        async def load_new():
+            return {"v": "new"}
+
+        return await cache.aget("adherence:1", "today"), await cache.aget_or_load("adherence:1", "today", load_new)
+
+    assert asyncio.run(run()) == (None, {"v": "new"})
+
+
+def test_set_with_an_older_version_is_unreachable(cache):
+    version = cache.version("dashboard:1")
+    cache.invalidate("dashboard:1")
+    cache.set("dashboard:1", "today", {"v": "old"}, version=version)
+    assert cache.get("dashboard:1", "today") is None
+
+
+def test_concurrent_misses_share_one_load(cache):
+    calls = 0
+
+    async def run():
+        release = asyncio.Event()
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"v": 1}
+
+        readers = [asyncio.create_task(cache.aget_or_load("adherence:1", "today", loader)) for _ in range(10)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*readers)
+
+    assert asyncio.run(run()) == [{"v": 1}] * 10
+    assert calls == 1
+    assert cache.stats()["coalesced"] == 9
+
+
+def test_version_counters_survive_l1_eviction():
+    cache = TieredCache(LRUBackend(maxsize=2), ttl=60)
+    cache.set("adherence:1", "today", {"v": "old"})
+    cache.invalidate("adherence:1")
+    for i in range(10):
+        cache.set("other", str(i), i)
+    assert cache.version("adherence:1") == 1
+
+
+def test_shared_tier_invalidation_reaches_other_workers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    worker_a = TieredCache(LRUBackend(), SQLiteBackend(path), ttl=60, version_ttl=0)
+    worker_b = TieredCache(LRUBackend(), SQLiteBackend(path), ttl=60, version_ttl=0)
+
+    worker_a.set("adherence:1", "today", {"v": 1})
+    assert worker_b.get("adherence:1", "today") == {"v": 1}  # via L2
+    worker_b.invalidate("adherence:1")
+    assert worker_a.get("adherence:1", "today") is None
@@ -0,0 +1,57 @@
+from app.models import Member
+from app.services import dashboard as dashboard_service
+from app.services.cache import cache
+
+
+def member_names(response):
+    return [member["name"] for member in response.json()["members"]]
+
+
+def test_etag_revalidates_until_a_log_changes_the_scores(client, family):
+    first = client.get("/api/v1/dashboard", headers=family["headers"])
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.json()["members"][0]["programs"][0]["adherence"] is None
+
+    cached = client.get("/api/v1/dashboard", headers={**family["headers"], "If-None-Match": etag})
+    assert cached.status_code == 304
+
+    client.post("/api/v1/logs/logs", json={
+        "program_id": family["program_id"], "log_type": "NUTRITION", "payload": {"protein_g": 50},
+    }, headers=family["headers"])
+    changed = client.get("/api/v1/dashboard", headers={**family["headers"], "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["members"][0]["programs"][0]["adherence"]["nutrition_score"] == 25.0  # protein 50%, calories 0%
+
+
+def test_lost_version_counters_do_not_produce_a_false_304(client, family, db):
+    etag = client.get("/api/v1/dashboard", headers=family["headers"]).headers["ETag"]
+
+    # The data changes while the counters restart (e.g. the shared cache
+    # file was lost, or a worker without one): versions alone look unchanged
+    db.add(Member(user_id=family["user_id"], name="Father", age=66, relation_type="Father"))
+    db.commit()
+    cache.l1 = type(cache.l1)()
+    cache._versions.clear()
+
+    response = client.get("/api/v1/dashboard", headers={**family["headers"], "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert member_names(response) == ["Mother", "Father"]
+
+
+def test_write_during_a_build_is_not_hidden_by_the_snapshot(client, family, db, monkeypatch):
+    read_versions = dashboard_service._program_versions
+
+    async def write_lands_mid_build(program_ids):
+        # After the members query, before the snapshot is stored
+        monkeypatch.setattr(dashboard_service, "_program_versions", read_versions)
+        db.add(Member(user_id=family["user_id"], name="Father", age=66, relation_type="Father"))
+        db.commit()
+        await dashboard_service.ainvalidate(family["user_id"])
+        return await read_versions(program_ids)
+
+    monkeypatch.setattr(dashboard_service, "_program_versions", write_lands_mid_build)
+    assert member_names(client.get("/api/v1/dashboard", headers=family["headers"])) == ["Mother"]
+    assert member_names(client.get("/api/v1/dashboard", headers=family["headers"])) == ["Mother", "Father"]
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+from app.api.v1 import events, logs
+from app.config import settings
+from app.db.session import async_engine
+from app.db.writer import run_write_sync
+from app.schemas.health import AdherenceResponse
+from app.services.cache import cache
+from app.services.events import adherence_topic
+
+
+def parse(event: str):
+    fields = dict(line.split(": ", 1) for line in event.strip().splitlines())
+    return fields["event"], json.loads(fields["data"]), fields.get("id")
+
+
+async def log_protein(program_id: int, grams: int):
+    def write(session):
+        return logs._write_log(session, program_id, "NUTRITION", {"protein_g": grams})[1]
+    changes = await asyncio.to_thread(run_write_sync, write)
+    await logs._adherence_changed(changes)
+
+
+def stream_events(family, steps, monkeypatch):
+    """Run the stream, calling each step before reading the next event."""
+    monkeypatch.setattr(settings, "EVENTS_HEARTBEAT_S", 0.05)
+    monkeypatch.setattr(settings, "EVENTS_COALESCE_MS", 0)
+
+    async def run():
+        stream = events._adherence_stream([family["program_id"]])
+        received = []
+        try:
+            for step in steps:
+                await step()
+                event = await anext(stream)
+                while event.startswith(":"):  # keep-alive
+                    event = await anext(stream)
+                received.append(parse(event))
+        finally:
+            await stream.aclose()
+            await async_engine.dispose()
+        return received
+
+    return asyncio.run(run())
+
+
+def test_snapshot_and_pushed_events_share_one_shape(family, monkeypatch):
+    program_id = family["program_id"]
+
+    async def seed():
+        await log_protein(program_id, 20)
+
+    async def push():
+        await log_protein(program_id, 30)
+
+    (kind, snapshot, _), (pushed_kind, pushed, seq) = stream_events(family, [seed, push], monkeypatch)
+
+    assert kind == pushed_kind == "adherence"
+    assert set(snapshot) == set(pushed) == set(AdherenceResponse.model_fields)
+    assert snapshot["nutrition_score"] == 10.0
+    assert pushed["nutrition_score"] == 25.0
+    assert seq is not None
+
+
+def test_resync_after_a_change_from_another_worker(family, monkeypatch):
+    program_id = family["program_id"]
+
+    async def seed():
+        await log_protein(program_id, 20)
+
+    async def write_elsewhere():
+        # Committed and invalidated without a publish on this worker's broker
+        def write(session):
+            logs._write_log(session, program_id, "NUTRITION", {"protein_g": 30})
+        await asyncio.to_thread(run_write_sync, write)
+        await cache.ainvalidate(f"adherence:{program_id}")
+
+    (_, snapshot, _), (kind, resync, seq) = stream_events(family, [seed, write_elsewhere], monkeypatch)
+
+    assert kind == "adherence" and seq is None
+    assert set(resync) == set(snapshot)
+    assert resync["nutrition_score"] == 25.0
+
+
+def test_pushed_messages_are_serialized_through_the_schema(family, monkeypatch):
+    program_id = family["program_id"]
+
+    async def seed():
+        await log_protein(program_id, 20)
+
+    async def push_engine_internals():
+        # Whatever the publisher hands the broker, subscribers get the DTO
+        events.broker.publish(adherence_topic(program_id), {
+            "program_id": program_id, "date": "2026-03-14", "total_score": 40.0, "rollup_id": 7,
+        })
+
+    (_, snapshot, _), (_, pushed, _) = stream_events(family, [seed, push_engine_internals], monkeypatch)
+
+    assert set(pushed) == set(snapshot) == set(AdherenceResponse.model_fields)
+    assert (pushed["date"], pushed["total_score"], pushed["nutrition_score"]) == ("2026-03-14", 40.0, 0.0)
@@ -0,0 +1,69 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime
+
+from app.config import settings
+from app.db.session import engine
+from app.models import DailyLog, Member
+from app.models.program import AdherenceMetric
+from app.services import export, log_store
+
+
+def seed(db, family, monkeypatch):
+    """Logs in Mar/Apr (archived by compaction) and Jun (hot), plus one adherence day."""
+    monkeypatch.setattr(settings, "LOG_RETENTION_MONTHS", 1)
+    for month in (3, 4, 6):
+        db.add(DailyLog(program_id=family["program_id"], log_type="NUTRITION",
+                        payload={"calories": 100 * month, "note": "rice, dal"}, timestamp=datetime(2026, month, 2, 12)))
+    db.add(AdherenceMetric(program_id=family["program_id"], date="2026-06-02", total_score=50.0))
+    db.commit()
+    with engine.begin() as conn:
+        log_store.compact(conn, today=date(2026, 6, 15))
+    assert log_store.list_archives() == [(2026, 3), (2026, 4)]
+
+
+def fetch(client, family, **params):
+    return client.get(f"/api/v1/members/{family['member_id']}/export", params=params, headers=family["headers"])
+
+
+def test_ndjson_covers_every_tier(client, family, db, monkeypatch):
+    seed(db, family, monkeypatch)
+
+    response = fetch(client, family)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["record"] for record in records] == ["program", "log", "log", "log", "adherence"]
+    assert [record["payload"]["calories"] for record in records if record["record"] == "log"] == [300, 400, 600]
+
+    hot_only = [json.loads(line) for line in fetch(client, family, include_archived="false").text.splitlines()]
+    assert [record["payload"]["calories"] for record in hot_only if record["record"] == "log"] == [600]
+
+
+def test_csv_and_gzip(client, family, db, monkeypatch):
+    seed(db, family, monkeypatch)
+
+    response = fetch(client, family, format="csv", gzip="true")
+    assert response.headers["content-disposition"] == f'attachment; filename="member-{family["member_id"]}.csv.gz"'
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode())))
+    assert list(rows[0]) == export.CSV_COLUMNS
+    logs = [row for row in rows if row["record"] == "log"]
+    assert json.loads(logs[0]["payload"]) == {"calories": 300, "note": "rice, dal"}
+    assert rows[-1]["record"] == "adherence" and rows[-1]["total_score"] == "50.0"
+
+
+def test_export_is_produced_chunk_by_chunk(family, db, monkeypatch):
+    seed(db, family, monkeypatch)
+    monkeypatch.setattr(export, "CHUNK_SIZE", 1)
+
+    parts = list(export.export_member(family["member_id"]))
+    assert len(parts) == 5  # one encoded chunk per row at CHUNK_SIZE 1
+    assert gzip.decompress(b"".join(export.export_member(family["member_id"], compress=True))) == b"".join(parts)
+
+
+def test_other_families_cannot_export(client, family, db):
+    other = Member(user_id=family["user_id"] + 1, name="Stranger", age=70, relation_type="Mother")
+    db.add(other)
+    db.commit()
+    assert client.get(f"/api/v1/members/{other.id}/export", headers=family["headers"]).status_code == 404
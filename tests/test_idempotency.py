@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+import httpx
+
+from app.api.middleware import IdempotencyMiddleware
+from app.models import DailyLog
+from app.services.idempotency import BodyFingerprint, IdempotencyStore
+
+
+def multipart(content: bytes, boundary: str):
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="meal.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+# --- Fingerprints ---
+def test_fingerprint_ignores_chunking_and_multipart_boundary():
+    def digest(body, content_type, chunk):
+        fingerprint = BodyFingerprint(content_type.encode())
+        for start in range(0, len(body), chunk):
+            fingerprint.update(body[start:start + chunk])
+        return fingerprint.hexdigest()
+
+    first = multipart(b"\xff\xd8photo", "boundary-aaaaaaaa")
+    retry = multipart(b"\xff\xd8photo", "boundary-bbbbbbbb")
+    other = multipart(b"\xff\xd8other", "boundary-aaaaaaaa")
+
+    digests = {digest(*first, chunk) for chunk in (1, 3, 7, 1000)}
+    assert digests == {digest(*retry, 5)}
+    assert digest(*other, 1000) not in digests
+
+
+# --- Middleware around a stub app ---
+class StubApp:
+    """Reads the body, then answers `status` after `release` is set."""
+
+    def __init__(self, status=201):
+        self.status = status
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": self.status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"call": %d}' % self.calls})
+
+
+def wrap(app, accepted_ttl=None):
+    store = IdempotencyStore(maxsize=100, ttl=3600)
+    middleware = IdempotencyMiddleware(
+        app, store=store, paths=["/jobs"], max_body_bytes=1024, max_request_bytes=1024,
+        wait_timeout=5, accepted_ttl=accepted_ttl,
+    )
+    return middleware, store
+
+
+def post(middleware, key, body=b'{"a": 1}'):
+    async def run():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/jobs", content=body, headers={"Idempotency-Key": key, "X-User-ID": "1"})
+    return run()
+
+
+def test_concurrent_retries_wait_for_the_first_attempt():
+    app = StubApp()
+    middleware, store = wrap(app)
+
+    async def run():
+        app.release.clear()
+        first = asyncio.create_task(post(middleware, "k"))
+        retry = asyncio.create_task(post(middleware, "k"))
+        await asyncio.sleep(0.05)
+        assert store.stats()["in_flight"] == 1
+        app.release.set()
+        return await first, await retry
+
+    first, retry = asyncio.run(run())
+    assert app.calls == 1
+    assert first.json() == retry.json() == {"call": 1}
+    assert retry.headers["idempotent-replayed"] == "true"
+
+
+def test_server_errors_are_not_replayed():
+    app = StubApp(status=503)
+    middleware, _ = wrap(app)
+    asyncio.run(post(middleware, "k"))
+    asyncio.run(post(middleware, "k"))
+    assert app.calls == 2
+
+
+def test_accepted_responses_expire_with_their_job():
+    app = StubApp(status=202)
+    middleware, _ = wrap(app, accepted_ttl=0.2)
+
+    assert asyncio.run(post(middleware, "k")).json() == {"call": 1}
+    assert asyncio.run(post(middleware, "k")).headers["idempotent-replayed"] == "true"
+    time.sleep(0.3)
+    # The job behind the first 202 is gone: run again rather than replay a dead poll URL
+    assert asyncio.run(post(middleware, "k")).json() == {"call": 2}
+
+
+# --- Through the API ---
+def create_log(client, family, key, protein):
+    return client.post(
+        "/api/v1/logs/logs",
+        json={"program_id": family["program_id"], "log_type": "NUTRITION", "payload": {"protein_g": protein}},
+        headers={**family["headers"], "Idempotency-Key": key},
+    )
+
+
+def test_retried_log_is_created_once(client, family, db):
+    first = create_log(client, family, "log-1", 30)
+    retry = create_log(client, family, "log-1", 30)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert db.query(DailyLog).count() == 1
+
+
+def test_key_reused_with_a_different_body_is_rejected(client, family, db):
+    create_log(client, family, "log-1", 30)
+    reused = create_log(client, family, "log-1", 45)
+
+    assert reused.status_code == 422
+    assert db.query(DailyLog).count() == 1
+
+
+def test_photo_retry_with_a_new_boundary_is_replayed(client, family, jpeg, instant_inference):
+    def upload(content, boundary):
+        body, content_type = multipart(content, boundary)
+        return client.post(
+            "/api/v1/logs/meals/analyze", content=body,
+            headers={**family["headers"], "Idempotency-Key": "meal-1", "Content-Type": content_type},
+        )
+
+    photo = jpeg()
+    first = upload(photo, "boundary-one")
+    retry = upload(photo, "boundary-two")
+    assert first.status_code == retry.status_code == 202
+    assert retry.json()["job_id"] == first.json()["job_id"]
+
+    assert upload(jpeg(color=(0, 0, 255)), "boundary-three").status_code == 422
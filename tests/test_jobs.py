@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from app.models import DailyLog
+from app.services.jobs import JobQueue, JobStatus, QueueFullError
+
+
+def test_in_flight_jobs_outlive_a_short_result_ttl():
+    async def run():
+        release = asyncio.Event()
+
+        async def handler(job):
+            await release.wait()
+            if job.params.get("fail"):
+                raise ValueError("unreadable photo")
+            return {"n": job.params["n"]}
+
+        queue = JobQueue(handler, workers=2, maxsize=2, result_ttl=0.05)
+        try:
+            done, failed = queue.submit(n=1), queue.submit(n=2, fail=True)
+            with pytest.raises(QueueFullError):
+                queue.submit(n=3)
+
+            await asyncio.sleep(0.1)  # twice the result TTL, still running
+            assert [queue.get(job.id).status for job in (done, failed)] == [JobStatus.PENDING] * 2
+
+            release.set()
+            await asyncio.sleep(0.01)
+            assert (queue.get(done.id).status, queue.get(done.id).result) == (JobStatus.COMPLETED, {"n": 1})
+            assert (queue.get(failed.id).status, queue.get(failed.id).error) == (JobStatus.FAILED, "unreadable photo")
+
+            await asyncio.sleep(0.1)  # the TTL runs from completion
+            assert queue.get(done.id) is None
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_photo_is_accepted_then_polled_to_a_log(client, family, jpeg, db, instant_inference):
+    accepted = client.post(
+        "/api/v1/logs/meals/analyze", headers=family["headers"],
+        files={"file": ("meal.jpg", jpeg(), "image/jpeg")}, data={"program_id": str(family["program_id"])},
+    )
+    assert accepted.status_code == 202
+    body = accepted.json()
+    assert body["status"] == "PENDING"
+    assert body["poll_url"] == f"/api/v1/logs/meals/jobs/{body['job_id']}"
+
+    deadline = time.monotonic() + 5
+    while (job := client.get(body["poll_url"]).json())["status"] == "PENDING" and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert job["status"] == "COMPLETED"
+    assert job["result"]["food_items"]
+    log = db.get(DailyLog, job["log_id"])
+    assert (log.program_id, log.log_type, log.payload["image_key"]) == (family["program_id"], "NUTRITION", body["image_url"].rsplit("/", 1)[1])
+
+    assert client.get("/api/v1/logs/meals/jobs/unknown").status_code == 404
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from app.models import DailyLog
+from app.models.health import LogMetric
+from app.services import log_metrics
+from app.services.log_metrics import extract_fields
+
+
+def test_extraction_follows_the_declared_paths():
+    assert extract_fields("NUTRITION", {"calories": "450", "macros": {"protein_g": 30}, "protein_g": 99, "fats_g": "n/a"}) \
+        == {"calories": 450.0, "protein_g": 30.0}
+    assert extract_fields("checkin", {"bp": {"systolic": 150, "diastolic": 95}}) == {"systolic": 150.0, "diastolic": 95.0}
+    assert extract_fields("WORKOUT", {"sessions": True}) == {}  # booleans are not numbers
+    assert extract_fields("UNKNOWN", {"calories": 1}) == {}
+
+
+def clinical(client, family, systolic, timestamp):
+    return client.post("/api/v1/logs/logs", json={
+        "program_id": family["program_id"], "log_type": "CLINICAL",
+        "payload": {"blood_pressure": {"systolic": systolic, "diastolic": 80}}, "timestamp": timestamp,
+    }, headers=family["headers"]).json()["id"]
+
+
+def test_range_query_pages_newest_first(client, family):
+    ids = {
+        systolic: clinical(client, family, systolic, f"2026-05-{day:02d}T09:00:00")
+        for day, systolic in enumerate((130, 145, 160, 150, 120), start=1)
+    }
+    url = f"/api/v1/logs/{family['program_id']}/metrics"
+
+    high, cursor = [], None
+    while True:
+        page = client.get(url, params={"field": "systolic", "min_value": 140, "limit": 2, **({"cursor": cursor} if cursor else {})},
+                          headers=family["headers"]).json()
+        high += [(item["log_id"], item["value"]) for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert high == [(ids[150], 150.0), (ids[160], 160.0), (ids[145], 145.0)]
+
+    window = client.get(url, params={"field": "systolic", "since": "2026-05-02", "until": "2026-05-03"}, headers=family["headers"])
+    assert [item["value"] for item in window.json()["items"]] == [145.0]
+    assert client.get(url, params={"field": "pulse"}, headers=family["headers"]).status_code == 400
+
+
+def test_backfill_indexes_existing_logs_once(family, db):
+    db.add_all([
+        DailyLog(program_id=family["program_id"], log_type="NUTRITION", payload={"calories": 500, "macros": {"protein_g": 25}},
+                 timestamp=datetime(2026, 5, 1, 12)),
+        DailyLog(program_id=family["program_id"], log_type="NUTRITION", payload={"note": "no numbers"},
+                 timestamp=datetime(2026, 5, 1, 18)),
+    ])
+    db.commit()
+
+    assert log_metrics.backfill(chunk_size=1) == {"logs": 2, "fields": 2}
+    assert log_metrics.backfill() == {"logs": 2, "fields": 2}  # re-running replaces, never duplicates
+    assert sorted((row.field, row.value) for row in db.query(LogMetric)) == [("calories", 500.0), ("protein_g", 25.0)]
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import random
+from datetime import date, datetime
+
+import pytest
+
+from app.config import settings
+from app.db.session import AsyncSessionLocal, async_engine, engine
+from app.models.health import DailyLog
+from app.services import log_store
+
+TODAY = date(2026, 6, 15)
+
+
+@pytest.fixture
+def tiers(db, monkeypatch):
+    """
+    Logs for program 1 (plus program 2 noise) spread over Feb-Jun 2026 and
+    compacted with a two-month retention: Feb/Mar archived, Apr/May warm,
+    Jun hot. Several logs share a timestamp so pages split on the id.
+    Returns program 1's (timestamp, id) keys newest first, read before
+    compaction from the single hot table: the ordering every page must match.
+    """
+    monkeypatch.setattr(settings, "LOG_RETENTION_MONTHS", 2)
+    timestamps = [
+        datetime(2026, month, day, hour)
+        for month in (2, 3, 4, 5, 6)
+        for day in (1, 14, 28)
+        for hour in (8, 8, 12)
+    ]
+    random.Random(7).shuffle(timestamps)  # ids must not follow timestamp order
+    for program_id in (1, 2):
+        for timestamp in timestamps:
+            db.add(DailyLog(program_id=program_id, log_type="NUTRITION", payload={}, timestamp=timestamp))
+    # Newest id in the hot month, so rotation moves every older row
+    db.add(DailyLog(program_id=2, log_type="NUTRITION", payload={}, timestamp=datetime(2026, 6, 15)))
+    db.commit()
+    expected = sorted(
+        ((row.timestamp, row.id) for row in db.query(DailyLog).filter_by(program_id=1)),
+        reverse=True,
+    )
+
+    with engine.begin() as conn:
+        log_store.compact(conn, today=TODAY)
+        assert log_store.list_partitions(conn) == [(2026, 4), (2026, 5)]
+    assert log_store.list_archives() == [(2026, 2), (2026, 3)]
+    return expected
+
+
+def paginate(limit, **filters):
+    async def run():
+        pages, after = [], None
+        try:
+            async with AsyncSessionLocal() as db:
+                while True:
+                    page = await log_store.fetch_history(db, 1, limit, after=after, **filters)
+                    assert len(page) <= limit
+                    if not page:
+                        return pages
+                    pages.append([(row["timestamp"], row["id"]) for row in page])
+                    after = pages[-1][-1]
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(run())
+
+
+def flatten(pages):
+    return [key for page in pages for key in page]
+
+
+def test_pages_across_hot_warm_and_cold_match_a_single_table(tiers):
+    expected = tiers
+    assert len(expected) == 45
+
+    for limit in (1, 4, 9, 100):
+        pages = paginate(limit, include_archived=True)
+        assert flatten(pages) == expected
+        assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_archived_months_are_skipped_unless_asked_for(tiers):
+    cutoff = datetime(2026, 4, 1)
+    assert flatten(paginate(4)) == [key for key in tiers if key[0] >= cutoff]
+
+
+def test_window_bounds_span_tiers(tiers):
+    # Both bounds fall on logged timestamps: since is inclusive, until exclusive
+    since, until = datetime(2026, 3, 14, 8), datetime(2026, 5, 14, 8)
+    expected = [key for key in tiers if since <= key[0] < until]
+    assert expected[0][0] == datetime(2026, 5, 1, 12) and expected[-1][0] == since
+
+    assert flatten(paginate(2, since=since, until=until, include_archived=True)) == expected
+
+
+def test_rolled_back_compaction_publishes_no_archive(db, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_RETENTION_MONTHS", 1)
+    for month in (3, 4, 6):
+        db.add(DailyLog(program_id=1, log_type="WORKOUT", payload={}, timestamp=datetime(2026, month, 2)))
+    db.commit()
+
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        assert log_store.compact(conn, today=TODAY)["archived"] == {"daily_logs_2026_03": 1, "daily_logs_2026_04": 1}
+        transaction.rollback()
+
+    assert log_store.list_archives() == []
+    assert not os.path.exists(settings.LOG_ARCHIVE_DIR) or os.listdir(settings.LOG_ARCHIVE_DIR) == []
+    assert db.query(DailyLog).count() == 3
+    with engine.connect() as conn:
+        assert log_store.list_partitions(conn) == []
+
+
+def test_archive_cache_holds_only_its_row_budget(tiers, monkeypatch):
+    # Each archived month holds 18 rows (9 per program): room for one month
+    monkeypatch.setattr(log_store, "archive_cache", log_store._ArchiveCache(max_rows=20))
+
+    assert flatten(paginate(4, include_archived=True)) == tiers
+    assert log_store.archive_cache.stats() == {"months": 1, "rows": 18, "max_rows": 20}
+
+    monkeypatch.setattr(log_store, "archive_cache", log_store._ArchiveCache(max_rows=10))
+    assert flatten(paginate(4, include_archived=True)) == tiers  # too big to cache: decoded per read
+    assert log_store.archive_cache.stats()["months"] == 0
+
+
+def test_partition_list_is_reused_until_the_tables_change(tiers, monkeypatch):
+    listed = []
+    list_partitions = log_store.list_partitions
+    monkeypatch.setattr(log_store, "list_partitions", lambda conn: listed.append(1) or list_partitions(conn))
+
+    paginate(4)
+    paginate(4)
+    assert len(listed) == 1
+
+    # Backdated log compacted by another connection (the CLI job, say)
+    with engine.begin() as conn:
+        conn.execute(DailyLog.__table__.insert().values(
+            program_id=1, log_type="NUTRITION", payload={}, timestamp=datetime(2026, 1, 20),
+        ))
+        log_store.partition_table((2026, 1)).create(conn)
+    with engine.connect() as conn:
+        assert log_store.cached_partitions(conn) == [(2026, 1), (2026, 4), (2026, 5)]
+    assert len(listed) == 2
@@ -0,0 +1,43 @@
+from app.api.v1 import logs
+from app.models import DailyLog
+from app.models.program import DailyRollup
+
+
+def test_bad_items_are_rejected_and_the_rest_scored_once_per_day(client, family, db, monkeypatch):
+    program_id = family["program_id"]
+    recomputed = []
+    adherence_changed = logs._adherence_changed
+
+    async def spy(changes):
+        recomputed.append(sorted(changes))
+        await adherence_changed(changes)
+
+    monkeypatch.setattr(logs, "_adherence_changed", spy)
+
+    def nutrition(protein, day):
+        return {"program_id": program_id, "log_type": "NUTRITION", "payload": {"protein_g": protein}, "timestamp": f"2026-03-{day}T12:00:00"}
+
+    response = client.post("/api/v1/logs/logs/batch", json={"items": [
+        nutrition(20, 14),
+        {"program_id": program_id, "payload": {}},  # no log_type
+        nutrition(30, 14),
+        {**nutrition(10, 14), "program_id": 999},
+        nutrition(50, 15),
+    ]}, headers=family["headers"])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["rejected"]) == (3, 2)
+    assert [item["status"] for item in body["results"]] == ["CREATED", "REJECTED", "CREATED", "REJECTED", "CREATED"]
+    assert "log_type" in body["results"][1]["error"]
+    assert body["results"][3]["error"] == "Program 999 not found"
+    assert db.query(DailyLog).count() == 3
+
+    # One recompute for the whole batch, one entry per program-day
+    assert recomputed == [[(program_id, "2026-03-14"), (program_id, "2026-03-15")]]
+    rollups = {r.date: (r.protein_g, r.log_count) for r in db.query(DailyRollup).filter_by(program_id=program_id)}
+    assert rollups == {"2026-03-14": (50.0, 2), "2026-03-15": (50.0, 1)}
+
+
+def test_an_empty_batch_is_a_validation_error(client, family):
+    assert client.post("/api/v1/logs/logs/batch", json={"items": []}, headers=family["headers"]).status_code == 422
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.services.ai_service import InferenceBackend, MealAnalyzer
+from app.services.storage import storage
+
+
+class RecordingBackend(InferenceBackend):
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    def analyze_batch(self, image_paths):
+        self.batches.append(list(image_paths))
+        if self.fail:
+            raise RuntimeError("backend down")
+        return [{"path": path} for path in image_paths]
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    # Analyses are also stored next to the images: keep them out of the shared upload dir
+    monkeypatch.setattr(storage, "objects_dir", str(tmp_path / "objects"))
+    return RecordingBackend()
+
+
+def analyzer(backend):
+    return MealAnalyzer(backend, max_batch=8, max_wait=0.05, max_inflight_batches=2, cache_size=100, cache_ttl=60)
+
+
+def run(meals, *calls):
+    async def main():
+        try:
+            return await asyncio.gather(*(meals.analyze(digest, path) for digest, path in calls), return_exceptions=True)
+        finally:
+            await meals.stop()
+    return asyncio.run(main())
+
+
+def test_concurrent_photos_share_one_batch(backend):
+    meals = analyzer(backend)
+    calls = [(f"{i:064x}", f"/photos/{i}.jpg") for i in range(5)]
+
+    results = run(meals, *calls)
+    assert results == [{"path": path} for _, path in calls]  # each caller gets its own result
+    assert len(backend.batches) == 1 and sorted(backend.batches[0]) == sorted(path for _, path in calls)
+    assert meals.stats["inferred"] == 5
+
+
+def test_repeat_photos_skip_inference(backend):
+    meals = analyzer(backend)
+    same = ("a" * 64, "/photos/a.jpg")
+
+    assert run(meals, same, same, same) == [{"path": "/photos/a.jpg"}] * 3
+    assert run(meals, same) == [{"path": "/photos/a.jpg"}]
+    assert (meals.stats["coalesced"], meals.stats["cache_hits"], len(backend.batches)) == (2, 1, 1)
+
+    # A fresh process (empty memory cache) finds the analysis stored with the image
+    restarted = analyzer(backend)
+    assert run(restarted, same) == [{"path": "/photos/a.jpg"}]
+    assert (restarted.stats["stored_hits"], len(backend.batches)) == (1, 1)
+
+
+def test_failed_batch_fails_its_callers_and_is_retried(backend):
+    meals = analyzer(backend)
+    backend.fail = True
+    failed = run(meals, ("b" * 64, "/photos/b.jpg"), ("c" * 64, "/photos/c.jpg"))
+    assert all(isinstance(result, RuntimeError) for result in failed)
+
+    backend.fail = False
+    assert run(meals, ("b" * 64, "/photos/b.jpg")) == [{"path": "/photos/b.jpg"}]
+    assert len(backend.batches) == 2
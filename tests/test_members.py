@@ -0,0 +1,51 @@
+from app.db.writer import write_queue
+from app.models import Member, User
+
+
+def writes():
+    return write_queue.stats()["writes"]
+
+
+def test_registration_goes_through_the_writer(client, db):
+    before = writes()
+    registered = client.post("/api/v1/members/register", json={
+        "email": "new@example.com", "full_name": "New", "password": "x",
+    })
+    assert registered.status_code == 200
+    assert registered.json()["email"] == "new@example.com"
+    assert writes() == before + 1
+
+    duplicate = client.post("/api/v1/members/register", json={
+        "email": "new@example.com", "full_name": "Again", "password": "x",
+    })
+    assert duplicate.status_code == 400
+    assert db.query(User).filter_by(email="new@example.com").count() == 1
+
+
+def test_member_create_update_delete(client, family, db):
+    headers = family["headers"]
+    before = writes()
+
+    created = client.post("/api/v1/members/", json={
+        "user_id": family["user_id"], "name": "Father", "age": 66, "relation_type": "Father",
+    }, headers=headers)
+    assert created.status_code == 200
+    member_id = created.json()["id"]
+
+    updated = client.put(f"/api/v1/members/{member_id}", json={"age": 67}, headers=headers)
+    assert updated.json() == {**created.json(), "age": 67}
+    # The dashboard was invalidated by the write
+    names = [m["name"] for m in client.get("/api/v1/dashboard", headers=headers).json()["members"]]
+    assert names == ["Mother", "Father"]
+
+    assert client.delete(f"/api/v1/members/{member_id}", headers=headers).status_code == 200
+    assert client.delete(f"/api/v1/members/{member_id}", headers=headers).status_code == 404
+    assert db.query(Member).filter_by(id=member_id).count() == 0
+    assert writes() == before + 3
+
+
+def test_profile_update_returns_the_family(client, family):
+    response = client.put("/api/v1/members/users/me", json={"full_name": "Owner"}, headers=family["headers"])
+    assert response.status_code == 200
+    assert response.json()["full_name"] == "Owner"
+    assert [member["name"] for member in response.json()["members"]] == ["Mother"]
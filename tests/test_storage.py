@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import httpx
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from app.api.middleware import UploadLimitMiddleware
+from app.services.storage import LocalStorage
+
+
+def upload_file(content: bytes, content_type="image/jpeg"):
+    return UploadFile(file=io.BytesIO(content), filename="meal.jpg", headers=Headers({"content-type": content_type}))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStorage(root=str(tmp_path), max_bytes=100_000, allowed_types=["image/jpeg"], chunk_size=1000)
+
+
+def leftovers(store):
+    return [name for _, _, files in os.walk(store.root) for name in files if name.endswith(".part")]
+
+
+# --- Streaming save ---
+def test_save_streams_and_hashes_in_chunks(store, jpeg):
+    photo = jpeg()
+    assert len(photo) > store.chunk_size  # more than one chunk
+    stored = asyncio.run(store.save(upload_file(photo)))
+
+    assert stored.digest == hashlib.sha256(photo).hexdigest()
+    assert stored.size == len(photo)
+    with open(stored.path, "rb") as f:
+        assert f.read() == photo
+
+
+@pytest.mark.parametrize("content, content_type, status", [
+    (b"\xff\xd8" + b"x" * 100_000, "image/jpeg", 413),  # over the cap mid-stream
+    (b"GIF89a not a jpeg", "image/jpeg", 415),          # magic bytes checked
+    (b"", "image/jpeg", 400),
+    (b"\xff\xd8", "image/gif", 415),                     # type checked before writing
+])
+def test_rejected_uploads_leave_nothing_behind(store, content, content_type, status):
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(store.save(upload_file(content, content_type)))
+    assert rejected.value.status_code == status
+    assert leftovers(store) == []
+
+
+# --- Upload limit middleware ---
+def limited(max_body_bytes=10):
+    reached = []
+
+    async def app(scope, receive, send):
+        reached.append(True)
+        while (await receive()).get("more_body"):
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    return UploadLimitMiddleware(app, max_body_bytes=max_body_bytes, paths=["/upload"]), reached
+
+
+def send(middleware, content=b"", headers=None):
+    async def run():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/upload", content=content, headers=headers)
+    return asyncio.run(run())
+
+
+def test_declared_content_length_is_checked_before_the_body():
+    middleware, reached = limited()
+    assert send(middleware, b"x" * 11).status_code == 413
+    assert send(middleware, b"x", headers={"Content-Length": "abc"}).status_code == 400
+    assert send(middleware, b"x", headers={"Content-Length": "-1"}).status_code == 400
+    assert reached == []
+    assert send(middleware, b"x" * 10).status_code == 200
+
+
+def test_undeclared_body_is_cut_off_at_the_limit():
+    middleware, _ = limited()
+
+    async def chunks():
+        for _ in range(5):
+            yield b"xxxx"
+
+    with pytest.raises(HTTPException) as cut_off:
+        send(middleware, chunks())  # chunked: no Content-Length
+    assert cut_off.value.status_code == 413
@@ -0,0 +1,69 @@
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+from starlette.datastructures import Headers
+
+from app.services.storage import storage
+
+
+@pytest.fixture
+def empty_store(tmp_path, monkeypatch):
+    """The app's store, rooted in a fresh directory."""
+    monkeypatch.setattr(storage, "root", str(tmp_path))
+    monkeypatch.setattr(storage, "objects_dir", str(tmp_path / "objects"))
+    monkeypatch.setattr(storage, "variants_dir", str(tmp_path / "variants"))
+    return storage
+
+
+def save(content: bytes):
+    upload = UploadFile(file=io.BytesIO(content), filename="meal.jpg", headers=Headers({"content-type": "image/jpeg"}))
+    return asyncio.run(storage.save(upload))
+
+
+def stored_objects(store):
+    return sorted(name for _, _, files in os.walk(store.objects_dir) for name in files)
+
+
+def test_identical_photos_are_stored_once(empty_store, jpeg):
+    first, again, other = save(jpeg()), save(jpeg()), save(jpeg(color=(0, 0, 255)))
+
+    assert (first.deduplicated, again.deduplicated, other.deduplicated) == (False, True, False)
+    assert again.key == first.key != other.key
+    assert stored_objects(empty_store) == sorted([first.key, other.key])
+
+
+def test_served_photos_revalidate_by_content_hash(client, empty_store, jpeg):
+    stored = save(jpeg())
+    url = f"/uploads/{stored.key}"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["ETag"] == f'"{stored.digest}"'
+    assert "immutable" in first.headers["Cache-Control"]
+
+    assert client.get(url, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    partial = client.get(url, headers={"Range": "bytes=0-9"})
+    assert (partial.status_code, partial.headers["Content-Range"]) == (206, f"bytes 0-9/{stored.size}")
+    assert partial.content == first.content[:10]
+    assert client.get(f"/uploads/{'0' * 64}.jpg").status_code == 404
+
+
+def test_thumbnail_is_derived_once(client, empty_store, jpeg):
+    stored = save(jpeg(size=(1600, 1200)))
+
+    thumb = client.get(f"/uploads/{stored.key}?variant=thumb")
+    assert thumb.status_code == 200
+    assert thumb.headers["ETag"] == f'"{stored.digest}-thumb"'
+    assert max(Image.open(io.BytesIO(thumb.content)).size) == 256
+
+    variants = [os.path.join(d, f) for d, _, files in os.walk(empty_store.variants_dir) for f in files]
+    assert len(variants) == 1
+    built_at = os.path.getmtime(variants[0])
+    assert client.get(f"/uploads/{stored.key}?variant=thumb").content == thumb.content
+    assert os.path.getmtime(variants[0]) == built_at
+
+    assert client.get(f"/uploads/{stored.key}?variant=huge").status_code == 400
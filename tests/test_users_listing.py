@@ -0,0 +1,60 @@
+import json
+
+from sqlalchemy import event
+
+from app.db.session import async_engine
+from app.models import Member, User
+
+
+def seed(db, users=5):
+    for i in range(users):
+        user = User(email=f"user{i}@example.com", hashed_password="x", full_name=f"User {i}")
+        user.members = [Member(name=f"Member {i}.{j}", age=60 + j, relation_type="Mother") for j in range(2)]
+        db.add(user)
+    db.commit()
+
+
+def test_pages_follow_the_next_cursor_header(client, db):
+    seed(db)
+
+    first = client.get("/api/v1/members/users/all?limit=2")
+    assert [user["email"] for user in first.json()] == ["user0@example.com", "user1@example.com"]
+    assert [member["name"] for member in first.json()[0]["members"]] == ["Member 0.0", "Member 0.1"]
+    cursor = first.headers["X-Next-Cursor"]
+    assert first.headers["Link"].endswith(f'cursor={cursor}>; rel="next"')
+
+    emails = [user["email"] for user in first.json()]
+    while cursor:
+        page = client.get(f"/api/v1/members/users/all?limit=2&cursor={cursor}")
+        emails += [user["email"] for user in page.json()]
+        cursor = page.headers.get("X-Next-Cursor")
+    assert emails == [f"user{i}@example.com" for i in range(5)]
+
+
+def test_members_are_eager_loaded_in_one_query(client, db):
+    seed(db, users=20)
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        users = client.get("/api/v1/members/users/all?limit=20").json()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+
+    assert sum(len(user["members"]) for user in users) == 40
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 2  # users + members IN (...)
+
+
+def test_ndjson_streams_every_user(client, db, monkeypatch):
+    from app.api.v1 import members
+    monkeypatch.setattr(members, "STREAM_CHUNK_SIZE", 2)  # several chunks
+    seed(db)
+
+    response = client.get("/api/v1/members/users/all?format=ndjson&cursor=1")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [user["email"] for user in lines] == [f"user{i}@example.com" for i in range(1, 5)]
+    assert all(len(user["members"]) == 2 for user in lines)
@@ -0,0 +1,81 @@
+import pytest
+
+from app.db.writer import WriteQueue, WriterSession
+from app.models.user import User
+
+
+@pytest.fixture
+def queue():
+    # A long window so everything submitted in a test lands in one group
+    write_queue = WriteQueue(WriterSession, max_batch=16, window_s=0.3)
+    yield write_queue
+    write_queue.stop()
+
+
+def add_user(email):
+    def write(session):
+        user = User(email=email, hashed_password="x")
+        session.add(user)
+        session.flush()
+        return user.id
+    return write
+
+
+def fail(session):
+    session.add(User(email="half-written@example.com", hashed_password="x"))
+    session.flush()
+    raise ValueError("bad request")
+
+
+def emails(db):
+    return sorted(email for (email,) in db.query(User.email))
+
+
+def test_group_commits_once(queue, db):
+    futures = [queue.submit(add_user(f"user{i}@example.com")) for i in range(5)]
+    ids = [future.result(timeout=5) for future in futures]
+
+    assert len(set(ids)) == 5
+    assert queue.stats()["commits"] == 1
+    assert queue.stats()["writes"] == 5
+    assert emails(db) == [f"user{i}@example.com" for i in range(5)]
+
+
+def test_failed_group_is_replayed_one_write_at_a_time(queue, db):
+    good = [queue.submit(add_user(f"user{i}@example.com")) for i in range(3)]
+    bad = queue.submit(fail)
+    good.append(queue.submit(add_user("user3@example.com")))
+
+    assert all(future.result(timeout=5) for future in good)
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+
+    # The failed write's partial changes are rolled back; every other write commits on its own
+    assert emails(db) == [f"user{i}@example.com" for i in range(4)]
+    assert queue.stats()["commits"] == 4
+    assert queue.stats()["writes"] == 4
+
+
+def test_constraint_violation_only_fails_its_own_write(queue, db):
+    futures = [
+        queue.submit(add_user("dup@example.com")),
+        queue.submit(add_user("dup@example.com")),
+        queue.submit(add_user("other@example.com")),
+    ]
+
+    assert futures[0].result(timeout=5)
+    with pytest.raises(Exception):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5)
+    assert emails(db) == ["dup@example.com", "other@example.com"]
+
+
+def test_batches_are_capped_at_max_batch(db):
+    write_queue = WriteQueue(WriterSession, max_batch=2, window_s=0.3)
+    try:
+        futures = [write_queue.submit(add_user(f"user{i}@example.com")) for i in range(5)]
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        write_queue.stop()
+    assert write_queue.stats()["commits"] == 3